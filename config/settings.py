@@ -48,6 +48,13 @@ class Settings(BaseSettings):
     GOOGLE_CREDENTIALS_PATH: Path = Field(default=Path("config/google_credentials.json"))
     GOOGLE_TOKEN_PATH: Path = Field(default=Path("config/google_token.json"))
     GOOGLE_CALENDAR_ID: Optional[str] = None
+    GOOGLE_TOKEN_REFRESH_MARGIN: int = 300  # Renova o token N segundos antes de expirar
+    CALENDAR_TIMEZONE: str = "America/Sao_Paulo"
+    CALENDAR_BUSINESS_HOUR_START: int = 9
+    CALENDAR_BUSINESS_HOUR_END: int = 18
+    CALENDAR_BUFFER_MINUTES: int = 0  # Intervalo mínimo entre reuniões
+    CALENDAR_FREEBUSY_TTL: int = 60  # Segundos de cache do FreeBusy
+    CALENDAR_MIRROR_SYNC_INTERVAL: int = 60  # Segundos entre deltas (syncToken)
 
     # Supabase
     SUPABASE_URL: str
@@ -78,7 +85,42 @@ class Settings(BaseSettings):
     AGENT_NAME: str = "Iara"
     MESSAGE_BUFFER_SECONDS: int = 30
     MAX_FRAGMENT_WORDS: int = 30
-    FOLLOWUP_CHECK_INTERVAL: int = 5
+    FOLLOWUP_CHECK_INTERVAL: int = 5  # Minutos entre reconciliações da fila de follow-up
+    FOLLOWUP_MAX_CONCURRENCY: int = 10  # Leads processados em paralelo
+    FOLLOWUP_LLM_TOKENS_PER_MINUTE: int = 200000  # Orçamento de tokens do LLM
+    REMINDERS_ENABLED: bool = True  # Lembretes 24h/2h antes das reuniões
+    MEDIA_EAGER_PROCESSING: bool = True  # Transcreve áudios durante a janela do buffer
+    MEDIA_CACHE_TTL: int = 2592000  # Segundos (30 dias) do cache de mídias por SHA-256
+    IMAGE_ANALYSIS_DETAIL: str = "low"  # low (512px), auto ou high
+    IMAGE_ANALYSIS_MAX_SIDE: int = 1024  # Maior lado da imagem com detail auto/high
+    TTS_CACHE_ENABLED: bool = True  # Reaproveita áudios sintetizados (ID de mídia do WhatsApp)
+    TTS_CACHE_TTL: int = 2160000  # Segundos (25 dias; IDs de mídia valem 30)
+    TTS_WARMUP_FILE: str = "config/tts-frases.txt"  # Frases pré-sintetizadas pelo líder
+    TTS_OPUS_ENABLED: bool = True  # Converte áudios para OGG/Opus (nota de voz) via ffmpeg
+    TTS_OPUS_BITRATE: str = "32k"  # Bitrate do Opus (voz mono)
+
+    # Eleição de líder entre réplicas (só o líder roda follow-ups/lembretes)
+    LEADER_ELECTION_ENABLED: bool = True
+    LEADER_LEASE_TTL: int = 15  # Segundos (tempo máximo de failover)
+    LEADER_HEARTBEAT_INTERVAL: int = 5  # Segundos entre renovações do lease
+
+    # Roteador de intenções (turnos triviais sem LLM)
+    INTENT_ROUTER_ENABLED: bool = True
+    INTENT_MODEL_PATH: Optional[Path] = None  # Modelo TF-IDF treinado (JSON)
+    INTENT_MODEL_THRESHOLD: float = 0.85
+
+    # Cache de resultados das tools do agente (segundos)
+    TOOL_CACHE_ENABLED: bool = True
+    TOOL_CACHE_TTL_HORARIOS: int = 120
+    TOOL_CACHE_TTL_CONHECIMENTO: int = 3600
+
+    # Cache de leads (write-through; invalidação entre réplicas via Pub/Sub)
+    LEAD_CACHE_ENABLED: bool = True
+    LEAD_CACHE_TTL: int = 300  # Segundos no Redis
+    LEAD_CACHE_LOCAL_TTL: int = 30  # Segundos na memória do processo
+    LEAD_CACHE_MAX_ITEMS: int = 1000  # Tamanho do LRU local
+    LEAD_WRITE_BUFFER_ENABLED: bool = True  # Mescla atualizações do mesmo lead
+    LEAD_WRITE_BUFFER_WINDOW: float = 2.0  # Segundos até gravar as pendentes
 
     # URLs
     VIDEO_BOAS_VINDAS_URL: Optional[str] = None  # Tornado opcional para não quebrar se não configurada
@@ -10,11 +10,15 @@ Componentes:
 """
 
 import asyncio
+import json
 import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 
+import httpx
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.tools import BaseTool, StructuredTool
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
@@ -34,6 +38,10 @@ from core.memory import (
     HybridRetriever,
     SessionStateManager
 )
+from core.cache import ToolResultCache
+from core.media import MediaPipeline
+from core.voice import TTSCache, VoiceNoteSynthesizer
+from core.reminders import ReminderScheduler
 
 
 # ==============================================================================
@@ -171,6 +179,29 @@ class TranscreverAudioInput(BaseModel):
     url_audio: str = Field(description="URL do áudio para transcrever")
 
 
+# ==============================================================================
+# TURN CONTEXT
+# ==============================================================================
+
+@dataclass
+class TurnContext:
+    """
+    Dados pré-carregados de um turno (antes de rodar o agente).
+
+    Buscados em paralelo por AgenteSDR.prepare_turn e reaproveitados
+    pelo agente, pelas tools e pelo pós-processamento em main.py.
+    """
+    phone: str
+    chat_history: List[Dict] = field(default_factory=list)
+    lead: Optional[Dict] = None
+    session: Dict = field(default_factory=dict)
+    conhecimento: Optional[str] = None
+
+
+# Turno em execução (visível para as tools chamadas pelo agente)
+_turno_atual: ContextVar[Optional[TurnContext]] = ContextVar("turno_atual", default=None)
+
+
 # ==============================================================================
 # AGENTE SDR
 # ==============================================================================
@@ -197,7 +228,12 @@ class AgenteSDR:
         hybrid_retriever: HybridRetriever,
         session_state: SessionStateManager,
         openai_api_key: str,
-        prompt_path: str = "config/prompt.md"
+        prompt_path: str = "config/prompt.md",
+        tool_cache: Optional[ToolResultCache] = None,
+        reminders: Optional[ReminderScheduler] = None,
+        media_pipeline: Optional[MediaPipeline] = None,
+        tts_cache: Optional[TTSCache] = None,
+        voice_synthesizer: Optional[VoiceNoteSynthesizer] = None
     ):
         """Inicializa agente SDR."""
         self.whatsapp = whatsapp_client
@@ -207,6 +243,15 @@ class AgenteSDR:
         self.memory = redis_memory
         self.retriever = hybrid_retriever
         self.session_state = session_state
+        self.tool_cache = tool_cache
+        self.reminders = reminders
+        self.media = media_pipeline or MediaPipeline(whatsapp_client, openai_api_key)
+        self.tts_cache = tts_cache
+        self.voz = voice_synthesizer or VoiceNoteSynthesizer(elevenlabs_client, whatsapp_client)
+
+        # RAG especulativo na preparação do turno
+        self.min_palavras_rag = 3
+        self.max_tokens_rag = 600
 
         # LLM
         self.llm = ChatOpenAI(
@@ -306,6 +351,11 @@ class AgenteSDR:
             ),
         ]
 
+        # Cache de resultados / invalidação conforme política de cada tool
+        if self.tool_cache:
+            for tool in tools:
+                tool.coroutine = self.tool_cache.wrap(tool.name, tool.coroutine)
+
         return tools
 
     # === IMPLEMENTAÇÃO DAS TOOLS ===
@@ -330,27 +380,30 @@ class AgenteSDR:
     async def _tool_enviar_audio(self, telefone: str, texto_para_falar: str) -> str:
         """Tool: Enviar áudio via ElevenLabs."""
         try:
-            # Gerar áudio
-            audio_bytes = await self.elevenlabs.text_to_speech(texto_para_falar)
-
-            # Upload no Supabase Storage
-            audio_path = f"audios/{telefone}/{datetime.now().timestamp()}.mp3"
-            audio_url = await self.supabase.upload_file(
-                bucket="midias",
-                file_path=audio_path,
-                file_data=audio_bytes,
-                content_type="audio/mpeg"
-            )
-
-            # Enviar via WhatsApp
-            await self.whatsapp.send_audio(telefone, audio_url)
+            # Gerar áudio (frases repetidas saem do cache) e enviar ao WhatsApp
+            if self.tts_cache:
+                media_id = await self.tts_cache.obter_media_id(texto_para_falar)
+            else:
+                media_id = await self.voz.sintetizar(texto_para_falar)
+
+            # Enviar via WhatsApp (por ID de mídia, sem URL pública)
+            try:
+                await self.whatsapp.send_audio(telefone, media_id=media_id)
+            except httpx.HTTPStatusError as e:
+                # ID do cache recusado (4xx): descarta e sintetiza uma vez
+                status = e.response.status_code
+                if not self.tts_cache or not 400 <= status < 500 or status == 429:
+                    raise
+                await self.tts_cache.invalidar(texto_para_falar, media_id)
+                media_id = await self.tts_cache.obter_media_id(texto_para_falar)
+                await self.whatsapp.send_audio(telefone, media_id=media_id)
 
             # Salvar na memória
             await self.memory.add_message(
                 telefone,
                 "ai",
                 f"[ÁUDIO]: {texto_para_falar}",
-                metadata={"type": "audio", "url": audio_url}
+                metadata={"type": "audio", "media_id": media_id}
             )
 
             return f"Áudio enviado com sucesso para {telefone}"
@@ -411,9 +464,12 @@ class AgenteSDR:
                 descricao=descricao
             )
 
+            # Link do Meet
+            meet_link = evento.get('hangoutLink', 'N/A')
+
             # Salvar no Supabase
             lead_telefone = await self._get_telefone_from_context()
-            lead = await self.supabase.get_lead(lead_telefone)
+            lead = await self._get_lead_from_context(lead_telefone)
 
             reuniao_data = {
                 "lead_id": lead['id'],
@@ -423,17 +479,25 @@ class AgenteSDR:
                 "data_inicio": inicio.isoformat(),
                 "data_fim": fim.isoformat(),
                 "participantes": participantes,
+                "meet_link": evento.get('hangoutLink'),
                 "status": "agendada"
             }
 
-            await self.supabase.create_reuniao(reuniao_data)
+            reuniao = await self.supabase.create_reuniao(reuniao_data)
+
+            # Lembretes 24h/2h
+            if self.reminders:
+                await self.reminders.agendar(
+                    reuniao['id'],
+                    lead_telefone,
+                    lead.get('nome', ''),
+                    inicio,
+                    evento.get('hangoutLink')
+                )
 
             # Adicionar tag
             await self.supabase.add_tag(lead_telefone, "reuniao_agendada")
 
-            # Link do Meet
-            meet_link = evento.get('hangoutLink', 'N/A')
-
             return f"Reunião agendada com sucesso!\nData: {inicio.strftime('%d/%m/%Y %H:%M')}\nLink do Meet: {meet_link}"
         except Exception as e:
             logger.error(f"Erro ao agendar reunião: {e}")
@@ -452,11 +516,16 @@ class AgenteSDR:
                         reuniao['id'],
                         {"status": "cancelada"}
                     )
+                    if self.reminders:
+                        await self.reminders.cancelar(reuniao['id'])
 
                 # Atualizar tag do lead
                 lead_telefone = await self._get_telefone_from_context()
-                await self.supabase.remove_tag(lead_telefone, "reuniao_agendada")
-                await self.supabase.add_tag(lead_telefone, "reuniao_cancelada")
+                await self.supabase.atualizar_tags(
+                    lead_telefone,
+                    adicionar=["reuniao_cancelada"],
+                    remover=["reuniao_agendada"]
+                )
 
                 return "Reunião cancelada com sucesso."
             else:
@@ -483,6 +552,7 @@ class AgenteSDR:
             )
 
             # Atualizar Supabase
+            lead_telefone = await self._get_telefone_from_context()
             reuniao = await self.supabase.get_reuniao_by_google_id(evento_id)
             if reuniao:
                 await self.supabase.update_reuniao(
@@ -490,14 +560,29 @@ class AgenteSDR:
                     {
                         "data_inicio": inicio.isoformat(),
                         "data_fim": fim.isoformat(),
-                        "status": "agendada"
+                        "status": "agendada",
+                        "lembrete_24h_enviado": False,
+                        "lembrete_2h_enviado": False
                     }
                 )
 
+                # Lembretes passam a valer para o novo horário
+                if self.reminders:
+                    lead = await self._get_lead_from_context(lead_telefone)
+                    await self.reminders.agendar(
+                        reuniao['id'],
+                        lead_telefone,
+                        (lead or {}).get('nome', ''),
+                        inicio,
+                        evento.get('hangoutLink') or reuniao.get('meet_link')
+                    )
+
             # Atualizar tag
-            lead_telefone = await self._get_telefone_from_context()
-            await self.supabase.remove_tag(lead_telefone, "reuniao_cancelada")
-            await self.supabase.add_tag(lead_telefone, "reuniao_reagendada")
+            await self.supabase.atualizar_tags(
+                lead_telefone,
+                adicionar=["reuniao_reagendada"],
+                remover=["reuniao_cancelada"]
+            )
 
             return f"Reunião reagendada para {inicio.strftime('%d/%m/%Y %H:%M')}"
         except Exception as e:
@@ -525,43 +610,18 @@ class AgenteSDR:
     async def _tool_analisar_imagem(self, url_imagem: str) -> str:
         """Tool: Analisar imagem com GPT-4o-mini."""
         try:
-            # Usar GPT-4o-mini com visão
-            response = await self.llm.apredict(
-                f"Analise esta imagem e descreva o que vê: {url_imagem}"
-            )
+            # Pixels reduzidos vão ao modelo de visão; cache por conteúdo
+            response = await self.media.descrever_imagem(url_imagem)
             return f"Análise da imagem: {response}"
         except Exception as e:
             logger.error(f"Erro ao analisar imagem: {e}")
             return f"Erro ao analisar imagem: {str(e)}"
 
     async def _tool_transcrever_audio(self, url_audio: str) -> str:
-        """Tool: Transcrever áudio com Whisper."""
+        """Tool: Transcrever áudio (pipeline de mídias)."""
         try:
-            # Baixar áudio
-            audio_bytes = await self.whatsapp.download_media(url_audio)
-
-            # Transcrever com OpenAI Whisper
-            from openai import AsyncOpenAI
-            client = AsyncOpenAI()
-
-            # Salvar temporariamente
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-                f.write(audio_bytes)
-                temp_path = f.name
-
-            # Transcrever
-            with open(temp_path, "rb") as audio_file:
-                transcription = await client.audio.transcriptions.create(
-                    model="gpt-4o-transcribe",
-                    file=audio_file,
-                    language="pt"
-                )
-
-            # Limpar arquivo temp
-            Path(temp_path).unlink()
-
-            return f"Transcrição do áudio: {transcription.text}"
+            texto = await self.media.transcrever(url_audio)
+            return f"Transcrição do áudio: {texto}"
         except Exception as e:
             logger.error(f"Erro ao transcrever áudio: {e}")
             return f"Erro ao transcrever áudio: {str(e)}"
@@ -569,10 +629,18 @@ class AgenteSDR:
     # === MÉTODOS AUXILIARES ===
 
     async def _get_telefone_from_context(self) -> str:
-        """Obtém telefone do contexto atual."""
-        # TODO: Implementar lógica para obter telefone do contexto
-        # Por enquanto, retornar placeholder
-        return "placeholder_telefone"
+        """Obtém telefone do turno em execução."""
+        turno = _turno_atual.get()
+        if turno is None:
+            raise RuntimeError("Nenhum turno em execução para obter o telefone do lead")
+        return turno.phone
+
+    async def _get_lead_from_context(self, telefone: str) -> Optional[Dict]:
+        """Retorna lead pré-carregado no turno (ou busca no Supabase)."""
+        turno = _turno_atual.get()
+        if turno is not None and turno.phone == telefone and turno.lead:
+            return turno.lead
+        return await self.supabase.get_lead(telefone)
 
     def _create_agent(self) -> AgentExecutor:
         """Cria agent executor com prompt e tools."""
@@ -637,42 +705,135 @@ class AgenteSDR:
 
         return response
 
-    async def process_message(
+    async def prepare_turn(
         self,
         phone: str,
         message: str,
         metadata: Optional[Dict] = None
-    ) -> str:
+    ) -> TurnContext:
         """
-        Processa mensagem do lead.
+        Prepara o turno buscando tudo em paralelo (asyncio.gather).
+
+        - Lê histórico (e em seguida salva a mensagem do lead)
+        - Busca lead e estado da sessão
+        - Roda o RAG especulativamente sobre a mensagem combinada, para o
+          modelo normalmente responder sem precisar chamar buscar_conhecimento
+
+        Falhas individuais não interrompem o turno (campo fica vazio).
 
         Args:
             phone: Telefone do lead
-            message: Mensagem recebida
+            message: Mensagem recebida (combinada pelo buffer)
             metadata: Metadados (mídia, etc)
 
         Returns:
-            Resposta do agente
+            TurnContext com os dados carregados
         """
-        try:
-            # Salvar mensagem na memória
+        async def _historico_e_registro() -> List[Dict]:
+            # Lê o histórico antes de gravar a mensagem atual (que vai no input)
+            historico = await self.memory.get_history_formatted(phone, limit=20)
             await self.memory.add_message(phone, "human", message, metadata)
+            return historico
+
+        async def _conhecimento() -> List:
+            if self.retriever is None or len(message.split()) < self.min_palavras_rag:
+                return []
+            return await self.retriever.retrieve(message, k=3)
+
+        resultados = await asyncio.gather(
+            _historico_e_registro(),
+            self.supabase.get_lead(phone),
+            self.session_state.get_state(phone),
+            _conhecimento(),
+            return_exceptions=True
+        )
+
+        nomes = ("histórico", "lead", "sessão", "conhecimento")
+        for nome, resultado in zip(nomes, resultados):
+            if isinstance(resultado, Exception):
+                logger.warning(f"Pré-carga de {nome} falhou para {phone}: {resultado}")
 
-            # Recuperar histórico
-            chat_history = await self.memory.get_history_formatted(phone, limit=20)
+        def _ok(resultado, default=None):
+            return default if isinstance(resultado, Exception) else resultado
 
-            # Executar agente COM telefone no contexto
-            input_with_context = (
-                f"[TELEFONE DO LEAD: {phone}]\n\n"
-                f"Mensagem do lead: {message}\n\n"
-                f"IMPORTANTE: Use APENAS a tool 'enviar_mensagem' com telefone={phone} para responder. "
-                f"NÃO retorne texto diretamente."
+        historico, lead, sessao, documentos = resultados
+
+        conhecimento = None
+        documentos = _ok(documentos)
+        if documentos:
+            conhecimento = self.retriever.format_documents(
+                documentos,
+                max_tokens=self.max_tokens_rag
             )
 
-            result = await self.agent.ainvoke({
-                "input": input_with_context,
-                "chat_history": chat_history
-            })
+        return TurnContext(
+            phone=phone,
+            chat_history=_ok(historico, []),
+            lead=_ok(lead),
+            session=_ok(sessao, {}) or {},
+            conhecimento=conhecimento
+        )
+
+    def _build_input(self, turno: TurnContext, message: str) -> str:
+        """Monta entrada do agente com o contexto pré-carregado."""
+        partes = [f"[TELEFONE DO LEAD: {turno.phone}]"]
+
+        if turno.lead:
+            dados_lead = {
+                campo: turno.lead.get(campo)
+                for campo in ("nome", "email", "tags", "status")
+                if turno.lead.get(campo)
+            }
+            partes.append(f"[DADOS DO LEAD]\n{json.dumps(dados_lead, ensure_ascii=False)}")
+
+        if turno.session:
+            partes.append(
+                f"[ESTADO DA SESSÃO]\n{json.dumps(turno.session, ensure_ascii=False)}"
+            )
+
+        if turno.conhecimento:
+            partes.append(f"[CONHECIMENTO RELEVANTE]\n{turno.conhecimento}")
+
+        partes.append(f"Mensagem do lead: {message}")
+        partes.append(
+            f"IMPORTANTE: Use APENAS a tool 'enviar_mensagem' com telefone={turno.phone} para responder. "
+            f"NÃO retorne texto diretamente."
+        )
+
+        return "\n\n".join(partes)
+
+    async def process_message(
+        self,
+        phone: str,
+        message: str,
+        metadata: Optional[Dict] = None,
+        turno: Optional[TurnContext] = None
+    ) -> str:
+        """
+        Processa mensagem do lead.
+
+        Args:
+            phone: Telefone do lead
+            message: Mensagem recebida
+            metadata: Metadados (mídia, etc)
+            turno: Contexto já preparado via prepare_turn (opcional)
+
+        Returns:
+            Resposta do agente
+        """
+        try:
+            # Pré-carga paralela (histórico, lead, sessão, RAG)
+            if turno is None:
+                turno = await self.prepare_turn(phone, message, metadata)
+
+            token = _turno_atual.set(turno)
+            try:
+                result = await self.agent.ainvoke({
+                    "input": self._build_input(turno, message),
+                    "chat_history": turno.chat_history
+                })
+            finally:
+                _turno_atual.reset(token)
 
             response = result["output"]
 
@@ -693,5 +854,6 @@ class AgenteSDR:
 
 __all__ = [
     'AgenteSDR',
-    'MessageFormatter'
+    'MessageFormatter',
+    'TurnContext'
 ]
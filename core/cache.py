@@ -0,0 +1,221 @@
+"""
+CORE/CACHE.PY
+=============
+Cache de resultados das tools do agente.
+
+Componentes:
+- ToolCachePolicy: Política declarativa por tool (TTL e invalidações)
+- ToolResultCache: Cache no Redis com chaves derivadas dos argumentos
+
+Cada tool cacheável tem seu próprio TTL. A chave é o hash dos argumentos
+normalizados (espaços, caixa, ordem dos campos), então "Quanto custa?" e
+"quanto  custa?" caem na mesma entrada. Tools com efeito colateral
+(agenda_reuniao, cancela_reuniao...) invalidam as tools relacionadas
+incrementando um contador de geração no Redis: as chaves antigas deixam
+de ser lidas e expiram sozinhas pelo TTL, sem SCAN/DEL.
+"""
+
+import functools
+import hashlib
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Tuple
+
+import redis.asyncio as redis
+from loguru import logger
+
+
+# ==============================================================================
+# POLÍTICAS
+# ==============================================================================
+
+@dataclass(frozen=True)
+class ToolCachePolicy:
+    """
+    Política de cache de uma tool.
+
+    ttl: Segundos de validade do resultado (0 = não cacheia)
+    invalida: Tools cujo cache é invalidado após execução com sucesso
+    """
+    ttl: int = 0
+    invalida: Tuple[str, ...] = ()
+
+
+# ==============================================================================
+# TOOL RESULT CACHE
+# ==============================================================================
+
+class ToolResultCache:
+    """
+    Cache declarativo em volta das coroutines das StructuredTools.
+
+    Uso:
+        cache = ToolResultCache(redis_client, {
+            "consulta_horarios": ToolCachePolicy(ttl=120),
+            "agenda_reuniao": ToolCachePolicy(invalida=("consulta_horarios",)),
+        })
+        coroutine = cache.wrap("consulta_horarios", self._tool_consulta_horarios)
+    """
+
+    PREFIX = "toolcache:"
+
+    # Resultados de erro nunca são cacheados
+    PREFIXOS_ERRO = ("Erro",)
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        policies: Dict[str, ToolCachePolicy],
+        janela_latencia: int = 200
+    ):
+        """
+        Args:
+            redis_client: Cliente Redis async
+            policies: Política por nome de tool
+            janela_latencia: Nº de amostras de latência guardadas por tool
+        """
+        self.redis = redis_client
+        self.policies = policies
+        self.janela_latencia = janela_latencia
+
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._latencias: Dict[str, Dict[str, Deque[float]]] = {}
+
+    # === CHAVES ===
+
+    @staticmethod
+    def _normalizar(valor):
+        """Normaliza argumentos: strings sem espaços extras e minúsculas."""
+        if isinstance(valor, str):
+            return " ".join(valor.split()).lower()
+        if isinstance(valor, dict):
+            return {k: ToolResultCache._normalizar(v) for k, v in valor.items()}
+        if isinstance(valor, (list, tuple)):
+            return [ToolResultCache._normalizar(v) for v in valor]
+        return valor
+
+    def _make_key(self, tool: str, geracao: int, kwargs: Dict) -> str:
+        """Chave: prefixo + tool + geração + hash dos argumentos normalizados."""
+        args = json.dumps(
+            self._normalizar(kwargs),
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        digest = hashlib.sha1(args.encode()).hexdigest()
+        return f"{self.PREFIX}{tool}:{geracao}:{digest}"
+
+    def _geracao_key(self, tool: str) -> str:
+        return f"{self.PREFIX}{tool}:geracao"
+
+    async def _get_geracao(self, tool: str) -> int:
+        valor = await self.redis.get(self._geracao_key(tool))
+        return int(valor) if valor else 0
+
+    # === INVALIDAÇÃO ===
+
+    async def invalidate(self, tool: str):
+        """Invalida todas as entradas de uma tool (nova geração)."""
+        try:
+            await self.redis.incr(self._geracao_key(tool))
+            self._contar(tool, "invalidacoes")
+            logger.debug(f"Cache da tool {tool} invalidado")
+        except Exception as e:
+            logger.warning(f"Erro ao invalidar cache da tool {tool}: {e}")
+
+    # === WRAPPER ===
+
+    def wrap(
+        self,
+        tool: str,
+        coroutine: Callable[..., Awaitable[str]]
+    ) -> Callable[..., Awaitable[str]]:
+        """
+        Envolve a coroutine da tool com cache/invalidação conforme a política.
+
+        Tools sem política são retornadas sem alteração.
+        """
+        policy = self.policies.get(tool)
+        if not policy:
+            return coroutine
+
+        @functools.wraps(coroutine)
+        async def _wrapped(**kwargs) -> str:
+            inicio = time.perf_counter()
+            key = None
+
+            if policy.ttl > 0:
+                try:
+                    key = self._make_key(tool, await self._get_geracao(tool), kwargs)
+                    cached = await self.redis.get(key)
+                    if cached is not None:
+                        self._registrar(tool, "hits", inicio)
+                        return cached.decode() if isinstance(cached, bytes) else cached
+                except Exception as e:
+                    logger.warning(f"Erro ao ler cache da tool {tool}: {e}")
+                    key = None
+
+            resultado = await coroutine(**kwargs)
+            self._registrar(tool, "misses" if policy.ttl > 0 else "execucoes", inicio)
+
+            if resultado.startswith(self.PREFIXOS_ERRO):
+                return resultado
+
+            if key:
+                try:
+                    await self.redis.setex(key, policy.ttl, resultado)
+                except Exception as e:
+                    logger.warning(f"Erro ao gravar cache da tool {tool}: {e}")
+
+            for relacionada in policy.invalida:
+                await self.invalidate(relacionada)
+
+            return resultado
+
+        return _wrapped
+
+    # === ESTATÍSTICAS ===
+
+    def _contar(self, tool: str, campo: str):
+        stats = self._stats.setdefault(
+            tool,
+            {"hits": 0, "misses": 0, "execucoes": 0, "invalidacoes": 0}
+        )
+        stats[campo] += 1
+
+    def _registrar(self, tool: str, campo: str, inicio: float):
+        """Conta o evento e guarda a latência (ms) na janela da tool."""
+        self._contar(tool, campo)
+        latencias = self._latencias.setdefault(tool, {})
+        janela = latencias.setdefault(campo, deque(maxlen=self.janela_latencia))
+        janela.append((time.perf_counter() - inicio) * 1000)
+
+    @staticmethod
+    def _resumo_latencia(amostras: Deque[float]) -> Dict:
+        ordenadas = sorted(amostras)
+        p95 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+        return {
+            "media_ms": round(sum(ordenadas) / len(ordenadas), 2),
+            "p95_ms": round(p95, 2)
+        }
+
+    def get_stats(self) -> Dict:
+        """Taxa de acerto e latência (média/p95) por tool."""
+        resultado = {}
+        for tool, stats in self._stats.items():
+            consultas = stats["hits"] + stats["misses"]
+            resultado[tool] = {
+                **stats,
+                "taxa_acerto": round(stats["hits"] / consultas, 3) if consultas else 0.0,
+                "latencia": {
+                    campo: self._resumo_latencia(amostras)
+                    for campo, amostras in self._latencias.get(tool, {}).items()
+                    if amostras
+                }
+            }
+        return resultado
+
+
+__all__ = ['ToolCachePolicy', 'ToolResultCache']
@@ -11,17 +11,100 @@ Timeline:
 
 Horário: 07h-21h
 Janela: 72 horas totais
+
+Agendamento: fila no Redis (sorted set telefone -> fup_proximo_horario).
+Um worker dorme até o próximo vencimento (BLPOP com timeout, acordado a
+cada novo agendamento), retira os vencidos de forma atômica entre réplicas
+e processa. A varredura no banco serve apenas para reconciliar a fila.
+
+Execução: leads processados em paralelo (semáforo + orçamento de tokens
+do LLM por minuto), falhas isoladas por lead e fragmentos enviados por
+uma fila atrasada no Redis, sem sleep entre eles.
+
+Fragmentos: cada follow-up é um item só na fila atrasada, com os
+fragmentos que faltam; o próximo fragmento só é agendado depois que o
+anterior sai (uma falha atrasa o restante junto, sem inverter a ordem).
+Como nos lembretes, o item retirado fica "em andamento" com lease e
+volta para a fila se a instância cair antes de concluí-lo.
 """
 
 import asyncio
-from datetime import datetime, timedelta
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Union
+
+import redis.asyncio as redis
 from loguru import logger
+from pydantic import BaseModel, Field
 
 from core.integrations import WhatsAppClient, SupabaseClient
-from core.memory import RedisMemoryManager
+from core.leader import LeaderElection
+from core.memory import RedisMemoryManager, PassageChunker
+
+
+# ==============================================================================
+# ORÇAMENTO DE TOKENS
+# ==============================================================================
+
+class TokenBudget:
+    """
+    Limite de tokens de LLM por minuto (balde de tokens).
+
+    Chamadas concorrentes aguardam em ordem até haver saldo; o saldo é
+    reposto continuamente à taxa de tokens_por_minuto / 60 por segundo.
+    """
+
+    def __init__(self, tokens_por_minuto: int):
+        self.capacidade = float(tokens_por_minuto)
+        self.disponivel = self.capacidade
+        self.taxa = self.capacidade / 60.0
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    async def consumir(self, tokens: int):
+        """Aguarda até haver saldo e consome `tokens`."""
+        tokens = min(float(tokens), self.capacidade)
+        async with self._lock:
+            while True:
+                self._repor()
+                if self.disponivel >= tokens:
+                    self.disponivel -= tokens
+                    return
+                await asyncio.sleep((tokens - self.disponivel) / self.taxa)
+
+
+# ==============================================================================
+# DECISÃO ESTRUTURADA
+# ==============================================================================
+
+class FollowUpDecisao(BaseModel):
+    """Veredito de desinteresse + mensagem de follow-up já fragmentada."""
+    desinteresse: bool = Field(
+        description="True se o lead demonstra desinteresse claro"
+    )
+    fragmentos: List[str] = Field(
+        description="Mensagem de follow-up em fragmentos de 20-30 palavras (vazio se desinteresse)"
+    )
+
 
+class FollowUpMensagem(BaseModel):
+    """Apenas a mensagem (veredito reaproveitado de análise anterior)."""
+    fragmentos: List[str] = Field(
+        description="Mensagem de follow-up em fragmentos de 20-30 palavras"
+    )
+
+
+# ==============================================================================
+# FOLLOW-UP MANAGER
+# ==============================================================================
 
 class FollowUpManager:
     """
@@ -45,19 +128,110 @@ class FollowUpManager:
     HORARIO_INICIO = 7   # 7h
     HORARIO_FIM = 21     # 21h
 
+    # Tags que bloqueiam follow-up
+    TAGS_BLOQUEIO = {'BREAK', 'nao_interessado', 'atendimento_humano', 'reuniao_agendada'}
+
+    # Fila de vencimentos (score = epoch do fup_proximo_horario)
+    FILA_KEY = "followup:fila"
+    DESPERTAR_KEY = "followup:despertar"
+
+    # Fila atrasada de fragmentos (ZSET id -> epoch do próximo envio,
+    # HASH id -> {telefone, fragmentos restantes, tentativas} e ZSET dos
+    # retirados id -> fim do lease)
+    FRAGMENTOS_KEY = "followup:fragmentos"
+    FRAGMENTOS_DADOS_KEY = "followup:fragmentos:dados"
+    FRAGMENTOS_EM_ANDAMENTO_KEY = "followup:fragmentos:em_andamento"
+    INTERVALO_FRAGMENTOS = 2  # segundos entre fragmentos
+    MAX_TENTATIVAS_FRAGMENTO = 3  # envios com falha são reagendados com backoff
+    LEASE_FRAGMENTOS = 60  # segundos para enviar um lote retirado
+
+    # Estimativa de tokens de saída da decisão (veredito + fragmentos)
+    TOKENS_SAIDA_DECISAO = 320
+
+    # Veredito de desinteresse por lead: {versao do histórico, desinteresse}
+    VEREDITO_PREFIX = "followup:veredito:"
+
+    # Marca de envio por lead + follow-up + vencimento (idempotência)
+    ENVIO_PREFIX = "followup:enviado:"
+    ENVIO_TTL = 7 * 24 * 3600
+
+    # Retira atomicamente até N telefones vencidos (se ARGV[3] não for vazio,
+    # só enquanto o lease KEYS[2] tiver esse valor: fencing do líder)
+    _RETIRAR_VENCIDOS = """
+    if ARGV[3] ~= '' and redis.call('get', KEYS[2]) ~= ARGV[3] then
+        return {}
+    end
+    local itens = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    if #itens > 0 then
+        redis.call('zrem', KEYS[1], unpack(itens))
+    end
+    return itens
+    """
+
+    # Como _RETIRAR_VENCIDOS, mas move os itens para "em andamento" (KEYS[3])
+    # com score ARGV[4] = fim do lease
+    _RETIRAR_FRAGMENTOS = """
+    if ARGV[3] ~= '' and redis.call('get', KEYS[2]) ~= ARGV[3] then
+        return {}
+    end
+    local itens = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    for _, item in ipairs(itens) do
+        redis.call('zrem', KEYS[1], item)
+        redis.call('zadd', KEYS[3], ARGV[4], item)
+    end
+    return itens
+    """
+
+    # Devolve à fila (score ARGV[2]) itens em andamento com lease até ARGV[1]
+    _DEVOLVER_FRAGMENTOS = """
+    local itens = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1])
+    for _, item in ipairs(itens) do
+        redis.call('zrem', KEYS[2], item)
+        redis.call('zadd', KEYS[1], 'NX', ARGV[2], item)
+    end
+    return #itens
+    """
+
     def __init__(
         self,
         whatsapp_client: WhatsAppClient,
         supabase_client: SupabaseClient,
         memory: RedisMemoryManager,
         llm,
-        prompt_followup_path: str = "config/prompt-followup.md"
+        prompt_followup_path: str = "config/prompt-followup.md",
+        redis_client: Optional[redis.Redis] = None,
+        max_concorrencia: int = 10,
+        tokens_por_minuto: int = 200_000
     ):
-        """Inicializa follow-up manager."""
+        """
+        Inicializa follow-up manager.
+
+        Args:
+            max_concorrencia: Leads processados ao mesmo tempo
+            tokens_por_minuto: Orçamento de tokens de LLM por minuto
+        """
         self.whatsapp = whatsapp_client
         self.supabase = supabase_client
         self.memory = memory
         self.llm = llm
+        self.redis = redis_client or memory.redis
+
+        # Eleição de líder (opcional): cerca as retiradas das filas
+        self.lideranca: Optional[LeaderElection] = None
+
+        # Saída estruturada: {desinteresse, fragmentos} via JSON schema
+        self._llm_decisao = llm.with_structured_output(FollowUpDecisao, method="json_schema")
+        self._llm_mensagem = llm.with_structured_output(FollowUpMensagem, method="json_schema")
+        self.veredito_stats = {"classificacoes": 0, "classificacoes_evitadas": 0}
+
+        # Execução concorrente limitada
+        self._semaforo = asyncio.Semaphore(max_concorrencia)
+        self.orcamento = TokenBudget(tokens_por_minuto)
+        # Progresso por lote: em andamento + último concluído
+        self.progresso = self._novo_progresso(0)
+        self._lotes: Dict[int, Dict] = {}
+        self._proximo_lote = 0
+        self.acumulado = {"processados": 0, "erros": 0}
 
         # Carregar prompt de follow-up
         self.prompt_followup = Path(prompt_followup_path).read_text()
@@ -69,48 +243,362 @@ class FollowUpManager:
         Chamado periodicamente (ex: a cada 5 minutos).
         """
         agora = datetime.utcnow()
+        total = 0
 
-        # Buscar leads elegíveis para follow-up
-        leads = await self._buscar_leads_elegiveis(agora)
+        # Buscar leads elegíveis para follow-up (página a página)
+        async for leads in self._paginar_leads_elegiveis(agora):
+            total += len(leads)
+            await self.processar_lote(
+                leads,
+                lambda lead: self._processar_followup_lead(lead, agora),
+                chave=lambda lead: lead['telefone']
+            )
 
-        logger.info(f"Follow-up: {len(leads)} leads elegíveis")
+        logger.info(f"Follow-up: {total} leads elegíveis")
 
-        for lead in leads:
-            try:
-                await self._processar_followup_lead(lead, agora)
-            except Exception as e:
-                logger.error(f"Erro ao processar follow-up de {lead['telefone']}: {e}")
+    # === EXECUÇÃO CONCORRENTE ===
 
-    async def _buscar_leads_elegiveis(self, agora: datetime) -> List[Dict]:
+    async def processar_lote(self, itens: List, processar, chave=str) -> Dict:
         """
-        Busca leads elegíveis para follow-up.
+        Processa itens em paralelo (até max_concorrencia), isolando falhas.
+
+        Args:
+            itens: Leads ou telefones
+            processar: Coroutine function aplicada a cada item
+            chave: Identificação do item nos logs
 
-        Critérios:
-        - fup_proximo_horario <= agora
+        Returns:
+            Progresso do lote
+        """
+        # Cada lote tem o próprio progresso (lotes concorrentes não se misturam)
+        progresso = self._novo_progresso(len(itens), time.time())
+        lote_id = self._proximo_lote
+        self._proximo_lote += 1
+        self._lotes[lote_id] = progresso
+
+        async def _isolado(item):
+            async with self._semaforo:
+                try:
+                    await processar(item)
+                except Exception as e:
+                    progresso["erros"] += 1
+                    self.acumulado["erros"] += 1
+                    logger.error(f"Erro ao processar follow-up de {chave(item)}: {e}")
+                finally:
+                    progresso["processados"] += 1
+                    self.acumulado["processados"] += 1
+
+        try:
+            await asyncio.gather(*(_isolado(item) for item in itens))
+        finally:
+            del self._lotes[lote_id]
+
+        # Atualizações dos leads do lote em uma única escrita
+        try:
+            await self.supabase.flush_updates()
+        except Exception as e:
+            logger.error(f"Erro ao gravar atualizações do lote de follow-up: {e}")
+
+        progresso["concluido_em"] = time.time()
+        if itens:
+            self.progresso = progresso
+            resumo = self._resumo_lote(progresso)
+            logger.info(
+                f"Lote de follow-up: {resumo['processados']}/{resumo['total']} "
+                f"({resumo['erros']} erros) em {resumo['duracao_segundos']}s, "
+                f"{resumo['leads_por_segundo']} leads/s"
+            )
+        return progresso
+
+    @staticmethod
+    def _novo_progresso(total: int, iniciado_em: Optional[float] = None) -> Dict:
+        return {
+            "total": total,
+            "processados": 0,
+            "erros": 0,
+            "iniciado_em": iniciado_em,
+            "concluido_em": None
+        }
+
+    @staticmethod
+    def _resumo_lote(progresso: Dict) -> Dict:
+        """Progresso e vazão de um lote."""
+        inicio = progresso["iniciado_em"]
+        fim = progresso["concluido_em"] or time.time()
+        duracao = (fim - inicio) if inicio else 0.0
+
+        return {
+            **{k: v for k, v in progresso.items() if k not in ("iniciado_em", "concluido_em")},
+            "duracao_segundos": round(duracao, 2),
+            "leads_por_segundo": round(progresso["processados"] / duracao, 2) if duracao else 0.0
+        }
+
+    def get_stats(self) -> Dict:
+        """Último lote concluído, lotes em andamento e totais desde o startup."""
+        return {
+            **self._resumo_lote(self.progresso),
+            "em_andamento": [self._resumo_lote(p) for p in self._lotes.values()],
+            "acumulado": dict(self.acumulado),
+            "veredito": dict(self.veredito_stats)
+        }
+
+    async def _paginar_leads_elegiveis(
+        self,
+        agora: Optional[datetime],
+        pagina: int = 500
+    ) -> AsyncIterator[List[Dict]]:
+        """
+        Busca leads elegíveis para follow-up, em páginas (keyset).
+
+        Critérios (filtrados no Postgres, RPC buscar_leads_followup):
+        - fup_proximo_horario <= agora (agora=None: todos os pendentes)
         - tags não contém BREAK, nao_interessado, atendimento_humano, reuniao_agendada
         - fup_enviado < 4
+
+        Yields:
+            Listas de {telefone, fup_enviado, fup_proximo_horario}
+        """
+        apos = None
+
+        while True:
+            leads = await self.supabase.buscar_leads_followup(
+                sorted(self.TAGS_BLOQUEIO),
+                agora=agora,
+                apos=apos,
+                limite=pagina
+            )
+            if leads:
+                yield leads
+
+            if len(leads) < pagina:
+                break
+            apos = (leads[-1]['fup_proximo_horario'], leads[-1]['telefone'])
+
+    def _is_elegivel(self, lead: Dict) -> bool:
+        """Lead sem tags de bloqueio e com follow-ups restantes."""
+        if (lead.get('fup_enviado') or 0) >= 4:
+            return False
+        return not any(tag in self.TAGS_BLOQUEIO for tag in (lead.get('tags') or []))
+
+    # === FILA DE VENCIMENTOS ===
+
+    @staticmethod
+    def _epoch(horario: Union[str, datetime]) -> float:
+        """Converte horário (ISO ou datetime; sem fuso = UTC) em epoch."""
+        if isinstance(horario, str):
+            horario = datetime.fromisoformat(horario.replace('Z', '+00:00'))
+        if horario.tzinfo is None:
+            horario = horario.replace(tzinfo=timezone.utc)
+        return horario.timestamp()
+
+    async def _enfileirar(self, telefone: str, horario: Union[str, datetime]):
+        """Agenda (ou reagenda) o próximo follow-up do lead e acorda o worker."""
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.FILA_KEY, {telefone: self._epoch(horario)})
+        pipe.lpush(self.DESPERTAR_KEY, 1)
+        pipe.ltrim(self.DESPERTAR_KEY, 0, 99)
+        await pipe.execute()
+
+    async def _desenfileirar(self, telefone: str):
+        """Remove o lead da fila (sem próximos follow-ups)."""
+        await self.redis.zrem(self.FILA_KEY, telefone)
+
+    def _cerca(self) -> List[str]:
+        return self.lideranca.cerca() if self.lideranca else ["", ""]
+
+    async def _retirar(self, chave: str, limite: int) -> List:
+        lease, valor = self._cerca()
+        return await self.redis.eval(
+            self._RETIRAR_VENCIDOS, 2, chave, lease, time.time(), limite, valor
+        )
+
+    async def retirar_vencidos(self, limite: int = 50) -> List[str]:
+        """Retira atomicamente os telefones com follow-up vencido."""
+        itens = await self._retirar(self.FILA_KEY, limite)
+        return [i.decode() if isinstance(i, bytes) else i for i in itens]
+
+    async def segundos_ate_proximo(self, maximo: float) -> float:
+        """Tempo até o próximo vencimento (limitado a `maximo`)."""
+        proximo = await self.redis.zrange(self.FILA_KEY, 0, 0, withscores=True)
+        if not proximo:
+            return maximo
+        return min(max(proximo[0][1] - time.time(), 0.0), maximo)
+
+    async def aguardar_proximo(self, maximo: float = 60.0):
+        """
+        Bloqueia até o próximo vencimento ou até um novo agendamento.
+
+        O BLPOP na lista de despertar retorna assim que alguém agenda um
+        follow-up (possivelmente mais cedo que o atual primeiro da fila).
+        """
+        espera = await self.segundos_ate_proximo(maximo)
+        if espera <= 0:
+            return
+        await self.redis.blpop(self.DESPERTAR_KEY, timeout=max(espera, 0.01))
+
+    async def processar_telefone(self, telefone: str):
+        """
+        Processa um follow-up retirado da fila.
+
+        O lead é relido do banco (fonte da verdade): se deixou de ser
+        elegível ou o horário foi adiado, nada é enviado.
+        """
+        lead = await self.supabase.get_lead(telefone, fresh=True)
+        if not lead or not lead.get('fup_proximo_horario') or not self._is_elegivel(lead):
+            return
+
+        vencimento = self._epoch(lead['fup_proximo_horario'])
+        if vencimento > time.time() + 1:
+            await self._enfileirar(telefone, lead['fup_proximo_horario'])
+            return
+
+        try:
+            await self._processar_followup_lead(lead, datetime.utcnow())
+        except Exception:
+            # Nova tentativa em 1 minuto, só se a mensagem não chegou a sair
+            # (falhas depois do envio são corrigidas pela reconciliação, que
+            # encontra a marca de envio e apenas atualiza o lead)
+            if not await self.redis.exists(self._chave_envio(lead)):
+                await self._enfileirar(telefone, datetime.utcnow() + timedelta(minutes=1))
+            raise
+
+    async def processar_vencidos(self, telefones: List[str]) -> Dict:
+        """Processa em paralelo os telefones retirados da fila."""
+        return await self.processar_lote(telefones, self.processar_telefone)
+
+    # === FRAGMENTOS ATRASADOS ===
+
+    async def _enfileirar_fragmentos(self, telefone: str, fragmentos: List[str]):
+        """Agenda os fragmentos restantes de um follow-up (um item na fila)."""
+        if not fragmentos:
+            return
+
+        item_id = str(uuid.uuid4())
+        pipe = self.redis.pipeline()
+        pipe.hset(self.FRAGMENTOS_DADOS_KEY, item_id, json.dumps({
+            "telefone": telefone, "fragmentos": fragmentos, "tentativas": 0
+        }))
+        pipe.zadd(self.FRAGMENTOS_KEY, {item_id: time.time() + self.INTERVALO_FRAGMENTOS})
+        await pipe.execute()
+
+    async def recuperar_fragmentos_expirados(self) -> int:
+        """Devolve à fila fragmentos retirados cujo lease venceu (instância caiu)."""
+        devolvidos = await self.redis.eval(
+            self._DEVOLVER_FRAGMENTOS, 2, self.FRAGMENTOS_KEY, self.FRAGMENTOS_EM_ANDAMENTO_KEY,
+            time.time(), time.time()
+        )
+        if devolvidos:
+            logger.warning(f"{devolvidos} fragmentos de follow-up com lease vencido devolvidos à fila")
+        return devolvidos
+
+    async def despachar_fragmentos(self, limite: int = 100) -> int:
+        """
+        Envia o próximo fragmento de cada follow-up vencido.
+
+        O item sai de "em andamento" só depois do envio: se a instância
+        cair entre o envio e a conclusão, o fragmento é reenviado quando o
+        lease vencer (preferimos duplicar um fragmento a perdê-lo).
+
+        Returns:
+            Número de fragmentos enviados
         """
-        # Query no Supabase
-        result = self.supabase.client.table('leads_wpp')\
-            .select('*')\
-            .lte('fup_proximo_horario', agora.isoformat())\
-            .lt('fup_enviado', 4)\
-            .execute()
+        await self.recuperar_fragmentos_expirados()
 
-        leads = result.data
+        agora = time.time()
+        lease, valor = self._cerca()
+        itens = await self.redis.eval(
+            self._RETIRAR_FRAGMENTOS, 3, self.FRAGMENTOS_KEY, lease,
+            self.FRAGMENTOS_EM_ANDAMENTO_KEY, agora, limite, valor, agora + self.LEASE_FRAGMENTOS
+        )
+        if not itens:
+            return 0
+
+        item_ids = [i.decode() if isinstance(i, bytes) else i for i in itens]
+        brutos = await self.redis.hmget(self.FRAGMENTOS_DADOS_KEY, item_ids)
+
+        enviados = 0
+        for item_id, bruto in zip(item_ids, brutos):
+            # Formato anterior: o membro era o JSON de um único fragmento
+            if not bruto and item_id.startswith("{"):
+                antigo = json.loads(item_id)
+                bruto = json.dumps({"telefone": antigo["telefone"], "fragmentos": [antigo["texto"]]})
+            if not bruto:
+                await self._concluir_fragmentos(item_id)
+                continue
+
+            dados = json.loads(bruto)
+            try:
+                await self.whatsapp.send_text(dados['telefone'], dados['fragmentos'][0])
+            except Exception as e:
+                logger.error(f"Erro ao enviar fragmento de follow-up para {dados['telefone']}: {e}")
+                await self._reagendar_fragmentos(item_id, dados)
+                continue
+
+            enviados += 1
+            dados['fragmentos'] = dados['fragmentos'][1:]
+            dados['tentativas'] = 0
+            if dados['fragmentos']:
+                await self._agendar_fragmentos(item_id, dados, time.time() + self.INTERVALO_FRAGMENTOS)
+            else:
+                await self._concluir_fragmentos(item_id)
+
+        return enviados
+
+    async def _agendar_fragmentos(self, item_id: str, dados: Dict, horario: float):
+        """Grava o restante e devolve o item à fila (saindo de "em andamento")."""
+        pipe = self.redis.pipeline()
+        pipe.hset(self.FRAGMENTOS_DADOS_KEY, item_id, json.dumps(dados))
+        pipe.zadd(self.FRAGMENTOS_KEY, {item_id: horario})
+        pipe.zrem(self.FRAGMENTOS_EM_ANDAMENTO_KEY, item_id)
+        await pipe.execute()
+
+    async def _concluir_fragmentos(self, item_id: str):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.FRAGMENTOS_EM_ANDAMENTO_KEY, item_id)
+        pipe.hdel(self.FRAGMENTOS_DADOS_KEY, item_id)
+        await pipe.execute()
+
+    async def _reagendar_fragmentos(self, item_id: str, dados: Dict):
+        """Reagenda o fragmento (e os seguintes, no mesmo item) com backoff, ou desiste."""
+        dados['tentativas'] = dados.get('tentativas', 0) + 1
+        if dados['tentativas'] >= self.MAX_TENTATIVAS_FRAGMENTO:
+            logger.error(
+                f"{len(dados['fragmentos'])} fragmentos de follow-up para {dados['telefone']} "
+                f"descartados após {dados['tentativas']} tentativas"
+            )
+            await self._concluir_fragmentos(item_id)
+            return
 
-        # Filtrar por tags
-        leads_elegiveis = []
-        for lead in leads:
-            tags = lead.get('tags', [])
+        await self._agendar_fragmentos(
+            item_id, dados, time.time() + 30 * 2 ** (dados['tentativas'] - 1)
+        )
+
+    async def segundos_ate_proximo_fragmento(self, maximo: float = 1.0) -> float:
+        proximo = await self.redis.zrange(self.FRAGMENTOS_KEY, 0, 0, withscores=True)
+        if not proximo:
+            return maximo
+        return min(max(proximo[0][1] - time.time(), 0.05), maximo)
 
-            # Tags que bloqueiam follow-up
-            tags_bloqueio = {'BREAK', 'nao_interessado', 'atendimento_humano', 'reuniao_agendada'}
+    async def reconciliar(self, pagina: int = 1000) -> int:
+        """
+        Sincroniza a fila com o banco (leads com próximo follow-up pendente).
 
-            if not any(tag in tags_bloqueio for tag in tags):
-                leads_elegiveis.append(lead)
+        Cobre agendamentos feitos fora deste processo ou perdidos no Redis.
 
-        return leads_elegiveis
+        Returns:
+            Número de leads enfileirados
+        """
+        total = 0
+
+        async for leads in self._paginar_leads_elegiveis(None, pagina):
+            await self.redis.zadd(self.FILA_KEY, {
+                lead['telefone']: self._epoch(lead['fup_proximo_horario'])
+                for lead in leads
+            })
+            total += len(leads)
+
+        logger.info(f"Fila de follow-up reconciliada: {total} leads")
+        return total
 
     async def _processar_followup_lead(self, lead: Dict, agora: datetime):
         """
@@ -118,36 +606,46 @@ class FollowUpManager:
 
         1. Verifica horário comercial
         2. Analisa histórico (desinteresse)
-        3. Gera mensagem
+        3. Gera mensagem (2 e 3 na mesma chamada estruturada)
         4. Envia
         5. Atualiza lead
         """
         telefone = lead['telefone']
         fup_numero = lead['fup_enviado'] + 1
+        chave_envio = self._chave_envio(lead)
 
         # 1. Verificar horário comercial
         if not self._is_horario_comercial(agora):
             logger.info(f"Fora do horário comercial para {telefone}")
             # Reagendar para próximo horário comercial
             proximo_horario = self._proximo_horario_comercial(agora)
-            await self.supabase.update_lead(telefone, {
+            await self.supabase.update_lead_adiado(telefone, {
                 'fup_proximo_horario': proximo_horario.isoformat()
             })
+            await self._enfileirar(telefone, proximo_horario)
+            return
+
+        # Já enviado numa tentativa anterior que falhou depois do envio
+        if await self.redis.exists(chave_envio):
+            logger.warning(f"Follow-up {fup_numero} de {telefone} já enviado, apenas atualizando o lead")
+            await self._atualizar_lead_pos_followup(telefone, fup_numero, agora)
             return
 
-        # 2. Analisar histórico (detectar desinteresse)
-        desinteresse = await self._analisar_desinteresse(telefone)
+        # 2-3. Analisar desinteresse e gerar mensagem (uma chamada ao LLM)
+        decisao = await self._decidir_followup(telefone, fup_numero)
 
-        if desinteresse:
+        if decisao.desinteresse:
             logger.info(f"Desinteresse detectado para {telefone}, adicionando tag BREAK")
             await self.supabase.add_tag(telefone, 'BREAK')
+            await self._desenfileirar(telefone)
             return
 
-        # 3. Gerar mensagem de follow-up
-        mensagem = await self._gerar_mensagem_followup(telefone, fup_numero)
+        if not decisao.fragmentos:
+            raise ValueError("LLM não retornou fragmentos de follow-up")
 
-        # 4. Enviar mensagem
-        await self._enviar_followup(telefone, mensagem)
+        # 4. Enviar mensagem (marca de envio gravada antes)
+        if not await self._enviar_followup(telefone, decisao.fragmentos, chave_envio):
+            return
 
         # 5. Atualizar lead
         await self._atualizar_lead_pos_followup(telefone, fup_numero, agora)
@@ -172,20 +670,42 @@ class FollowUpManager:
             # Já está em horário comercial
             return dt
 
-    async def _analisar_desinteresse(self, telefone: str) -> bool:
+    async def _get_veredito(self, telefone: str, versao: int) -> Optional[bool]:
+        """Veredito de desinteresse já calculado para esta versão da conversa."""
+        try:
+            cached = await self.redis.get(f"{self.VEREDITO_PREFIX}{telefone}")
+            if cached:
+                veredito = json.loads(cached)
+                if veredito.get("versao") == versao:
+                    return veredito["desinteresse"]
+        except Exception as e:
+            logger.warning(f"Erro ao ler veredito de {telefone}: {e}")
+        return None
+
+    async def _salvar_veredito(self, telefone: str, versao: int, desinteresse: bool):
+        try:
+            await self.redis.setex(
+                f"{self.VEREDITO_PREFIX}{telefone}",
+                self.memory.ttl_hours * 3600,
+                json.dumps({"versao": versao, "desinteresse": desinteresse})
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao salvar veredito de {telefone}: {e}")
+
+    async def _decidir_followup(self, telefone: str, fup_numero: int) -> FollowUpDecisao:
         """
-        Analisa histórico de conversa para detectar desinteresse.
-
-        Usa LLM para identificar sinais de desinteresse.
+        Decide e gera o follow-up em uma única chamada estruturada ao LLM.
 
-        Returns:
-            True se detectar desinteresse, False caso contrário
+        O histórico é buscado uma vez e usado tanto para o veredito de
+        desinteresse quanto para os fragmentos da mensagem. Se o lead não
+        escreveu nada desde a última análise (mesma versão do histórico),
+        o veredito anterior é reaproveitado e o LLM só gera a mensagem.
         """
-        # Buscar histórico
+        versao = await self.memory.get_history_version(telefone)
         historico = await self.memory.get_history_formatted(telefone, limit=20)
 
-        if len(historico) < 2:
-            return False  # Pouco histórico, não dá para analisar
+        # Pouco histórico: não dá para concluir desinteresse
+        veredito = False if len(historico) < 2 else await self._get_veredito(telefone, versao)
 
         # Formatar histórico
         historico_texto = "\n".join([
@@ -193,45 +713,7 @@ class FollowUpManager:
             for msg in historico
         ])
 
-        # Prompt de análise
-        prompt_analise = f"""
-        Analise o histórico de conversa abaixo e identifique se o lead demonstra DESINTERESSE.
-
-        Sinais de desinteresse:
-        - Respostas muito curtas e secas
-        - Ignorou perguntas diretas
-        - Deu desculpas vagas
-        - Disse explicitamente que não tem interesse
-        - Padrão de engajamento decrescente
-
-        Histórico:
-        {historico_texto}
-
-        Responda APENAS "SIM" se detectar desinteresse claro, ou "NÃO" caso contrário.
-        """
-
-        resposta = await self.llm.apredict(prompt_analise)
-        desinteresse = "SIM" in resposta.upper()
-
-        return desinteresse
-
-    async def _gerar_mensagem_followup(self, telefone: str, fup_numero: int) -> str:
-        """
-        Gera mensagem de follow-up contextualizada.
-
-        Usa o prompt de follow-up e histórico da conversa.
-        """
-        # Buscar histórico
-        historico = await self.memory.get_history_formatted(telefone, limit=10)
-
-        # Formatar histórico
-        historico_texto = "\n".join([
-            f"{msg['role'].upper()}: {msg['content']}"
-            for msg in historico
-        ])
-
-        # Prompt de geração
-        prompt = f"""
+        contexto = f"""
         {self.prompt_followup}
 
         ---
@@ -243,40 +725,100 @@ class FollowUpManager:
         {historico_texto}
 
         ---
+        """
 
+        tarefa_mensagem = f"""
         Gere uma mensagem de follow-up adequada para o estágio {fup_numero}.
         Seja contextual, agregue valor e siga as orientações do prompt de follow-up.
+        Cada fragmento deve ter 20-30 palavras.
+        """
 
-        IMPORTANTE: Fragmente a mensagem em partes de 20-30 palavras.
-        Separe cada fragmento com "|||".
+        if veredito is not None:
+            if len(historico) >= 2:
+                self.veredito_stats["classificacoes_evitadas"] += 1
 
-        Mensagem:
+            prompt = f"""
+        {contexto}
+        TAREFA - MENSAGEM:
+        {tarefa_mensagem}
         """
+            await self.orcamento.consumir(
+                PassageChunker.estimar_tokens(prompt) + self.TOKENS_SAIDA_DECISAO
+            )
+            mensagem: FollowUpMensagem = await self._llm_mensagem.ainvoke(prompt)
+            decisao = FollowUpDecisao(desinteresse=veredito, fragmentos=mensagem.fragmentos)
+        else:
+            self.veredito_stats["classificacoes"] += 1
 
-        mensagem_completa = await self.llm.apredict(prompt)
+            prompt = f"""
+        {contexto}
+        TAREFA 1 - DESINTERESSE:
+        Identifique se o lead demonstra DESINTERESSE claro.
 
-        return mensagem_completa
+        Sinais de desinteresse:
+        - Respostas muito curtas e secas
+        - Ignorou perguntas diretas
+        - Deu desculpas vagas
+        - Disse explicitamente que não tem interesse
+        - Padrão de engajamento decrescente
 
-    async def _enviar_followup(self, telefone: str, mensagem: str):
+        TAREFA 2 - MENSAGEM (apenas se não houver desinteresse):
+        {tarefa_mensagem}
         """
-        Envia mensagem de follow-up fragmentada.
+            await self.orcamento.consumir(
+                PassageChunker.estimar_tokens(prompt) + self.TOKENS_SAIDA_DECISAO
+            )
+            decisao = await self._llm_decisao.ainvoke(prompt)
+            await self._salvar_veredito(telefone, versao, decisao.desinteresse)
+
+        decisao.fragmentos = [f.strip() for f in decisao.fragmentos if f.strip()]
+        return decisao
+
+    def _chave_envio(self, lead: Dict) -> str:
+        """Marca de envio do próximo follow-up do lead (única por vencimento)."""
+        fup_numero = (lead.get('fup_enviado') or 0) + 1
+        vencimento = int(self._epoch(lead['fup_proximo_horario']))
+        return f"{self.ENVIO_PREFIX}{lead['telefone']}:{fup_numero}:{vencimento}"
+
+    async def _enviar_followup(self, telefone: str, fragmentos: List[str], chave_envio: str) -> bool:
         """
-        # Fragmentar por |||
-        fragmentos = [f.strip() for f in mensagem.split("|||") if f.strip()]
+        Envia mensagem de follow-up fragmentada.
 
-        for i, fragmento in enumerate(fragmentos):
-            if i > 0:
-                await asyncio.sleep(2)  # Delay entre fragmentos
+        A marca de envio é gravada antes do primeiro fragmento e só é
+        removida se o envio falhar; com ela presente, nenhuma nova
+        tentativa reenvia a mensagem.
 
-            await self.whatsapp.send_text(telefone, fragmento)
+        Cancelamento do worker (perda de liderança, shutdown) durante o
+        primeiro envio também remove a marca: sem resposta do WhatsApp,
+        o follow-up volta a ser tentado pela reconciliação. Se a mensagem
+        chegou a sair antes do cancelamento, ela é repetida; aceitamos
+        essa duplicata rara em vez de pular o follow-up. Depois do envio,
+        o agendamento dos demais fragmentos não é interrompido.
+
+        Returns:
+            False se outro processamento já enviou este follow-up
+        """
+        if not await self.redis.set(chave_envio, 1, nx=True, ex=self.ENVIO_TTL):
+            logger.warning(f"Follow-up de {telefone} já enviado por outro processamento")
+            return False
+
+        # Primeiro fragmento agora; os demais vão para a fila atrasada
+        if fragmentos:
+            try:
+                await self.whatsapp.send_text(telefone, fragmentos[0])
+            except (Exception, asyncio.CancelledError):
+                await asyncio.shield(self.redis.delete(chave_envio))
+                raise
+            await asyncio.shield(self._enfileirar_fragmentos(telefone, fragmentos[1:]))
 
         # Salvar na memória
         await self.memory.add_message(
             telefone,
             "ai",
-            mensagem,
+            "\n".join(fragmentos),
             metadata={"type": "followup"}
         )
+        return True
 
     async def _atualizar_lead_pos_followup(
         self,
@@ -320,7 +862,12 @@ class FollowUpManager:
             # Se foi o último follow-up, adicionar tag BREAK
             await self.supabase.add_tag(telefone, 'BREAK')
 
-        await self.supabase.update_lead(telefone, updates)
+        await self.supabase.update_lead_adiado(telefone, updates)
+
+        if proximo_horario:
+            await self._enfileirar(telefone, proximo_horario)
+        else:
+            await self._desenfileirar(telefone)
 
     async def agendar_primeiro_followup(self, telefone: str):
         """
@@ -336,10 +883,11 @@ class FollowUpManager:
             primeiro_fup = self._proximo_horario_comercial(primeiro_fup)
 
         # Atualizar lead
-        await self.supabase.update_lead(telefone, {
+        await self.supabase.update_lead_adiado(telefone, {
             'fup_proximo_horario': primeiro_fup.isoformat(),
             'fup_enviado': 0
         })
+        await self._enfileirar(telefone, primeiro_fup)
 
         logger.info(f"Primeiro follow-up agendado para {telefone}: {primeiro_fup}")
 
@@ -350,38 +898,105 @@ class FollowUpManager:
 
 class FollowUpScheduler:
     """
-    Agenda execução periódica do sistema de follow-up.
+    Dispara follow-ups no horário exato a partir da fila no Redis.
+
+    - Worker: aguarda o próximo vencimento (ou novo agendamento), retira os
+      vencidos atomicamente (seguro com várias réplicas) e processa em paralelo.
+    - Despachante: envia os fragmentos agendados na fila atrasada.
+    - Reconciliação: APScheduler a cada `intervalo_reconciliacao_minutos`
+      (FOLLOWUP_CHECK_INTERVAL) sincroniza a fila com o banco.
 
-    Usa APScheduler para executar a cada 5 minutos.
+    Com eleição de líder, só é iniciado na instância líder; o worker
+    ainda confere a liderança local antes de cada retirada da fila.
     """
 
-    def __init__(self, followup_manager: FollowUpManager):
+    def __init__(
+        self,
+        followup_manager: FollowUpManager,
+        intervalo_reconciliacao_minutos: int = 5,
+        lote: int = 50,
+        lideranca: Optional[LeaderElection] = None
+    ):
         """Inicializa scheduler."""
         self.followup_manager = followup_manager
+        self.intervalo_reconciliacao_minutos = intervalo_reconciliacao_minutos
+        self.lote = lote
+        self.lideranca = lideranca
         self.scheduler = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def _worker(self):
+        """Loop de disparo dos follow-ups vencidos."""
+        while True:
+            try:
+                # Heartbeat falhando: lease pode ser de outra instância
+                if self.lideranca and not self.lideranca.is_lider():
+                    await asyncio.sleep(1)
+                    continue
+
+                telefones = await self.followup_manager.retirar_vencidos(self.lote)
+                if telefones:
+                    await self.followup_manager.processar_vencidos(telefones)
+
+                if len(telefones) < self.lote:
+                    await self.followup_manager.aguardar_proximo()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no worker de follow-up: {e}")
+                await asyncio.sleep(5)
+
+    async def _despachante(self):
+        """Loop de envio dos fragmentos atrasados."""
+        while True:
+            try:
+                await self.followup_manager.despachar_fragmentos()
+                espera = await self.followup_manager.segundos_ate_proximo_fragmento()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no envio de fragmentos de follow-up: {e}")
+                espera = 5
+            await asyncio.sleep(espera)
 
     def start(self):
-        """Inicia scheduler."""
+        """Inicia worker, despachante de fragmentos e reconciliação periódica."""
+        if self.scheduler:
+            return
+
         from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
         self.scheduler = AsyncIOScheduler()
 
-        # Executar a cada 5 minutos
+        # Reconciliação fila x banco (inclusive no startup)
         self.scheduler.add_job(
-            self.followup_manager.verificar_e_enviar_followups,
+            self.followup_manager.reconciliar,
             'interval',
-            minutes=5,
-            id='followup_job'
+            minutes=self.intervalo_reconciliacao_minutos,
+            id='followup_reconciliacao',
+            next_run_time=datetime.now()
         )
 
         self.scheduler.start()
-        logger.info("Follow-up scheduler iniciado (executa a cada 5 minutos)")
+        self._tasks = [
+            asyncio.create_task(self._worker()),
+            asyncio.create_task(self._despachante())
+        ]
+        logger.info(
+            f"Follow-up scheduler iniciado (fila no Redis, reconciliação a cada "
+            f"{self.intervalo_reconciliacao_minutos} minutos)"
+        )
 
     def stop(self):
         """Para scheduler."""
+        for task in self._tasks:
+            if not task.done():
+                task.cancel()
+        self._tasks = []
         if self.scheduler:
-            self.scheduler.shutdown()
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
             logger.info("Follow-up scheduler parado")
 
 
-__all__ = ['FollowUpManager', 'FollowUpScheduler']
+__all__ = ['FollowUpManager', 'FollowUpScheduler', 'FollowUpDecisao', 'FollowUpMensagem', 'TokenBudget']
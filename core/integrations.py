@@ -3,28 +3,37 @@ CORE/INTEGRATIONS.PY
 ====================
 Integrações com APIs externas:
 - WhatsApp Business API (Meta)
-- Google Calendar API
-- Supabase
+- Google Calendar API (+ AvailabilityEngine, GoogleTokenManager e CalendarMirror)
+- Supabase (+ LeadCache e LeadWriteBuffer)
 - ElevenLabs
 - RabbitMQ
 """
 
 import asyncio
+import copy
 import hmac
 import hashlib
 import json
+import math
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Iterator, Tuple
 from pathlib import Path
+from zoneinfo import ZoneInfo
 
 import httpx
 import aio_pika
+import redis.asyncio as redis
 from aio_pika import DeliveryMode, Message
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
+from google_auth_httplib2 import AuthorizedHttp
 from supabase import create_client, Client
 from loguru import logger
 
@@ -90,9 +99,10 @@ class WhatsAppClient:
         self,
         to: str,
         media_type: str,
-        media_url: str,
+        media_url: Optional[str] = None,
         caption: Optional[str] = None,
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        media_id: Optional[str] = None
     ) -> Dict:
         """
         Envia mídia (imagem, vídeo, áudio, documento).
@@ -103,6 +113,7 @@ class WhatsAppClient:
             media_url: URL pública da mídia
             caption: Legenda (apenas para image, video, document)
             filename: Nome do arquivo (apenas para document)
+            media_id: ID de mídia já enviada via upload_media (no lugar da URL)
 
         Returns:
             Resposta da API
@@ -112,9 +123,7 @@ class WhatsAppClient:
             "recipient_type": "individual",
             "to": to,
             "type": media_type,
-            media_type: {
-                "link": media_url
-            }
+            media_type: {"id": media_id} if media_id else {"link": media_url}
         }
 
         # Adicionar caption
@@ -133,9 +142,40 @@ class WhatsAppClient:
             logger.error(f"Erro ao enviar {media_type} para {to}: {e}")
             raise
 
-    async def send_audio(self, to: str, audio_url: str) -> Dict:
-        """Envia mensagem de áudio."""
-        return await self.send_media(to, "audio", audio_url)
+    async def send_audio(
+        self,
+        to: str,
+        audio_url: Optional[str] = None,
+        media_id: Optional[str] = None
+    ) -> Dict:
+        """Envia mensagem de áudio (por URL ou ID de mídia)."""
+        return await self.send_media(to, "audio", audio_url, media_id=media_id)
+
+    async def upload_media(self, data: bytes, mime_type: str, filename: str) -> str:
+        """
+        Envia mídia para o WhatsApp (endpoint /media).
+
+        O ID retornado pode ser reutilizado em várias mensagens
+        (válido por 30 dias), sem URL pública.
+
+        Args:
+            data: Bytes da mídia
+            mime_type: MIME type (ex: audio/mpeg, audio/ogg)
+            filename: Nome do arquivo
+
+        Returns:
+            ID da mídia
+        """
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+
+        response = await self.client.post(
+            f"{self.base_url}/media",
+            headers=headers,
+            data={"messaging_product": "whatsapp", "type": mime_type},
+            files={"file": (filename, data, mime_type)}
+        )
+        response.raise_for_status()
+        return response.json()["id"]
 
     async def send_template(
         self,
@@ -186,6 +226,23 @@ class WhatsAppClient:
 
         return await self._request("POST", "/messages", json=payload)
 
+    async def get_media_info(self, media_id: str) -> Dict:
+        """
+        Obtém metadados da mídia pelo ID.
+
+        Args:
+            media_id: ID da mídia retornado no webhook
+
+        Returns:
+            {url, mime_type, sha256, file_size, id}
+        """
+        url = f"https://graph.facebook.com/v18.0/{media_id}"
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+
+        response = await self.client.get(url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
     async def get_media_url(self, media_id: str) -> str:
         """
         Obtém URL de mídia pelo ID.
@@ -194,16 +251,32 @@ class WhatsAppClient:
             media_id: ID da mídia retornado no webhook
 
         Returns:
-            URL pública da mídia
+            URL da mídia (expira em alguns minutos; exige o token)
+        """
+        info = await self.get_media_info(media_id)
+        return info["url"]
+
+    async def stream_media(
+        self,
+        media_url: str,
+        chunk_size: int = 64 * 1024
+    ) -> AsyncIterator[bytes]:
+        """
+        Baixa mídia do WhatsApp em blocos (sem carregar a resposta inteira).
+
+        Args:
+            media_url: URL da mídia
+            chunk_size: Tamanho dos blocos em bytes
+
+        Yields:
+            Blocos de bytes
         """
-        url = f"https://graph.facebook.com/v18.0/{media_id}"
         headers = {"Authorization": f"Bearer {self.access_token}"}
 
-        async with self.client as client:
-            response = await client.get(url, headers=headers)
+        async with self.client.stream("GET", media_url, headers=headers) as response:
             response.raise_for_status()
-            data = response.json()
-            return data["url"]
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
 
     async def download_media(self, media_url: str) -> bytes:
         """
@@ -215,12 +288,8 @@ class WhatsAppClient:
         Returns:
             Bytes da mídia
         """
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-
-        async with self.client as client:
-            response = await client.get(media_url, headers=headers)
-            response.raise_for_status()
-            return response.content
+        partes = [chunk async for chunk in self.stream_media(media_url)]
+        return b"".join(partes)
 
     async def _request(self, method: str, endpoint: str, **kwargs) -> Dict:
         """Faz requisição HTTP com retry logic."""
@@ -276,6 +345,189 @@ class WhatsAppClient:
         await self.client.aclose()
 
 
+# ==============================================================================
+# AVAILABILITY ENGINE
+# ==============================================================================
+
+class AvailabilityEngine:
+    """
+    Motor de disponibilidade por varredura de intervalos.
+
+    Os intervalos ocupados do FreeBusy são convertidos uma única vez em
+    arrays ordenados de epoch (início/fim, já mesclados). Os slots livres
+    saem de uma única varredura que intercala as janelas de horário
+    comercial com os intervalos ocupados: O(dias + ocupados + slots).
+
+    Respeita fuso horário (datas sem fuso são interpretadas no fuso do
+    calendário), dias úteis e intervalo mínimo entre reuniões (buffer).
+    """
+
+    def __init__(
+        self,
+        timezone: str = "America/Sao_Paulo",
+        hora_inicio: int = 9,
+        hora_fim: int = 18,
+        dias_uteis: Tuple[int, ...] = (0, 1, 2, 3, 4),
+        buffer_minutos: int = 0,
+        passo_minutos: int = 30
+    ):
+        """
+        Args:
+            timezone: Fuso do calendário (IANA)
+            hora_inicio: Início do horário comercial
+            hora_fim: Fim do horário comercial (reunião termina até aqui)
+            dias_uteis: Dias da semana atendidos (0 = segunda)
+            buffer_minutos: Intervalo mínimo antes/depois de compromissos
+            passo_minutos: Granularidade dos horários oferecidos
+        """
+        self.timezone = timezone
+        self.tz = ZoneInfo(timezone)
+        self.hora_inicio = hora_inicio
+        self.hora_fim = hora_fim
+        self.dias_uteis = dias_uteis
+        self.buffer_minutos = buffer_minutos
+        self.passo_minutos = passo_minutos
+
+    @staticmethod
+    def parse_busy(busy_slots: List[Dict]) -> Tuple[List[float], List[float]]:
+        """
+        Converte intervalos ocupados (RFC 3339) em arrays ordenados e mesclados.
+
+        Returns:
+            (inícios, fins) em epoch segundos
+        """
+        intervalos = sorted(
+            (
+                datetime.fromisoformat(busy['start'].replace('Z', '+00:00')).timestamp(),
+                datetime.fromisoformat(busy['end'].replace('Z', '+00:00')).timestamp()
+            )
+            for busy in busy_slots
+        )
+
+        inicios: List[float] = []
+        fins: List[float] = []
+        for inicio, fim in intervalos:
+            if fins and inicio <= fins[-1]:
+                fins[-1] = max(fins[-1], fim)
+            else:
+                inicios.append(inicio)
+                fins.append(fim)
+
+        return inicios, fins
+
+    def localizar(self, dt: datetime) -> datetime:
+        """Datas sem fuso são interpretadas no fuso do calendário."""
+        if dt.tzinfo is None:
+            return dt.replace(tzinfo=self.tz)
+        return dt
+
+    def _janelas(
+        self,
+        inicio_ts: float,
+        fim_ts: float,
+        horario_comercial: bool
+    ) -> Iterator[Tuple[float, float, float]]:
+        """
+        Gera janelas (início, fim, base de alinhamento) em ordem crescente.
+
+        Sem horário comercial a janela é o período inteiro.
+        """
+        if not horario_comercial:
+            yield inicio_ts, fim_ts, inicio_ts
+            return
+
+        dia = datetime.fromtimestamp(inicio_ts, self.tz).date()
+        ultimo_dia = datetime.fromtimestamp(fim_ts, self.tz).date()
+
+        while dia <= ultimo_dia:
+            if dia.weekday() in self.dias_uteis:
+                abertura = datetime(
+                    dia.year, dia.month, dia.day, self.hora_inicio, tzinfo=self.tz
+                ).timestamp()
+                fechamento = datetime(
+                    dia.year, dia.month, dia.day, self.hora_fim, tzinfo=self.tz
+                ).timestamp()
+
+                inicio = max(abertura, inicio_ts)
+                fim = min(fechamento, fim_ts)
+                if inicio < fim:
+                    yield inicio, fim, abertura
+
+            dia += timedelta(days=1)
+
+    def calcular_slots(
+        self,
+        data_inicio: datetime,
+        data_fim: datetime,
+        inicios: List[float],
+        fins: List[float],
+        duracao_minutos: int,
+        horario_comercial: bool = True
+    ) -> List[Dict]:
+        """
+        Calcula slots livres numa varredura única.
+
+        Args:
+            data_inicio: Início do período
+            data_fim: Fim do período
+            inicios: Inícios ocupados (ordenados, mesclados)
+            fins: Fins ocupados
+            duracao_minutos: Duração da reunião
+            horario_comercial: Restringe às janelas comerciais
+
+        Returns:
+            Lista de slots: [{"inicio": datetime, "fim": datetime}]
+        """
+        inicio_ts = self.localizar(data_inicio).timestamp()
+        fim_ts = self.localizar(data_fim).timestamp()
+
+        duracao = duracao_minutos * 60
+        passo = self.passo_minutos * 60
+        buffer = self.buffer_minutos * 60
+
+        slots: List[Dict] = []
+        total = len(inicios)
+        j = 0
+
+        for janela_inicio, janela_fim, base in self._janelas(inicio_ts, fim_ts, horario_comercial):
+            # Descartar ocupados que terminam antes da janela (nunca voltam a importar)
+            while j < total and fins[j] + buffer <= janela_inicio:
+                j += 1
+
+            cursor = janela_inicio
+            k = j
+            while cursor < janela_fim:
+                if k < total and inicios[k] - buffer < janela_fim:
+                    livre_ate = inicios[k] - buffer
+                    proximo = fins[k] + buffer
+                    k += 1
+                else:
+                    livre_ate = proximo = janela_fim
+
+                self._emitir_slots(slots, cursor, min(livre_ate, janela_fim), base, passo, duracao)
+                cursor = max(cursor, proximo)
+
+        return slots
+
+    def _emitir_slots(
+        self,
+        slots: List[Dict],
+        livre_de: float,
+        livre_ate: float,
+        base: float,
+        passo: float,
+        duracao: float
+    ):
+        """Emite slots alinhados ao passo dentro de um intervalo livre."""
+        t = base + math.ceil((livre_de - base) / passo) * passo
+        while t + duracao <= livre_ate:
+            slots.append({
+                "inicio": datetime.fromtimestamp(t, self.tz),
+                "fim": datetime.fromtimestamp(t + duracao, self.tz)
+            })
+            t += passo
+
+
 # ==============================================================================
 # GOOGLE CALENDAR CLIENT
 # ==============================================================================
@@ -285,12 +537,13 @@ class GoogleCalendarClient:
     Cliente para Google Calendar API.
 
     Funcionalidades:
-    - Listar horários disponíveis (FreeBusy)
+    - Listar horários disponíveis (FreeBusy em cache + AvailabilityEngine)
     - Agendar reuniões com Google Meet
     - Cancelar reuniões
-    - Reagendar reuniões
+    - Reagendar reuniões (patch, uma requisição)
     - Atualizar participantes
-    - Consultar eventos
+    - Mutações em lote (batch HTTP com retentativas por item)
+    - Consultar eventos (espelho local sincronizado por syncToken)
     """
 
     # Scopes necessários
@@ -337,19 +590,54 @@ class GoogleCalendarClient:
         credentials_file.write_text(json.dumps(credentials_data, indent=2))
         logger.info(f"Arquivo de credenciais criado com sucesso: {credentials_path}")
 
-    def __init__(self, credentials_path: str, token_path: str = "token.json"):
+    def __init__(
+        self,
+        credentials_path: str,
+        token_path: str = "token.json",
+        timezone: str = "America/Sao_Paulo",
+        hora_inicio: int = 9,
+        hora_fim: int = 18,
+        buffer_minutos: int = 0,
+        freebusy_ttl: int = 60,
+        freebusy_horizonte_dias: int = 28,
+        mirror_intervalo_segundos: int = 60
+    ):
         """
         Inicializa cliente do Google Calendar.
 
         Args:
             credentials_path: Caminho para credentials.json do Google Cloud
             token_path: Caminho para salvar token de acesso
+            timezone: Fuso do calendário
+            hora_inicio: Início do horário comercial
+            hora_fim: Fim do horário comercial
+            buffer_minutos: Intervalo mínimo entre reuniões
+            freebusy_ttl: Segundos de validade do cache de FreeBusy
+            freebusy_horizonte_dias: Dias buscados por consulta ao FreeBusy
+            mirror_intervalo_segundos: Intervalo da sincronização do espelho local
         """
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.creds = None
         self.service = None
         self.calendar_id = 'primary'
+        self.timezone = timezone
+
+        # Disponibilidade: motor de varredura + cache de FreeBusy por calendário
+        self.availability = AvailabilityEngine(
+            timezone=timezone,
+            hora_inicio=hora_inicio,
+            hora_fim=hora_fim,
+            buffer_minutos=buffer_minutos
+        )
+        self.freebusy_ttl = freebusy_ttl
+        self.freebusy_horizonte = timedelta(days=freebusy_horizonte_dias)
+        self._freebusy_cache: Dict[str, Dict] = {}
+        self._freebusy_lock = asyncio.Lock()
+        self._freebusy_stats = {"hits": 0, "misses": 0, "invalidacoes": 0}
+
+        # Espelho local (syncToken) para consultas sem ida ao Google
+        self.mirror = CalendarMirror(self, intervalo_segundos=mirror_intervalo_segundos)
 
         # Criar arquivo de credenciais se não existir
         self._create_credentials_file(credentials_path)
@@ -361,28 +649,17 @@ class GoogleCalendarClient:
         Autentica usando OAuth 2.0.
 
         Comportamento em produção (sem navegador):
-        - Se já tem token salvo: carrega e usa (renova automaticamente se expirado)
+        - Se já tem token salvo: carrega e usa (a renovação antecipada fica
+          com o GoogleTokenManager, que compartilha o token via Redis)
         - Se NÃO tem token: não crasha, apenas loga aviso
         """
         # Carregar token se existir
         if Path(self.token_path).exists():
             try:
-                self.creds = Credentials.from_authorized_user_file(
+                self.set_credentials(Credentials.from_authorized_user_file(
                     self.token_path,
                     self.SCOPES
-                )
-
-                # Se expirou, fazer refresh automaticamente
-                if self.creds.expired and self.creds.refresh_token:
-                    logger.info("Token do Google Calendar expirado, renovando...")
-                    self.creds.refresh(Request())
-                    # Salvar token atualizado
-                    Path(self.token_path).write_text(self.creds.to_json())
-                    logger.info("Token do Google Calendar renovado com sucesso")
-
-                # Criar serviço
-                self.service = build('calendar', 'v3', credentials=self.creds)
-                logger.info("✅ Google Calendar autenticado com sucesso")
+                ))
                 return
 
             except Exception as e:
@@ -397,6 +674,25 @@ class GoogleCalendarClient:
         )
         self.service = None
 
+    def set_credentials(self, creds: Credentials):
+        """Usa as credenciais informadas e (re)cria o serviço."""
+        self.creds = creds
+        self.service = build('calendar', 'v3', credentials=self.creds)
+        logger.info("✅ Google Calendar autenticado com sucesso")
+
+    def _http(self) -> AuthorizedHttp:
+        """Http próprio para uma chamada (httplib2 não é thread-safe)."""
+        return AuthorizedHttp(self.creds, http=build_http())
+
+    async def _executar(self, requisicao):
+        """
+        Executa uma requisição da API numa thread, com Http próprio.
+
+        O Http do service é compartilhado; requisições em threads
+        simultâneas (FreeBusy, sync do espelho, lotes) não podem usá-lo.
+        """
+        return await asyncio.to_thread(requisicao.execute, http=self._http())
+
     def _check_service_available(self):
         """Verifica se o serviço do Google Calendar está disponível."""
         if self.service is None:
@@ -419,80 +715,104 @@ class GoogleCalendarClient:
             data_inicio: Data/hora de início do período
             data_fim: Data/hora de fim do período
             duracao_minutos: Duração da reunião em minutos
-            horario_comercial: Se True, apenas horários entre 9h-18h
+            horario_comercial: Se True, apenas horários entre 9h-18h em dias úteis
 
         Returns:
             Lista de slots disponíveis: [{"inicio": datetime, "fim": datetime}]
         """
         self._check_service_available()
 
-        # Buscar eventos ocupados
-        freebusy_query = {
-            "timeMin": data_inicio.isoformat(),
-            "timeMax": data_fim.isoformat(),
-            "items": [{"id": self.calendar_id}]
-        }
-
-        freebusy_result = self.service.freebusy().query(
-            body=freebusy_query
-        ).execute()
+        data_inicio = self.availability.localizar(data_inicio)
+        data_fim = self.availability.localizar(data_fim)
 
-        busy_slots = freebusy_result['calendars'][self.calendar_id].get('busy', [])
+        inicios, fins = await self._get_busy(data_inicio, data_fim)
 
-        # Calcular slots livres
-        slots_livres = self._calcular_slots_livres(
+        return self.availability.calcular_slots(
             data_inicio,
             data_fim,
-            busy_slots,
+            inicios,
+            fins,
             duracao_minutos,
             horario_comercial
         )
 
-        return slots_livres
-
-    def _calcular_slots_livres(
+    async def _get_busy(
         self,
         data_inicio: datetime,
-        data_fim: datetime,
-        busy_slots: List[Dict],
-        duracao_minutos: int,
-        horario_comercial: bool
-    ) -> List[Dict]:
-        """Calcula slots de tempo livres."""
-        slots_livres = []
-        current_time = data_inicio
-        duracao = timedelta(minutes=duracao_minutos)
-
-        while current_time + duracao <= data_fim:
-            # Verificar se está em horário comercial
-            if horario_comercial:
-                if current_time.hour < 9 or current_time.hour >= 18:
-                    current_time += timedelta(hours=1)
-                    continue
-
-            # Verificar se slot está livre
-            slot_fim = current_time + duracao
-            is_free = True
-
-            for busy in busy_slots:
-                busy_start = datetime.fromisoformat(busy['start'].replace('Z', '+00:00'))
-                busy_end = datetime.fromisoformat(busy['end'].replace('Z', '+00:00'))
-
-                # Verificar sobreposição
-                if not (slot_fim <= busy_start or current_time >= busy_end):
-                    is_free = False
-                    break
-
-            if is_free:
-                slots_livres.append({
-                    "inicio": current_time,
-                    "fim": slot_fim
-                })
-
-            # Avançar 30 minutos
-            current_time += timedelta(minutes=30)
-
-        return slots_livres
+        data_fim: datetime
+    ) -> Tuple[List[float], List[float]]:
+        """
+        Intervalos ocupados do período, servidos do cache quando possível.
+
+        Cada consulta ao FreeBusy cobre um horizonte de semanas a partir do
+        início pedido, então consultas seguintes (inclusive multi-semana)
+        são respondidas da memória até o TTL expirar ou o cache ser
+        invalidado por agendamento/cancelamento.
+        """
+        inicio_ts = data_inicio.timestamp()
+        fim_ts = data_fim.timestamp()
+
+        def _do_cache() -> Optional[Tuple[List[float], List[float]]]:
+            cache = self._freebusy_cache.get(self.calendar_id)
+            if (
+                cache
+                and cache['expira_em'] > time.monotonic()
+                and cache['inicio'] <= inicio_ts
+                and fim_ts <= cache['fim']
+            ):
+                return cache['inicios'], cache['fins']
+            return None
+
+        busy = _do_cache()
+        if busy:
+            self._freebusy_stats["hits"] += 1
+            return busy
+
+        # Uma única busca por vez; quem esperou reaproveita o resultado
+        async with self._freebusy_lock:
+            busy = _do_cache()
+            if busy:
+                self._freebusy_stats["hits"] += 1
+                return busy
+
+            self._freebusy_stats["misses"] += 1
+            janela_fim = max(data_fim, data_inicio + self.freebusy_horizonte)
+
+            freebusy_query = {
+                "timeMin": data_inicio.isoformat(),
+                "timeMax": janela_fim.isoformat(),
+                "items": [{"id": self.calendar_id}]
+            }
+
+            freebusy_result = await self._executar(
+                self.service.freebusy().query(body=freebusy_query)
+            )
+
+            busy_slots = freebusy_result['calendars'][self.calendar_id].get('busy', [])
+            inicios, fins = AvailabilityEngine.parse_busy(busy_slots)
+
+            self._freebusy_cache[self.calendar_id] = {
+                "inicio": inicio_ts,
+                "fim": janela_fim.timestamp(),
+                "inicios": inicios,
+                "fins": fins,
+                "expira_em": time.monotonic() + self.freebusy_ttl
+            }
+
+            return inicios, fins
+
+    def invalidar_freebusy(self, calendar_id: Optional[str] = None):
+        """Descarta o FreeBusy em cache (após criar/cancelar/mover eventos)."""
+        if self._freebusy_cache.pop(calendar_id or self.calendar_id, None) is not None:
+            self._freebusy_stats["invalidacoes"] += 1
+
+    def get_availability_stats(self) -> Dict:
+        """Acertos/faltas do cache de FreeBusy."""
+        consultas = self._freebusy_stats["hits"] + self._freebusy_stats["misses"]
+        return {
+            **self._freebusy_stats,
+            "taxa_acerto": round(self._freebusy_stats["hits"] / consultas, 3) if consultas else 0.0
+        }
 
     async def agendar_reuniao(
         self,
@@ -525,11 +845,11 @@ class GoogleCalendarClient:
             'location': localizacao,
             'start': {
                 'dateTime': data_inicio.isoformat(),
-                'timeZone': 'America/Sao_Paulo',
+                'timeZone': self.timezone,
             },
             'end': {
                 'dateTime': data_fim.isoformat(),
-                'timeZone': 'America/Sao_Paulo',
+                'timeZone': self.timezone,
             },
             'attendees': [{'email': email} for email in participantes],
             'reminders': {
@@ -553,6 +873,8 @@ class GoogleCalendarClient:
             conferenceDataVersion=1,
             sendUpdates='all'  # Envia convites
         ).execute()
+        self.invalidar_freebusy()
+        self.mirror.aplicar(created_event)
 
         logger.info(f"Reunião '{titulo}' agendada para {data_inicio}")
         return created_event
@@ -575,6 +897,8 @@ class GoogleCalendarClient:
                 eventId=event_id,
                 sendUpdates='all'  # Notifica participantes
             ).execute()
+            self.invalidar_freebusy()
+            self.mirror.remover(event_id)
 
             logger.info(f"Reunião {event_id} cancelada")
             return True
@@ -582,6 +906,13 @@ class GoogleCalendarClient:
             logger.error(f"Erro ao cancelar reunião {event_id}: {e}")
             return False
 
+    def _body_horario(self, data_inicio: datetime, data_fim: datetime) -> Dict:
+        """Corpo de patch com novo início/fim."""
+        return {
+            'start': {'dateTime': data_inicio.isoformat(), 'timeZone': self.timezone},
+            'end': {'dateTime': data_fim.isoformat(), 'timeZone': self.timezone}
+        }
+
     async def reagendar_reuniao(
         self,
         event_id: str,
@@ -589,7 +920,7 @@ class GoogleCalendarClient:
         nova_data_fim: datetime
     ) -> Dict:
         """
-        Reagenda reunião existente.
+        Reagenda reunião existente (patch: uma única requisição).
 
         Args:
             event_id: ID do evento
@@ -601,29 +932,14 @@ class GoogleCalendarClient:
         """
         self._check_service_available()
 
-        # Buscar evento existente
-        event = self.service.events().get(
-            calendarId=self.calendar_id,
-            eventId=event_id
-        ).execute()
-
-        # Atualizar datas
-        event['start'] = {
-            'dateTime': nova_data_inicio.isoformat(),
-            'timeZone': 'America/Sao_Paulo'
-        }
-        event['end'] = {
-            'dateTime': nova_data_fim.isoformat(),
-            'timeZone': 'America/Sao_Paulo'
-        }
-
-        # Atualizar
-        updated_event = self.service.events().update(
+        updated_event = self.service.events().patch(
             calendarId=self.calendar_id,
             eventId=event_id,
-            body=event,
+            body=self._body_horario(nova_data_inicio, nova_data_fim),
             sendUpdates='all'  # Notifica participantes
         ).execute()
+        self.invalidar_freebusy()
+        self.mirror.aplicar(updated_event)
 
         logger.info(f"Reunião {event_id} reagendada para {nova_data_inicio}")
         return updated_event
@@ -634,7 +950,7 @@ class GoogleCalendarClient:
         participantes: List[str]
     ) -> Dict:
         """
-        Atualiza lista de participantes de uma reunião.
+        Atualiza lista de participantes de uma reunião (patch).
 
         Args:
             event_id: ID do evento
@@ -645,26 +961,195 @@ class GoogleCalendarClient:
         """
         self._check_service_available()
 
-        # Buscar evento
-        event = self.service.events().get(
-            calendarId=self.calendar_id,
-            eventId=event_id
-        ).execute()
-
-        # Atualizar participantes
-        event['attendees'] = [{'email': email} for email in participantes]
-
-        # Atualizar
-        updated_event = self.service.events().update(
+        updated_event = self.service.events().patch(
             calendarId=self.calendar_id,
             eventId=event_id,
-            body=event,
+            body={'attendees': [{'email': email} for email in participantes]},
             sendUpdates='all'
         ).execute()
+        self.mirror.aplicar(updated_event)
 
         logger.info(f"Participantes da reunião {event_id} atualizados")
         return updated_event
 
+    # === OPERAÇÕES EM LOTE ===
+
+    # Limite de requisições por lote da Calendar API
+    TAMANHO_LOTE = 50
+
+    # Status HTTP que valem nova tentativa (403 só se for rate limit)
+    STATUS_RETENTATIVA = {429, 500, 502, 503, 504}
+    MOTIVOS_RATE_LIMIT = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+    @classmethod
+    def _erro_transitorio(cls, exception: Exception) -> bool:
+        """429/5xx, ou 403 cujo motivo é rate limit (não erro de permissão)."""
+        status = getattr(getattr(exception, 'resp', None), 'status', None)
+        if status in cls.STATUS_RETENTATIVA:
+            return True
+        if status != 403:
+            return False
+
+        try:
+            conteudo = json.loads(getattr(exception, 'content', b'') or b'{}')
+            erros = conteudo.get('error', {}).get('errors', [])
+        except (ValueError, AttributeError):
+            return False
+        return any(erro.get('reason') in cls.MOTIVOS_RATE_LIMIT for erro in erros)
+
+    def _montar_requisicao(self, operacao: Dict):
+        """Converte uma operação do lote na requisição da API."""
+        events = self.service.events()
+        tipo = operacao['tipo']
+
+        if tipo == 'patch':
+            return events.patch(
+                calendarId=self.calendar_id,
+                eventId=operacao['event_id'],
+                body=operacao['body'],
+                sendUpdates=operacao.get('send_updates', 'all')
+            )
+        if tipo == 'delete':
+            return events.delete(
+                calendarId=self.calendar_id,
+                eventId=operacao['event_id'],
+                sendUpdates=operacao.get('send_updates', 'all')
+            )
+        raise ValueError(f"Tipo de operação em lote inválido: {tipo}")
+
+    async def executar_lote(
+        self,
+        operacoes: List[Dict],
+        max_tentativas: int = 3
+    ) -> List[Dict]:
+        """
+        Executa mutações via batch HTTP da API (até 50 por requisição).
+
+        Cada operação: {"tipo": "patch" | "delete", "event_id": str,
+        "body": dict (patch), "send_updates": "all" | "none"}.
+
+        Itens com erro transitório (429, 5xx, rate limit) são reenviados
+        em novo lote com backoff exponencial; os demais erros são
+        devolvidos no resultado do item.
+
+        Returns:
+            Um resultado por operação, na mesma ordem:
+            {"event_id", "ok", "evento" (patch), "erro"}
+        """
+        self._check_service_available()
+
+        resultados: List[Optional[Dict]] = [None] * len(operacoes)
+        pendentes = list(range(len(operacoes)))
+
+        for tentativa in range(1, max_tentativas + 1):
+            retentar: List[int] = []
+
+            for inicio in range(0, len(pendentes), self.TAMANHO_LOTE):
+                grupo = pendentes[inicio:inicio + self.TAMANHO_LOTE]
+                respostas: Dict[str, tuple] = {}
+
+                def _callback(request_id, response, exception):
+                    respostas[request_id] = (response, exception)
+
+                batch = self.service.new_batch_http_request(callback=_callback)
+                for indice in grupo:
+                    batch.add(self._montar_requisicao(operacoes[indice]), request_id=str(indice))
+
+                await asyncio.to_thread(batch.execute, http=self._http())
+
+                for indice in grupo:
+                    operacao = operacoes[indice]
+                    response, exception = respostas.get(str(indice), (None, None))
+
+                    if exception is None:
+                        resultados[indice] = {
+                            "event_id": operacao['event_id'],
+                            "ok": True,
+                            "evento": response or None,
+                            "erro": None
+                        }
+                        continue
+
+                    if self._erro_transitorio(exception) and tentativa < max_tentativas:
+                        retentar.append(indice)
+                    else:
+                        resultados[indice] = {
+                            "event_id": operacao['event_id'],
+                            "ok": False,
+                            "evento": None,
+                            "erro": str(exception)
+                        }
+
+            if not retentar:
+                break
+
+            logger.warning(
+                f"Lote do Google Calendar: {len(retentar)} itens com erro transitório, "
+                f"nova tentativa {tentativa + 1}/{max_tentativas}"
+            )
+            await asyncio.sleep(2 ** (tentativa - 1))
+            pendentes = retentar
+
+        # Refletir no espelho / cache de disponibilidade
+        for operacao, resultado in zip(operacoes, resultados):
+            if not resultado or not resultado["ok"]:
+                continue
+            if operacao['tipo'] == 'delete':
+                self.mirror.remover(operacao['event_id'])
+            elif resultado["evento"]:
+                self.mirror.aplicar(resultado["evento"])
+        self.invalidar_freebusy()
+
+        sucesso = sum(1 for r in resultados if r and r["ok"])
+        logger.info(f"Lote do Google Calendar: {sucesso}/{len(operacoes)} operações concluídas")
+        return resultados
+
+    async def cancelar_reunioes_lote(
+        self,
+        event_ids: List[str],
+        notificar: bool = True
+    ) -> List[Dict]:
+        """
+        Cancela várias reuniões em lote (ex.: dia de folga do vendedor).
+
+        Args:
+            event_ids: IDs dos eventos
+            notificar: Se True, notifica participantes
+
+        Returns:
+            Resultado por evento (ver executar_lote)
+        """
+        return await self.executar_lote([
+            {
+                "tipo": "delete",
+                "event_id": event_id,
+                "send_updates": "all" if notificar else "none"
+            }
+            for event_id in event_ids
+        ])
+
+    async def reagendar_reunioes_lote(
+        self,
+        reagendamentos: List[Dict]
+    ) -> List[Dict]:
+        """
+        Reagenda várias reuniões em lote.
+
+        Args:
+            reagendamentos: [{"event_id": str, "inicio": datetime, "fim": datetime}]
+
+        Returns:
+            Resultado por evento (ver executar_lote)
+        """
+        return await self.executar_lote([
+            {
+                "tipo": "patch",
+                "event_id": item['event_id'],
+                "body": self._body_horario(item['inicio'], item['fim'])
+            }
+            for item in reagendamentos
+        ])
+
     async def consultar_reuniao(self, event_id: str) -> Optional[Dict]:
         """
         Consulta detalhes de uma reunião.
@@ -675,6 +1160,13 @@ class GoogleCalendarClient:
         Returns:
             Dados do evento ou None se não encontrado
         """
+        if self.mirror.pronto:
+            evento = self.mirror.get_evento(event_id)
+            if evento:
+                return evento
+            # Ausente no espelho: pode ter sido criado em outra réplica
+            # depois do último sync; confirma na API
+
         self._check_service_available()
 
         try:
@@ -682,6 +1174,8 @@ class GoogleCalendarClient:
                 calendarId=self.calendar_id,
                 eventId=event_id
             ).execute()
+            if self.mirror.pronto:
+                self.mirror.aplicar(event)
             return event
         except Exception as e:
             logger.error(f"Erro ao consultar reunião {event_id}: {e}")
@@ -704,12 +1198,17 @@ class GoogleCalendarClient:
         Returns:
             Lista de eventos
         """
+        if self.mirror.pronto:
+            return self.mirror.listar_por_email(email_lead, data_inicio, data_fim)
+
+        # Fallback (espelho ainda não sincronizado): consulta paginada à API
         self._check_service_available()
 
         query_params = {
             'calendarId': self.calendar_id,
             'singleEvents': True,
-            'orderBy': 'startTime'
+            'orderBy': 'startTime',
+            'q': email_lead
         }
 
         if data_inicio:
@@ -717,118 +1216,967 @@ class GoogleCalendarClient:
         if data_fim:
             query_params['timeMax'] = data_fim.isoformat()
 
-        events_result = self.service.events().list(**query_params).execute()
-        all_events = events_result.get('items', [])
+        all_events = []
+        while True:
+            events_result = self.service.events().list(**query_params).execute()
+            all_events.extend(events_result.get('items', []))
+            query_params['pageToken'] = events_result.get('nextPageToken')
+            if not query_params['pageToken']:
+                break
 
         # Filtrar por participante
+        email_lead = email_lead.lower()
         lead_events = [
             event for event in all_events
             if 'attendees' in event and
-            any(att['email'] == email_lead for att in event['attendees'])
+            any(att.get('email', '').lower() == email_lead for att in event['attendees'])
         ]
 
         return lead_events
 
 
 # ==============================================================================
-# SUPABASE CLIENT
+# GOOGLE TOKEN MANAGER
 # ==============================================================================
 
-class SupabaseClient:
+class GoogleTokenManager:
+    """
+    Renovação antecipada do token OAuth do Google, compartilhado via Redis.
+
+    - O token fica no Redis (todas as réplicas leem o mesmo); o arquivo
+      google_token.json só é usado para semear o Redis na primeira vez.
+    - Uma tarefa em background renova o token alguns minutos antes de
+      expirar, então as chamadas à API nunca encontram token vencido.
+    - Renovação single-flight: dentro do processo, chamadas concorrentes
+      aguardam a mesma renovação (asyncio.Lock); entre réplicas, um lock
+      no Redis garante que só uma renova e as demais leem o resultado.
     """
-    Cliente para Supabase (PostgreSQL + pgvector).
 
-    Gerencia:
-    - CRUD de leads
-    - Base de conhecimento (RAG)
-    - Reuniões
-    - Storage de mídias
+    REDIS_KEY = "google:oauth:token"
+    LOCK_KEY = "google:oauth:refresh_lock"
+
+    # Libera o lock apenas se ainda for o dono
+    _LIBERAR_LOCK = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
     """
 
-    def __init__(self, url: str, key: str):
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        token_path: str,
+        scopes: Optional[List[str]] = None,
+        margem_segundos: int = 300,
+        lock_ttl_segundos: int = 30
+    ):
         """
-        Inicializa cliente Supabase.
-
         Args:
-            url: URL do projeto Supabase
-            key: API key do Supabase
+            redis_client: Cliente Redis async
+            token_path: Arquivo de token (semente inicial)
+            scopes: Scopes OAuth
+            margem_segundos: Antecedência da renovação antes de expirar
+            lock_ttl_segundos: Validade do lock de renovação entre réplicas
         """
-        self.client: Client = create_client(url, key)
-        logger.info("Supabase conectado")
+        self.redis = redis_client
+        self.token_path = token_path
+        self.scopes = scopes or GoogleCalendarClient.SCOPES
+        self.margem = timedelta(seconds=margem_segundos)
+        self.lock_ttl_segundos = lock_ttl_segundos
 
-    # === LEADS ===
+        self.creds: Optional[Credentials] = None
+        self.client: Optional['GoogleCalendarClient'] = None
 
-    async def get_lead(self, telefone: str) -> Optional[Dict]:
-        """Busca lead por telefone."""
-        result = self.client.table('leads_wpp').select('*').eq('telefone', telefone).execute()
-        return result.data[0] if result.data else None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"renovacoes": 0, "renovacoes_remotas": 0, "falhas": 0}
 
-    async def create_lead(self, lead_data: Dict) -> Dict:
-        """Cria novo lead."""
-        result = self.client.table('leads_wpp').insert(lead_data).execute()
-        return result.data[0]
+    # === ARMAZENAMENTO ===
 
-    async def update_lead(self, telefone: str, updates: Dict) -> Dict:
-        """Atualiza lead existente."""
-        result = self.client.table('leads_wpp').update(updates).eq('telefone', telefone).execute()
-        return result.data[0]
+    async def _ler_redis(self) -> Optional[Credentials]:
+        dados = await self.redis.get(self.REDIS_KEY)
+        if not dados:
+            return None
+        return Credentials.from_authorized_user_info(json.loads(dados), self.scopes)
 
-    async def add_tag(self, telefone: str, tag: str) -> Dict:
-        """Adiciona tag a um lead."""
-        lead = await self.get_lead(telefone)
-        if not lead:
-            raise ValueError(f"Lead {telefone} não encontrado")
+    async def salvar(self, creds: Credentials):
+        """Publica o token no Redis para todas as réplicas."""
+        await self.redis.set(self.REDIS_KEY, creds.to_json())
 
-        tags_atuais = lead.get('tags', [])
-        if tag not in tags_atuais:
-            tags_atuais.append(tag)
-            return await self.update_lead(telefone, {'tags': tags_atuais})
-        return lead
+    async def carregar(self) -> Optional[Credentials]:
+        """Token do Redis; se ausente, semeia a partir do arquivo local."""
+        creds = await self._ler_redis()
+        if creds:
+            return creds
 
-    async def remove_tag(self, telefone: str, tag: str) -> Dict:
-        """Remove tag de um lead."""
-        lead = await self.get_lead(telefone)
-        if not lead:
-            raise ValueError(f"Lead {telefone} não encontrado")
+        if Path(self.token_path).exists():
+            creds = Credentials.from_authorized_user_file(self.token_path, self.scopes)
+            await self.salvar(creds)
+            logger.info("Token do Google semeado no Redis a partir do arquivo")
+            return creds
 
-        tags_atuais = lead.get('tags', [])
-        if tag in tags_atuais:
-            tags_atuais.remove(tag)
-            return await self.update_lead(telefone, {'tags': tags_atuais})
-        return lead
+        return None
 
-    # === KNOWLEDGE BASE ===
+    # === RENOVAÇÃO ===
 
-    async def add_knowledge(
-        self,
-        assunto: str,
-        conteudo: str,
-        embedding: List[float],
-        perguntas: Optional[List[str]] = None,
-        respostas: Optional[List[str]] = None,
-        tags: Optional[List[str]] = None,
-        categoria: Optional[str] = None
-    ) -> Dict:
-        """Adiciona conhecimento à base."""
-        data = {
-            'assunto': assunto,
-            'conteudo': conteudo,
-            'embedding': embedding,
-            'perguntas': perguntas or [],
-            'respostas': respostas or [],
-            'tags': tags or [],
-            'categoria': categoria
-        }
+    def _precisa_renovar(self) -> bool:
+        if not self.creds:
+            return False
+        if not self.creds.expiry:
+            return not self.creds.token
+        # google-auth usa expiry em UTC sem fuso
+        return self.creds.expiry - datetime.utcnow() <= self.margem
+
+    def _adotar(self, remoto: Credentials):
+        """Adota token renovado por outra réplica (mesmo objeto usado pelo serviço)."""
+        self.creds.token = remoto.token
+        self.creds.expiry = remoto.expiry
+
+    def _remoto_mais_novo(self, remoto: Optional[Credentials]) -> bool:
+        return bool(
+            remoto and remoto.expiry and
+            (not self.creds.expiry or remoto.expiry > self.creds.expiry)
+        )
 
-        result = self.client.table('knowledge').insert(data).execute()
-        return result.data[0]
+    async def get_credentials(self) -> Optional[Credentials]:
+        """Credenciais válidas (renova antes se estiver perto de expirar)."""
+        if self._precisa_renovar():
+            await self.refresh()
+        return self.creds
 
-    async def hybrid_search(
+    async def refresh(self, forcar: bool = False) -> Optional[Credentials]:
+        """
+        Renova o token (single-flight).
+
+        Quem chega enquanto outra renovação está em curso espera e reaproveita
+        o resultado; se outra réplica já renovou, apenas adota o token do Redis.
+        """
+        if not self.creds or not self.creds.refresh_token:
+            return self.creds
+
+        async with self._lock:
+            if not forcar and not self._precisa_renovar():
+                return self.creds
+
+            remoto = await self._ler_redis()
+            if self._remoto_mais_novo(remoto):
+                self._adotar(remoto)
+                if not forcar and not self._precisa_renovar():
+                    self.stats["renovacoes_remotas"] += 1
+                    return self.creds
+
+            dono = str(uuid.uuid4())
+            adquirido = await self.redis.set(
+                self.LOCK_KEY, dono, nx=True, ex=self.lock_ttl_segundos
+            )
+
+            if not adquirido:
+                # Outra réplica está renovando: aguardar o token novo no Redis
+                for _ in range(self.lock_ttl_segundos * 2):
+                    await asyncio.sleep(0.5)
+                    remoto = await self._ler_redis()
+                    if self._remoto_mais_novo(remoto):
+                        self._adotar(remoto)
+                        self.stats["renovacoes_remotas"] += 1
+                        return self.creds
+                logger.warning("Renovação do token em outra réplica não concluiu, renovando localmente")
+
+            try:
+                await asyncio.to_thread(self.creds.refresh, Request())
+                await self.salvar(self.creds)
+                self.stats["renovacoes"] += 1
+                logger.info(f"Token do Google renovado (expira em {self.creds.expiry} UTC)")
+            except Exception:
+                self.stats["falhas"] += 1
+                raise
+            finally:
+                if adquirido:
+                    await self.redis.eval(self._LIBERAR_LOCK, 1, self.LOCK_KEY, dono)
+
+            return self.creds
+
+    # === CICLO DE VIDA ===
+
+    async def attach(self, client: 'GoogleCalendarClient'):
+        """Carrega o token compartilhado e entrega ao cliente do Calendar."""
+        self.client = client
+        creds = await self.carregar()
+        if creds:
+            self.creds = creds
+            client.set_credentials(creds)
+
+    async def _loop(self):
+        """Renova pouco antes de expirar; acorda periodicamente para adotar tokens remotos."""
+        while True:
+            espera = 300.0
+            try:
+                await self.get_credentials()
+                if self.creds and self.creds.expiry:
+                    restante = (self.creds.expiry - datetime.utcnow() - self.margem).total_seconds()
+                    espera = min(max(restante, 5.0), 300.0)
+            except Exception as e:
+                logger.error(f"Erro ao renovar token do Google: {e}")
+                espera = 30.0
+            await asyncio.sleep(espera)
+
+    async def start(self, client: 'GoogleCalendarClient'):
+        """Anexa ao cliente e inicia a renovação em background."""
+        await self.attach(client)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info("Renovação antecipada do token do Google iniciada")
+
+    async def stop(self):
+        """Para a renovação em background."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def get_stats(self) -> Dict:
+        """Contadores de renovação e validade atual."""
+        return {
+            **self.stats,
+            "expira_em": self.creds.expiry.isoformat() if self.creds and self.creds.expiry else None
+        }
+
+
+# ==============================================================================
+# CALENDAR MIRROR
+# ==============================================================================
+
+class CalendarMirror:
+    """
+    Espelho local do Google Calendar mantido por sincronização incremental.
+
+    A primeira sincronização lista todos os eventos (paginado) e guarda o
+    nextSyncToken; as seguintes pedem apenas o delta desde o último token.
+    Token expirado (410 Gone) dispara nova sincronização completa.
+
+    Índices em memória:
+    - por id do evento
+    - por email de participante (minúsculo)
+
+    Consultas de reuniões de um lead e varreduras de lembretes leem apenas
+    o espelho; as mutações feitas pelo próprio cliente são aplicadas na
+    hora (write-through), sem esperar o próximo delta.
+    """
+
+    def __init__(self, calendar_client: 'GoogleCalendarClient', intervalo_segundos: int = 60):
+        """
+        Args:
+            calendar_client: Cliente do Google Calendar (service/calendar_id)
+            intervalo_segundos: Intervalo entre sincronizações incrementais
+        """
+        self.calendar = calendar_client
+        self.intervalo_segundos = intervalo_segundos
+
+        self.eventos: Dict[str, Dict] = {}
+        self.por_email: Dict[str, set] = {}
+        self._inicio_ts: Dict[str, float] = {}
+
+        self.sync_token: Optional[str] = None
+        self.pronto = False
+        self.ultima_sync: Optional[datetime] = None
+
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # === SINCRONIZAÇÃO ===
+
+    async def sync(self) -> int:
+        """
+        Aplica o delta desde o último syncToken (ou faz sincronização completa).
+
+        Returns:
+            Número de eventos recebidos
+        """
+        if self.calendar.service is None:
+            return 0
+
+        async with self._lock:
+            try:
+                return await self._sync_paginas(completo=self.sync_token is None)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                logger.warning("syncToken do Google Calendar expirado, ressincronizando tudo")
+                self.sync_token = None
+                return await self._sync_paginas(completo=True)
+
+    async def _sync_paginas(self, completo: bool) -> int:
+        """Percorre as páginas de events().list e aplica os eventos."""
+        params = {'calendarId': self.calendar.calendar_id, 'singleEvents': True}
+        if not completo:
+            params['syncToken'] = self.sync_token
+
+        recebidos: List[Dict] = []
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+
+            resultado = await self.calendar._executar(
+                self.calendar.service.events().list(**params)
+            )
+            recebidos.extend(resultado.get('items', []))
+
+            page_token = resultado.get('nextPageToken')
+            if not page_token:
+                break
+
+        # Só troca o estado depois de receber todas as páginas
+        if completo:
+            self._limpar()
+        for evento in recebidos:
+            self.aplicar(evento)
+
+        self.sync_token = resultado.get('nextSyncToken')
+        self.pronto = True
+        self.ultima_sync = datetime.now()
+
+        logger.debug(
+            f"Espelho do calendário sincronizado ({'completo' if completo else 'delta'}): "
+            f"{len(recebidos)} eventos recebidos, {len(self.eventos)} no espelho"
+        )
+        return len(recebidos)
+
+    async def _loop(self):
+        """Sincronização incremental periódica."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Erro ao sincronizar espelho do calendário: {e}")
+            await asyncio.sleep(self.intervalo_segundos)
+
+    def start(self):
+        """Inicia a sincronização periódica em background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"Espelho do calendário iniciado (delta a cada {self.intervalo_segundos}s)")
+
+    async def stop(self):
+        """Para a sincronização periódica."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # === ÍNDICES ===
+
+    def _limpar(self):
+        self.eventos.clear()
+        self.por_email.clear()
+        self._inicio_ts.clear()
+
+    @staticmethod
+    def _emails(evento: Dict) -> List[str]:
+        return [
+            att['email'].lower()
+            for att in evento.get('attendees', [])
+            if att.get('email')
+        ]
+
+    def _timestamp(self, momento: Dict) -> float:
+        """Converte start/end do evento (dateTime ou dia inteiro) em epoch."""
+        if 'dateTime' in momento:
+            return datetime.fromisoformat(momento['dateTime'].replace('Z', '+00:00')).timestamp()
+        dia = datetime.fromisoformat(momento['date'])
+        return self.calendar.availability.localizar(dia).timestamp()
+
+    def aplicar(self, evento: Dict):
+        """Insere/atualiza evento nos índices (cancelado = remoção)."""
+        event_id = evento['id']
+        self.remover(event_id)
+
+        if evento.get('status') == 'cancelled':
+            return
+
+        self.eventos[event_id] = evento
+        if 'start' in evento:
+            self._inicio_ts[event_id] = self._timestamp(evento['start'])
+        for email in self._emails(evento):
+            self.por_email.setdefault(email, set()).add(event_id)
+
+    def remover(self, event_id: str):
+        """Remove evento dos índices."""
+        evento = self.eventos.pop(event_id, None)
+        self._inicio_ts.pop(event_id, None)
+        if not evento:
+            return
+
+        for email in self._emails(evento):
+            ids = self.por_email.get(email)
+            if ids:
+                ids.discard(event_id)
+                if not ids:
+                    del self.por_email[email]
+
+    # === CONSULTAS ===
+
+    def get_evento(self, event_id: str) -> Optional[Dict]:
+        """Evento por id."""
+        return self.eventos.get(event_id)
+
+    def _filtrar_ordenar(
+        self,
+        ids,
+        data_inicio: Optional[datetime],
+        data_fim: Optional[datetime]
+    ) -> List[Dict]:
+        localizar = self.calendar.availability.localizar
+        inicio_ts = localizar(data_inicio).timestamp() if data_inicio else None
+        fim_ts = localizar(data_fim).timestamp() if data_fim else None
+
+        selecionados = []
+        for event_id in ids:
+            ts = self._inicio_ts.get(event_id)
+            if ts is None:
+                continue
+            if inicio_ts is not None and ts < inicio_ts:
+                continue
+            if fim_ts is not None and ts >= fim_ts:
+                continue
+            selecionados.append((ts, event_id))
+
+        selecionados.sort()
+        return [self.eventos[event_id] for _, event_id in selecionados]
+
+    def listar_por_email(
+        self,
+        email: str,
+        data_inicio: Optional[datetime] = None,
+        data_fim: Optional[datetime] = None
+    ) -> List[Dict]:
+        """Eventos de um participante, ordenados pelo início."""
+        return self._filtrar_ordenar(
+            self.por_email.get(email.lower(), ()),
+            data_inicio,
+            data_fim
+        )
+
+    def listar_no_intervalo(self, data_inicio: datetime, data_fim: datetime) -> List[Dict]:
+        """Eventos que começam no intervalo (varredura de lembretes)."""
+        return self._filtrar_ordenar(list(self.eventos), data_inicio, data_fim)
+
+    def get_stats(self) -> Dict:
+        """Estado do espelho."""
+        return {
+            "pronto": self.pronto,
+            "eventos": len(self.eventos),
+            "participantes": len(self.por_email),
+            "ultima_sync": self.ultima_sync.isoformat() if self.ultima_sync else None
+        }
+
+
+# ==============================================================================
+# LEAD CACHE
+# ==============================================================================
+
+class LeadCache:
+    """
+    Cache de leads em dois níveis, mantido por write-through.
+
+    - Local: LRU em memória com TTL curto (zero round trips)
+    - Redis: compartilhado entre réplicas, TTL maior
+    - Invalidação: toda escrita publica o telefone no canal Pub/Sub; as
+      demais réplicas descartam a cópia local (o Redis já foi atualizado
+      pela réplica que escreveu)
+
+    O SupabaseClient grava no cache a linha retornada pelo banco após
+    create/update/tags, então a leitura seguinte não vai ao Supabase.
+    """
+
+    PREFIX = "lead:"
+    CANAL = "lead:invalidacao"
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        ttl: int = 300,
+        ttl_local: int = 30,
+        max_itens: int = 1000
+    ):
+        """
+        Args:
+            redis_client: Cliente Redis async (None = apenas cache local)
+            ttl: Validade no Redis (segundos)
+            ttl_local: Validade na memória do processo (segundos)
+            max_itens: Tamanho máximo do LRU local
+        """
+        self.redis = redis_client
+        self.ttl = ttl
+        self.ttl_local = ttl_local
+        self.max_itens = max_itens
+
+        self.instancia = uuid.uuid4().hex
+        self._local: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "hits_local": 0,
+            "hits_redis": 0,
+            "misses": 0,
+            "escritas": 0,
+            "invalidacoes_recebidas": 0
+        }
+
+    # === LOCAL (LRU) ===
+
+    def _get_local(self, telefone: str) -> Optional[Dict]:
+        item = self._local.get(telefone)
+        if item is None:
+            return None
+        expira_em, lead = item
+        if time.monotonic() >= expira_em:
+            del self._local[telefone]
+            return None
+        self._local.move_to_end(telefone)
+        return lead
+
+    def _set_local(self, telefone: str, lead: Dict):
+        self._local[telefone] = (time.monotonic() + self.ttl_local, lead)
+        self._local.move_to_end(telefone)
+        while len(self._local) > self.max_itens:
+            self._local.popitem(last=False)
+
+    # === LEITURA / ESCRITA ===
+
+    async def get(self, telefone: str) -> Optional[Dict]:
+        """Lead em cache (cópia) ou None."""
+        lead = self._get_local(telefone)
+        if lead is not None:
+            self.stats["hits_local"] += 1
+            return copy.deepcopy(lead)
+
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(f"{self.PREFIX}{telefone}")
+                if cached:
+                    lead = json.loads(cached)
+                    self._set_local(telefone, lead)
+                    self.stats["hits_redis"] += 1
+                    return copy.deepcopy(lead)
+            except Exception as e:
+                logger.warning(f"Erro ao ler lead {telefone} do cache: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, lead: Dict, publicar: bool = True):
+        """Grava o lead nos dois níveis (e avisa as outras réplicas)."""
+        telefone = lead['telefone']
+        self._set_local(telefone, copy.deepcopy(lead))
+        self.stats["escritas"] += 1
+
+        if self.redis is None:
+            return
+        try:
+            await self.redis.setex(
+                f"{self.PREFIX}{telefone}",
+                self.ttl,
+                json.dumps(lead, default=str)
+            )
+            if publicar:
+                await self._publicar(telefone)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar lead {telefone} no cache: {e}")
+
+    async def invalidate(self, telefone: str):
+        """Remove o lead dos dois níveis (e das outras réplicas)."""
+        self._local.pop(telefone, None)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.delete(f"{self.PREFIX}{telefone}")
+            await self._publicar(telefone)
+        except Exception as e:
+            logger.warning(f"Erro ao invalidar lead {telefone} no cache: {e}")
+
+    # === PUB/SUB ===
+
+    async def _publicar(self, telefone: str):
+        await self.redis.publish(self.CANAL, f"{self.instancia}|{telefone}")
+
+    async def _escutar(self):
+        """Descarta cópias locais alteradas por outras réplicas."""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.CANAL)
+                async for mensagem in pubsub.listen():
+                    if mensagem.get("type") != "message":
+                        continue
+                    dados = mensagem["data"]
+                    if isinstance(dados, bytes):
+                        dados = dados.decode()
+                    origem, _, telefone = dados.partition("|")
+                    if origem != self.instancia:
+                        self._local.pop(telefone, None)
+                        self.stats["invalidacoes_recebidas"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Sem o canal não dá para confiar no cache local
+                logger.warning(f"Canal de invalidação de leads caiu: {e}")
+                self._local.clear()
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start(self):
+        """Inicia a escuta de invalidações."""
+        if self.redis is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._escutar())
+
+    async def stop(self):
+        """Para a escuta de invalidações."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def get_stats(self) -> Dict:
+        """Taxa de acerto por nível."""
+        consultas = self.stats["hits_local"] + self.stats["hits_redis"] + self.stats["misses"]
+        hits = self.stats["hits_local"] + self.stats["hits_redis"]
+        return {
+            **self.stats,
+            "itens_locais": len(self._local),
+            "taxa_acerto": round(hits / consultas, 3) if consultas else 0.0
+        }
+
+
+# ==============================================================================
+# LEAD WRITE BUFFER
+# ==============================================================================
+
+class LeadWriteBuffer:
+    """
+    Write-behind de atualizações de leads.
+
+    Atualizações do mesmo lead feitas dentro da janela são mescladas
+    (o último valor de cada campo vence) e gravadas de uma vez: um UPDATE
+    se houver um só lead pendente, ou um único RPC (atualizar_leads_lote)
+    para vários. Leituras via SupabaseClient.get_lead já enxergam os
+    campos pendentes. flush_todos() grava tudo na hora (fim de lote de
+    follow-ups, shutdown).
+    """
+
+    def __init__(
+        self,
+        supabase_client: "SupabaseClient",
+        janela_segundos: float = 2.0,
+        max_pendentes: int = 200
+    ):
+        """
+        Args:
+            supabase_client: Cliente que executa as escritas
+            janela_segundos: Tempo máximo que uma atualização fica pendente
+            max_pendentes: Nº de leads pendentes que força gravação imediata
+        """
+        self.supabase = supabase_client
+        self.janela_segundos = janela_segundos
+        self.max_pendentes = max_pendentes
+
+        self._pendentes: Dict[str, Dict] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.stats = {"atualizacoes": 0, "escritas": 0, "leads_escritos": 0, "falhas": 0}
+
+    def pendentes(self, telefone: str) -> Dict:
+        """Campos ainda não gravados de um lead."""
+        return dict(self._pendentes.get(telefone, {}))
+
+    async def adicionar(self, telefone: str, updates: Dict):
+        """Mescla a atualização nas pendentes do lead."""
+        self._pendentes.setdefault(telefone, {}).update(updates)
+        self.stats["atualizacoes"] += 1
+
+        if len(self._pendentes) >= self.max_pendentes:
+            await self.flush_todos()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_apos_janela())
+
+    async def _flush_apos_janela(self):
+        await asyncio.sleep(self.janela_segundos)
+        await self.flush_todos()
+
+    async def flush_todos(self):
+        """Grava todas as atualizações pendentes."""
+        async with self._lock:
+            if not self._pendentes:
+                return
+            lote, self._pendentes = self._pendentes, {}
+
+            try:
+                await self.supabase._escrever_lote(lote)
+                self.stats["escritas"] += 1
+                self.stats["leads_escritos"] += len(lote)
+            except Exception as e:
+                self.stats["falhas"] += 1
+                logger.error(f"Erro ao gravar {len(lote)} leads pendentes: {e}")
+
+                # Devolve ao buffer sem sobrescrever atualizações mais novas
+                for telefone, updates in lote.items():
+                    self._pendentes[telefone] = {**updates, **self._pendentes.get(telefone, {})}
+                if self._timer is None or self._timer.done() or self._timer is asyncio.current_task():
+                    self._timer = asyncio.create_task(self._flush_apos_janela())
+
+    async def stop(self):
+        """Grava o que estiver pendente (shutdown)."""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        await self.flush_todos()
+
+    def get_stats(self) -> Dict:
+        """Atualizações recebidas x escritas no banco."""
+        return {
+            **self.stats,
+            "pendentes": len(self._pendentes),
+            "atualizacoes_por_escrita": (
+                round(self.stats["atualizacoes"] / self.stats["escritas"], 2)
+                if self.stats["escritas"] else 0.0
+            )
+        }
+
+
+# ==============================================================================
+# SUPABASE CLIENT
+# ==============================================================================
+
+class SupabaseClient:
+    """
+    Cliente para Supabase (PostgreSQL + pgvector).
+
+    Gerencia:
+    - CRUD de leads
+    - Base de conhecimento (RAG)
+    - Reuniões
+    - Storage de mídias
+    """
+
+    def __init__(self, url: str, key: str):
+        """
+        Inicializa cliente Supabase.
+
+        Args:
+            url: URL do projeto Supabase
+            key: API key do Supabase
+        """
+        self.client: Client = create_client(url, key)
+        logger.info("Supabase conectado")
+
+        # Cache de leads (opcional, configurado após o Redis)
+        self.lead_cache: Optional[LeadCache] = None
+
+        # Write-behind de atualizações de leads (opcional)
+        self.write_buffer: Optional[LeadWriteBuffer] = None
+
+    # === LEADS ===
+
+    async def _cachear_lead(self, lead: Dict) -> Dict:
+        """Write-through: linha retornada pelo banco vai para o cache."""
+        if self.lead_cache and lead:
+            await self.lead_cache.set(lead)
+        return lead
+
+    async def get_lead(self, telefone: str, fresh: bool = False) -> Optional[Dict]:
+        """
+        Busca lead por telefone (cache primeiro, se configurado).
+
+        Args:
+            telefone: Telefone do lead
+            fresh: Lê direto do banco (e atualiza o cache), para decisões
+                que não podem usar uma cópia de até LEAD_CACHE_TTL segundos
+        """
+        lead = await self.lead_cache.get(telefone) if self.lead_cache and not fresh else None
+
+        if lead is None:
+            result = self.client.table('leads_wpp').select('*').eq('telefone', telefone).execute()
+            if not result.data:
+                return None
+
+            lead = result.data[0]
+            if self.lead_cache:
+                await self.lead_cache.set(lead, publicar=False)
+
+        # Campos ainda no write-behind
+        if self.write_buffer:
+            lead.update(self.write_buffer.pendentes(telefone))
+        return lead
+
+    async def create_lead(self, lead_data: Dict) -> Dict:
+        """Cria novo lead."""
+        result = self.client.table('leads_wpp').insert(lead_data).execute()
+        return await self._cachear_lead(result.data[0])
+
+    async def update_lead(self, telefone: str, updates: Dict) -> Dict:
+        """Atualiza lead existente."""
+        result = self.client.table('leads_wpp').update(updates).eq('telefone', telefone).execute()
+        return await self._cachear_lead(result.data[0])
+
+    async def update_lead_adiado(self, telefone: str, updates: Dict):
+        """
+        Atualiza lead via write-behind (mescla com outras atualizações).
+
+        Sem write buffer configurado, grava na hora.
+        """
+        if self.write_buffer:
+            await self.write_buffer.adicionar(telefone, updates)
+        else:
+            await self.update_lead(telefone, updates)
+
+    async def flush_updates(self):
+        """Grava agora as atualizações de leads pendentes."""
+        if self.write_buffer:
+            await self.write_buffer.flush_todos()
+
+    async def _escrever_lote(self, lote: Dict[str, Dict]):
+        """Grava atualizações mescladas: um UPDATE (1 lead) ou um RPC (vários)."""
+        if len(lote) == 1:
+            telefone, updates = next(iter(lote.items()))
+            result = self.client.table('leads_wpp').update(updates).eq('telefone', telefone).execute()
+        else:
+            result = self.client.rpc('atualizar_leads_lote', {
+                'p_itens': [
+                    {'telefone': telefone, 'dados': updates}
+                    for telefone, updates in lote.items()
+                ]
+            }).execute()
+
+        for lead in result.data or []:
+            await self._cachear_lead(lead)
+
+    async def buscar_leads_followup(
+        self,
+        tags_bloqueio: List[str],
+        agora: Optional[datetime] = None,
+        apos: Optional[Tuple[str, str]] = None,
+        limite: int = 500
+    ) -> List[Dict]:
+        """
+        Página de leads elegíveis para follow-up (RPC buscar_leads_followup).
+
+        Args:
+            tags_bloqueio: Leads com qualquer uma dessas tags são excluídos
+            agora: Só vencidos até este horário (None = todos os pendentes)
+            apos: (fup_proximo_horario, telefone) da última linha da página anterior
+            limite: Tamanho da página
+
+        Returns:
+            Lista de {telefone, fup_enviado, fup_proximo_horario}
+        """
+        result = self.client.rpc('buscar_leads_followup', {
+            'p_tags_bloqueio': list(tags_bloqueio),
+            'p_agora': agora.isoformat() if agora else None,
+            'p_apos_horario': apos[0] if apos else None,
+            'p_apos_telefone': apos[1] if apos else None,
+            'p_limite': limite
+        }).execute()
+        return result.data or []
+
+    async def atualizar_tags(
+        self,
+        telefone: str,
+        adicionar: Optional[List[str]] = None,
+        remover: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Adiciona e remove tags em uma única operação atômica no banco.
+
+        Remove primeiro, depois adiciona (sem duplicar). Duas escritas
+        concorrentes de tags não se sobrescrevem.
+
+        Returns:
+            Lead atualizado
+        """
+        result = self.client.rpc('atualizar_tags_lead', {
+            'p_telefone': telefone,
+            'p_adicionar': list(adicionar or []),
+            'p_remover': list(remover or [])
+        }).execute()
+
+        if not result.data:
+            raise ValueError(f"Lead {telefone} não encontrado")
+        return await self._cachear_lead(result.data[0])
+
+    async def add_tag(self, telefone: str, tag: str) -> Dict:
+        """Adiciona tag a um lead."""
+        return await self.atualizar_tags(telefone, adicionar=[tag])
+
+    async def remove_tag(self, telefone: str, tag: str) -> Dict:
+        """Remove tag de um lead."""
+        return await self.atualizar_tags(telefone, remover=[tag])
+
+    # === KNOWLEDGE BASE ===
+
+    async def add_knowledge(
+        self,
+        assunto: str,
+        conteudo: str,
+        embedding: List[float],
+        perguntas: Optional[List[str]] = None,
+        respostas: Optional[List[str]] = None,
+        tags: Optional[List[str]] = None,
+        categoria: Optional[str] = None
+    ) -> Dict:
+        """Adiciona conhecimento à base."""
+        data = {
+            'assunto': assunto,
+            'conteudo': conteudo,
+            'embedding': embedding,
+            'perguntas': perguntas or [],
+            'respostas': respostas or [],
+            'tags': tags or [],
+            'categoria': categoria
+        }
+
+        result = self.client.table('knowledge').insert(data).execute()
+        return result.data[0]
+
+    async def replace_knowledge_passages(
+        self,
+        knowledge_id: str,
+        passagens: List[Dict]
+    ) -> List[Dict]:
+        """
+        Substitui as passagens indexadas de um conhecimento.
+
+        Args:
+            knowledge_id: ID do conhecimento (parent)
+            passagens: Lista de {"posicao", "conteudo", "tokens", "embedding"}
+
+        Returns:
+            Passagens inseridas
+        """
+        # DELETE + INSERT na mesma transação (substituir_passagens)
+        result = self.client.rpc('substituir_passagens', {
+            'p_knowledge_id': knowledge_id,
+            'p_passagens': passagens
+        }).execute()
+        return result.data
+
+    async def hybrid_search(
         self,
         query_embedding: List[float],
         query_text: str,
         match_count: int = 5,
-        semantic_weight: float = 0.6
+        semantic_weight: float = 0.6,
+        query_modelo: Optional[str] = None,
+        apenas_sem_passagens: bool = False
     ) -> List[Dict]:
         """
         Busca híbrida (semântica + BM25).
@@ -838,6 +2186,9 @@ class SupabaseClient:
             query_text: Texto da query
             match_count: Quantidade de resultados
             semantic_weight: Peso da busca semântica (0.6 = 60%)
+            query_modelo: Modelo que gerou o embedding (escolhe o índice
+                          ativo ou a coluna sombra durante re-indexação)
+            apenas_sem_passagens: Só documentos ainda sem passagens indexadas
 
         Returns:
             Lista de documentos relevantes
@@ -846,11 +2197,138 @@ class SupabaseClient:
             'query_embedding': query_embedding,
             'query_text': query_text,
             'match_count': match_count,
-            'semantic_weight': semantic_weight
+            'semantic_weight': semantic_weight,
+            'query_modelo': query_modelo,
+            'apenas_sem_passagens': apenas_sem_passagens
+        }).execute()
+
+        return result.data
+
+    async def hybrid_search_passages(
+        self,
+        query_embedding: List[float],
+        query_text: str,
+        match_count: int = 5,
+        semantic_weight: float = 0.6,
+        query_modelo: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Busca híbrida por passagem (melhor trecho de cada documento).
+
+        Args:
+            query_embedding: Embedding da query
+            query_text: Texto da query
+            match_count: Quantidade de documentos distintos
+            semantic_weight: Peso da busca semântica (0.6 = 60%)
+            query_modelo: Modelo que gerou o embedding
+
+        Returns:
+            Lista de passagens {id, knowledge_id, assunto, conteudo, posicao, similarity_score}
+        """
+        result = self.client.rpc('hybrid_search_passages', {
+            'query_embedding': query_embedding,
+            'query_text': query_text,
+            'match_count': match_count,
+            'semantic_weight': semantic_weight,
+            'query_modelo': query_modelo
         }).execute()
 
         return result.data
 
+    # === RE-INDEXAÇÃO DE EMBEDDINGS ===
+
+    async def get_knowledge_embedding_state(self) -> Dict:
+        """Retorna estado da re-indexação (linha única)."""
+        result = self.client.table('knowledge_embedding_state')\
+            .select('*')\
+            .eq('id', 1)\
+            .execute()
+        return result.data[0] if result.data else {}
+
+    async def update_knowledge_embedding_state(self, updates: Dict) -> Dict:
+        """Atualiza estado da re-indexação (checkpoint, progresso)."""
+        updates = {**updates, 'atualizado_em': datetime.utcnow().isoformat()}
+        result = self.client.table('knowledge_embedding_state')\
+            .update(updates)\
+            .eq('id', 1)\
+            .execute()
+        return result.data[0] if result.data else {}
+
+    async def reset_knowledge_shadow(self, modelo: str) -> int:
+        """
+        Inicia re-indexação para um novo modelo.
+
+        Limpa a coluna sombra e zera checkpoint/progresso.
+
+        Returns:
+            Total de documentos a re-indexar
+        """
+        result = self.client.rpc('reset_knowledge_shadow', {'p_modelo': modelo}).execute()
+        return result.data or 0
+
+    async def list_knowledge_page(
+        self,
+        after_id: Optional[str] = None,
+        limit: int = 10,
+        apenas_pendentes: bool = False,
+        tabela: str = 'knowledge'
+    ) -> List[Dict]:
+        """
+        Pagina a base de conhecimento por keyset (ordem de id).
+
+        Args:
+            after_id: Último id da página anterior (None = início)
+            limit: Tamanho da página
+            apenas_pendentes: Se True, só documentos sem embedding_shadow
+            tabela: 'knowledge' ou 'knowledge_passages'
+
+        Returns:
+            Lista de {"id", "conteudo"}
+        """
+        query = self.client.table(tabela).select('id, conteudo')
+
+        if after_id:
+            query = query.gt('id', after_id)
+        if apenas_pendentes:
+            query = query.is_('embedding_shadow', 'null')
+
+        result = query.order('id').limit(limit).execute()
+        return result.data
+
+    async def set_knowledge_shadow_embeddings(
+        self,
+        itens: List[Dict],
+        tabela: str = 'knowledge'
+    ) -> int:
+        """
+        Grava lote de embeddings na coluna sombra (1 round trip).
+
+        Args:
+            itens: Lista de {"id": ..., "embedding": [...]}
+            tabela: 'knowledge' ou 'knowledge_passages'
+
+        Returns:
+            Quantidade de documentos atualizados
+        """
+        result = self.client.rpc(
+            'set_knowledge_shadow_embeddings',
+            {'p_itens': itens, 'p_tabela': tabela}
+        ).execute()
+        return result.data or 0
+
+    async def swap_knowledge_embeddings(self, modelo: str) -> int:
+        """
+        Troca atomicamente o índice ativo pela coluna sombra.
+
+        Falha (exceção do Postgres) se algum documento ainda não tiver
+        embedding no novo modelo.
+
+        Returns:
+            Quantidade de documentos trocados
+        """
+        result = self.client.rpc('swap_knowledge_embeddings', {'p_modelo': modelo}).execute()
+        return result.data or 0
+
     # === REUNIÕES ===
 
     async def create_reuniao(self, reuniao_data: Dict) -> Dict:
@@ -868,6 +2346,45 @@ class SupabaseClient:
         result = self.client.table('reunioes').update(updates).eq('id', reuniao_id).execute()
         return result.data[0]
 
+    async def marcar_lembretes_enviados(self, reuniao_ids: List[str], tipo: str) -> int:
+        """
+        Marca lembretes como enviados em lote (um UPDATE por tipo).
+
+        Args:
+            reuniao_ids: IDs das reuniões
+            tipo: '24h' ou '2h'
+
+        Returns:
+            Número de reuniões atualizadas
+        """
+        if not reuniao_ids:
+            return 0
+
+        result = self.client.table('reunioes')\
+            .update({f'lembrete_{tipo}_enviado': True})\
+            .in_('id', reuniao_ids)\
+            .execute()
+
+        return len(result.data)
+
+    async def get_reunioes_pendentes_lembrete(self, horas: int = 48) -> List[Dict]:
+        """
+        Reuniões agendadas nas próximas X horas com algum lembrete pendente,
+        com telefone/nome do lead (usado só para reconstruir a fila de lembretes).
+        """
+        agora = datetime.utcnow()
+        limite = agora + timedelta(hours=horas)
+
+        result = self.client.table('reunioes')\
+            .select('*, leads_wpp(telefone, nome)')\
+            .gte('data_inicio', agora.isoformat())\
+            .lte('data_inicio', limite.isoformat())\
+            .eq('status', 'agendada')\
+            .or_('lembrete_24h_enviado.eq.false,lembrete_2h_enviado.eq.false')\
+            .execute()
+
+        return result.data
+
     async def get_reunioes_proximas(self, horas: int = 24) -> List[Dict]:
         """
         Busca reuniões que acontecerão nas próximas X horas.
@@ -902,6 +2419,9 @@ class SupabaseClient:
         """
         Faz upload de arquivo para Supabase Storage.
 
+        O cliente do Storage é síncrono: o upload roda numa thread para não
+        bloquear o event loop (as outras conversas seguem durante o envio).
+
         Args:
             bucket: Nome do bucket
             file_path: Caminho do arquivo (ex: audios/123/audio.mp3)
@@ -911,13 +2431,14 @@ class SupabaseClient:
         Returns:
             URL pública do arquivo
         """
-        self.client.storage.from_(bucket).upload(
+        await asyncio.to_thread(
+            self.client.storage.from_(bucket).upload,
             file_path,
             file_data,
             {"content-type": content_type}
         )
 
-        # Obter URL pública
+        # Obter URL pública (montada localmente, sem request)
         url = self.client.storage.from_(bucket).get_public_url(file_path)
         return url
 
@@ -933,23 +2454,49 @@ class ElevenLabsClient:
     Modelo: Eleven Multilingual v2
     """
 
-    def __init__(self, api_key: str, voice_id: str):
+    def __init__(
+        self,
+        api_key: str,
+        voice_id: str,
+        model_id: str = "eleven_multilingual_v2"
+    ):
         """
         Inicializa cliente ElevenLabs.
 
         Args:
             api_key: API key da ElevenLabs
             voice_id: ID da voz escolhida
+            model_id: ID do modelo padrão
         """
         self.api_key = api_key
         self.voice_id = voice_id
+        self.model_id = model_id
         self.base_url = "https://api.elevenlabs.io/v1"
         self.client = httpx.AsyncClient(timeout=30.0)
 
+    def parametros(
+        self,
+        model_id: Optional[str] = None,
+        stability: float = 0.6,
+        similarity_boost: float = 0.8,
+        style: float = 0.2
+    ) -> Dict:
+        """Voz, modelo e ajustes usados na síntese (mesmos defaults de text_to_speech)."""
+        return {
+            "voice_id": self.voice_id,
+            "model_id": model_id or self.model_id,
+            "voice_settings": {
+                "stability": stability,
+                "similarity_boost": similarity_boost,
+                "style": style,
+                "use_speaker_boost": True
+            }
+        }
+
     async def text_to_speech(
         self,
         text: str,
-        model_id: str = "eleven_multilingual_v2",
+        model_id: Optional[str] = None,
         stability: float = 0.6,
         similarity_boost: float = 0.8,
         style: float = 0.2
@@ -959,7 +2506,7 @@ class ElevenLabsClient:
 
         Args:
             text: Texto para converter
-            model_id: ID do modelo (eleven_multilingual_v2)
+            model_id: ID do modelo (padrão: o do cliente)
             stability: Estabilidade da voz (0-1)
             similarity_boost: Similaridade com voz original (0-1)
             style: Estilo/expressividade (0-1)
@@ -967,6 +2514,33 @@ class ElevenLabsClient:
         Returns:
             Bytes do áudio (MP3)
         """
+        try:
+            audio = b"".join([
+                chunk async for chunk in self.stream_speech(
+                    text, model_id, stability, similarity_boost, style
+                )
+            ])
+
+            logger.info(f"Áudio gerado: {text[:50]}...")
+            return audio
+        except Exception as e:
+            logger.error(f"Erro ao gerar áudio: {e}")
+            raise
+
+    async def stream_speech(
+        self,
+        text: str,
+        model_id: Optional[str] = None,
+        stability: float = 0.6,
+        similarity_boost: float = 0.8,
+        style: float = 0.2
+    ) -> AsyncIterator[bytes]:
+        """
+        Converte texto em áudio, entregando o MP3 em blocos à medida que é gerado.
+
+        Mesmos argumentos de text_to_speech.
+        """
+        parametros = self.parametros(model_id, stability, similarity_boost, style)
         url = f"{self.base_url}/text-to-speech/{self.voice_id}/stream"
 
         headers = {
@@ -977,25 +2551,14 @@ class ElevenLabsClient:
 
         data = {
             "text": text,
-            "model_id": model_id,
-            "voice_settings": {
-                "stability": stability,
-                "similarity_boost": similarity_boost,
-                "style": style,
-                "use_speaker_boost": True
-            }
+            "model_id": parametros["model_id"],
+            "voice_settings": parametros["voice_settings"]
         }
 
-        try:
-            async with self.client as client:
-                response = await client.post(url, json=data, headers=headers)
-                response.raise_for_status()
-
-                logger.info(f"Áudio gerado: {text[:50]}...")
-                return response.content
-        except Exception as e:
-            logger.error(f"Erro ao gerar áudio: {e}")
-            raise
+        async with self.client.stream("POST", url, json=data, headers=headers) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
 
     async def close(self):
         """Fecha conexão HTTP."""
@@ -1127,7 +2690,10 @@ class RabbitMQClient:
 __all__ = [
     'WhatsAppClient',
     'GoogleCalendarClient',
+    'GoogleTokenManager',
     'SupabaseClient',
+    'LeadCache',
+    'LeadWriteBuffer',
     'ElevenLabsClient',
     'RabbitMQClient'
 ]
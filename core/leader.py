@@ -0,0 +1,257 @@
+"""
+CORE/LEADER.PY
+==============
+Eleição de líder entre réplicas/workers (lease no Redis).
+
+Componentes:
+- LeaderElection: Lease com fencing token, renovado por heartbeat
+
+Só o líder roda os jobs agendados (follow-ups, lembretes). Cada instância
+tenta adquirir o lease (SET NX com TTL); quem consegue recebe um fencing
+token crescente (INCR) e renova o lease a cada heartbeat. Se o líder
+morre, o lease expira em até `ttl` segundos e outra instância assume; se
+o líder para normalmente, libera o lease e a troca é imediata. Renovação
+e liberação só acontecem se o lease ainda for do próprio token (Lua),
+então um líder antigo nunca apaga/estende o lease do novo.
+
+O fencing token também protege as retiradas das filas dos jobs (follow-ups,
+fragmentos, lembretes): os scripts recebem cerca() e só retiram itens se o
+lease no Redis ainda tiver o valor "instância:token" deste líder. Um líder
+destituído que ainda não percebeu a troca não retira mais nada; o que já
+tinha retirado segue a recuperação de cada fila.
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import redis.asyncio as redis
+from loguru import logger
+
+
+# ==============================================================================
+# LEADER ELECTION
+# ==============================================================================
+
+class LeaderElection:
+    """
+    Eleição de líder com lease no Redis.
+
+    Uso:
+        lider = LeaderElection(redis_client, "scheduler",
+                               on_eleito=iniciar_jobs, on_destituido=parar_jobs)
+        lider.start()
+        ...
+        if lider.is_lider(): ...
+        await lider.stop()
+    """
+
+    PREFIX = "leader:"
+
+    # Adquire o lease se livre: novo fencing token + SET com TTL
+    _ADQUIRIR = """
+    if redis.call('exists', KEYS[1]) == 1 then
+        return false
+    end
+    local token = redis.call('incr', KEYS[2])
+    redis.call('set', KEYS[1], ARGV[1] .. ':' .. token, 'PX', ARGV[2])
+    return token
+    """
+
+    # Renova apenas se o lease ainda for deste token
+    _RENOVAR = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    # Libera apenas se o lease ainda for deste token
+    _LIBERAR = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        nome: str = "scheduler",
+        ttl: int = 15,
+        intervalo_heartbeat: int = 5,
+        on_eleito: Optional[Callable[[int], Awaitable[None]]] = None,
+        on_destituido: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        """
+        Args:
+            redis_client: Cliente Redis async
+            nome: Nome da eleição (um lease por nome)
+            ttl: Validade do lease em segundos (tempo máximo de failover)
+            intervalo_heartbeat: Segundos entre renovações/tentativas
+            on_eleito: Chamado com o fencing token ao assumir a liderança
+            on_destituido: Chamado ao perder (ou liberar) a liderança
+        """
+        self.redis = redis_client
+        self.nome = nome
+        self.ttl = ttl
+        self.intervalo_heartbeat = intervalo_heartbeat
+        self.on_eleito = on_eleito
+        self.on_destituido = on_destituido
+
+        self.instancia = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.token: Optional[int] = None
+        self._renovado_em = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+        self._adquirir = self.redis.register_script(self._ADQUIRIR)
+        self._renovar = self.redis.register_script(self._RENOVAR)
+        self._liberar = self.redis.register_script(self._LIBERAR)
+
+        self.stats = {"eleicoes": 0, "destituicoes": 0, "falhas_heartbeat": 0}
+
+    # === CHAVES ===
+
+    @property
+    def _lease_key(self) -> str:
+        return f"{self.PREFIX}{self.nome}:lease"
+
+    @property
+    def _fencing_key(self) -> str:
+        return f"{self.PREFIX}{self.nome}:fencing"
+
+    @property
+    def _valor(self) -> str:
+        return f"{self.instancia}:{self.token}"
+
+    # === ESTADO ===
+
+    def is_lider(self) -> bool:
+        """
+        Liderança local: token obtido e lease renovado há menos de `ttl`.
+
+        Não consulta o Redis; se os heartbeats falharem por mais de `ttl`
+        o lease pode ter expirado e a instância deixa de se considerar líder.
+        """
+        return self.token is not None and time.monotonic() - self._renovado_em < self.ttl
+
+    async def ainda_lider(self) -> bool:
+        """Confere no Redis se o lease ainda é deste fencing token."""
+        if self.token is None:
+            return False
+        valor = await self.redis.get(self._lease_key)
+        if isinstance(valor, bytes):
+            valor = valor.decode()
+        return valor == self._valor
+
+    def cerca(self) -> List[str]:
+        """
+        [chave do lease, valor esperado] para scripts só do líder.
+
+        Sem liderança o valor nunca confere, e o script não faz nada.
+        """
+        return [self._lease_key, self._valor if self.token is not None else "-"]
+
+    # === CICLO ===
+
+    async def _tentar_adquirir(self):
+        token = await self._adquirir(
+            keys=[self._lease_key, self._fencing_key],
+            args=[self.instancia, self.ttl * 1000]
+        )
+        if token is None:
+            return
+
+        self.token = int(token)
+        self._renovado_em = time.monotonic()
+        self.stats["eleicoes"] += 1
+        logger.info(f"👑 Liderança '{self.nome}' assumida (token {self.token})")
+
+        if self.on_eleito:
+            try:
+                await self.on_eleito(self.token)
+            except Exception as e:
+                logger.error(f"Erro ao iniciar jobs do líder '{self.nome}': {e}")
+
+    async def _destituir(self, motivo: str, aviso: bool = True):
+        log = logger.warning if aviso else logger.info
+        log(f"Liderança '{self.nome}' deixada (token {self.token}): {motivo}")
+        self.token = None
+        self.stats["destituicoes"] += 1
+
+        if self.on_destituido:
+            try:
+                await self.on_destituido()
+            except Exception as e:
+                logger.error(f"Erro ao parar jobs do líder '{self.nome}': {e}")
+
+    async def _heartbeat(self):
+        """Renova o lease (líder) ou tenta adquiri-lo (seguidor)."""
+        if self.token is None:
+            await self._tentar_adquirir()
+            return
+
+        renovado = await self._renovar(
+            keys=[self._lease_key],
+            args=[self._valor, self.ttl * 1000]
+        )
+        if renovado:
+            self._renovado_em = time.monotonic()
+        else:
+            await self._destituir("lease expirado ou tomado por outra instância")
+
+    async def _loop(self):
+        while True:
+            try:
+                await self._heartbeat()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["falhas_heartbeat"] += 1
+                logger.warning(f"Erro no heartbeat da liderança '{self.nome}': {e}")
+
+                # Sem renovar por mais de ttl: o lease pode já ser de outro
+                if self.token is not None and not self.is_lider():
+                    await self._destituir("heartbeat sem sucesso por mais que o TTL")
+
+            await asyncio.sleep(self.intervalo_heartbeat)
+
+    def start(self):
+        """Inicia o heartbeat em background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info(
+                f"Eleição de líder '{self.nome}' iniciada ({self.instancia}, "
+                f"lease de {self.ttl}s)"
+            )
+
+    async def stop(self):
+        """Para o heartbeat e libera o lease (failover imediato)."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        if self.token is not None:
+            try:
+                await self._liberar(keys=[self._lease_key], args=[self._valor])
+            except Exception as e:
+                logger.warning(f"Erro ao liberar liderança '{self.nome}': {e}")
+            await self._destituir("instância finalizada", aviso=False)
+
+    def get_stats(self) -> Dict:
+        """Estado da liderança desta instância."""
+        return {
+            **self.stats,
+            "instancia": self.instancia,
+            "lider": self.is_lider(),
+            "token": self.token
+        }
+
+
+__all__ = ['LeaderElection']
@@ -0,0 +1,480 @@
+"""
+CORE/MEDIA.PY
+=============
+Pipeline de mídias recebidas pelo WhatsApp.
+
+Componentes:
+- MediaPipeline: Resolve IDs de mídia, baixa em blocos, transcreve áudios
+  e descreve imagens (reduzidas com Pillow antes do modelo de visão)
+
+Resultados derivados de uma mídia (transcrição, descrição de imagem,
+texto extraído) ficam em cache pelo SHA-256 do conteúdo, o mesmo que o
+WhatsApp envia no webhook: áudio encaminhado de novo, imagem repetida ou
+mídia da própria campanha voltando não é baixada nem reanalisada.
+
+Quando a mensagem chega, o consumer chama preparar(): a URL da mídia é
+resolvida e, para áudios, a transcrição começa imediatamente, enquanto a
+mensagem espera a janela do MessageBuffer. Ao fechar a janela,
+enriquecer() só aguarda o que já estava em andamento. O download é feito
+em blocos direto para um buffer em memória (sem arquivo temporário) e um
+único cliente OpenAI é reutilizado em todas as transcrições.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import io
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from loguru import logger
+from openai import AsyncOpenAI
+from PIL import Image, ImageOps
+
+from core.integrations import WhatsAppClient
+
+
+# ==============================================================================
+# MEDIA PIPELINE
+# ==============================================================================
+
+class MediaPipeline:
+    """
+    Download e transcrição de mídias (com pré-processamento antecipado).
+
+    Uso:
+        pipeline.preparar(mensagem)          # no consumer (não bloqueia)
+        await pipeline.enriquecer(mensagens) # ao fechar o buffer
+        texto = await pipeline.transcrever(media_id_ou_url)
+    """
+
+    PREFIX = "media:preparo:"
+
+    PROMPT_IMAGEM = (
+        "Analise esta imagem enviada por um lead no WhatsApp e descreva o que vê. "
+        "Se houver texto (print, documento, anúncio), transcreva o essencial."
+    )
+
+    # Resultados por conteúdo: media:conteudo:{sha256}:{tipo}
+    CONTEUDO_PREFIX = "media:conteudo:"
+
+    # Versão no tipo: as descrições antigas ("descricao") vinham do modelo
+    # de texto sem ver os pixels e não devem ser reaproveitadas
+    TIPO_DESCRICAO = "descricao:v2"
+
+    # Extensão enviada à API de transcrição (o formato é deduzido pelo nome)
+    EXTENSOES = {
+        "audio/ogg": "ogg",
+        "audio/opus": "ogg",
+        "audio/mpeg": "mp3",
+        "audio/mp4": "m4a",
+        "audio/aac": "m4a",
+        "audio/wav": "wav",
+        "audio/webm": "webm",
+        "video/mp4": "mp4",
+    }
+
+    def __init__(
+        self,
+        whatsapp_client: WhatsAppClient,
+        openai_api_key: Optional[str] = None,
+        redis_client: Optional[redis.Redis] = None,
+        modelo_transcricao: str = "gpt-4o-transcribe",
+        idioma: str = "pt",
+        ttl: int = 3600,
+        antecipar: bool = True,
+        ttl_conteudo: int = 30 * 24 * 3600,
+        max_urls: int = 1000,
+        modelo_visao: str = "gpt-4o-mini",
+        detalhe_imagem: str = "low",
+        max_lado_imagem: int = 1024
+    ):
+        """
+        Args:
+            whatsapp_client: Cliente WhatsApp (pool HTTP compartilhado)
+            openai_api_key: API key da OpenAI
+            redis_client: Redis para compartilhar resultados entre réplicas
+            modelo_transcricao: Modelo de transcrição
+            idioma: Idioma dos áudios
+            ttl: Validade dos resultados no Redis (segundos)
+            antecipar: Processar já na chegada (False = só ao fechar a janela)
+            ttl_conteudo: Validade do cache por conteúdo (segundos)
+            max_urls: URLs resolvidas lembradas (URL -> SHA-256)
+            modelo_visao: Modelo multimodal para imagens
+            detalhe_imagem: "low" (512px, custo fixo baixo), "auto" ou "high"
+            max_lado_imagem: Maior lado enviado quando detalhe != "low"
+        """
+        self.whatsapp = whatsapp_client
+        self.redis = redis_client
+        self.modelo_transcricao = modelo_transcricao
+        self.idioma = idioma
+        self.ttl = ttl
+        self.antecipar = antecipar
+        self.ttl_conteudo = ttl_conteudo
+        self.max_urls = max_urls
+        self.modelo_visao = modelo_visao
+        self.detalhe_imagem = detalhe_imagem
+        self.max_lado_imagem = max_lado_imagem
+
+        # Um cliente para todas as transcrições (pool de conexões)
+        self.openai = AsyncOpenAI(api_key=openai_api_key)
+
+        self._tarefas: Dict[str, asyncio.Task] = {}
+        self._sha_por_url: "OrderedDict[str, str]" = OrderedDict()
+        self._latencias_imagem: Deque[float] = deque(maxlen=200)
+        self.stats = {
+            "preparadas": 0,
+            "downloads": 0,
+            "downloads_evitados": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "transcricoes": 0,
+            "imagens_analisadas": 0,
+            "tokens_imagens": 0,
+            "prontas": 0,
+            "aguardadas": 0,
+            "erros": 0
+        }
+
+    # === DOWNLOAD ===
+
+    @staticmethod
+    def _normalizar_sha(valor: Optional[str]) -> Optional[str]:
+        """SHA-256 em hex (o webhook pode enviar em base64)."""
+        if not valor:
+            return None
+        valor = valor.strip()
+        if len(valor) == 64 and all(c in "0123456789abcdefABCDEF" for c in valor):
+            return valor.lower()
+        try:
+            bruto = base64.b64decode(valor, validate=True)
+        except (binascii.Error, ValueError):
+            return None
+        return bruto.hex() if len(bruto) == 32 else None
+
+    async def _resolver(self, referencia: str) -> Dict:
+        """
+        URL, mime type e SHA-256 a partir de um ID de mídia (ou URL).
+
+        Para URLs, o SHA-256 só é conhecido se a URL veio de uma
+        resolução anterior deste processo.
+        """
+        if referencia.startswith("http"):
+            return {"url": referencia, "mime_type": None, "sha256": self._sha_por_url.get(referencia)}
+
+        info = await self.whatsapp.get_media_info(referencia)
+        sha256 = self._normalizar_sha(info.get("sha256"))
+        if sha256:
+            self._sha_por_url[info["url"]] = sha256
+            while len(self._sha_por_url) > self.max_urls:
+                self._sha_por_url.popitem(last=False)
+        return {"url": info["url"], "mime_type": info.get("mime_type"), "sha256": sha256}
+
+    async def baixar(self, url: str) -> io.BytesIO:
+        """Baixa a mídia em blocos para um buffer em memória."""
+        buffer = io.BytesIO()
+        async for chunk in self.whatsapp.stream_media(url):
+            buffer.write(chunk)
+        buffer.seek(0)
+        self.stats["downloads"] += 1
+        return buffer
+
+    # === CACHE POR CONTEÚDO ===
+
+    async def _get_conteudo(self, sha256: str, tipo: str) -> Optional[str]:
+        if self.redis is None:
+            return None
+        try:
+            cached = await self.redis.get(f"{self.CONTEUDO_PREFIX}{sha256}:{tipo}")
+            return cached.decode() if isinstance(cached, bytes) else cached
+        except Exception as e:
+            logger.warning(f"Erro ao ler cache da mídia {sha256[:12]}: {e}")
+            return None
+
+    async def _set_conteudo(self, sha256: str, tipo: str, valor: str):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.setex(f"{self.CONTEUDO_PREFIX}{sha256}:{tipo}", self.ttl_conteudo, valor)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar cache da mídia {sha256[:12]}: {e}")
+
+    async def _processar(
+        self,
+        info: Dict,
+        tipo: str,
+        calcular: Callable[[io.BytesIO, Optional[str]], Awaitable[str]]
+    ) -> str:
+        """
+        Resultado derivado da mídia, cacheado pelo SHA-256 do conteúdo.
+
+        Com o hash do webhook/Graph API, um acerto evita o download e a
+        chamada ao modelo; sem ele, o hash é calculado após o download e
+        um acerto evita só a chamada ao modelo.
+        """
+        sha256 = info.get("sha256")
+        if sha256:
+            cached = await self._get_conteudo(sha256, tipo)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                self.stats["downloads_evitados"] += 1
+                return cached
+
+        buffer = await self.baixar(info["url"])
+
+        if not sha256:
+            sha256 = hashlib.sha256(buffer.getbuffer()).hexdigest()
+            cached = await self._get_conteudo(sha256, tipo)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+
+        self.stats["cache_misses"] += 1
+        valor = await calcular(buffer, info.get("mime_type"))
+        await self._set_conteudo(sha256, tipo, valor)
+        return valor
+
+    async def processar(
+        self,
+        referencia: str,
+        tipo: str,
+        calcular: Callable[[io.BytesIO, Optional[str]], Awaitable[str]]
+    ) -> str:
+        """
+        Aplica `calcular` à mídia (ID ou URL), com cache por conteúdo.
+
+        Args:
+            referencia: ID de mídia do WhatsApp ou URL
+            tipo: Tipo do resultado (transcricao, descricao, texto...)
+            calcular: Coroutine (bytes da mídia, mime type) -> texto
+        """
+        return await self._processar(await self._resolver(referencia), tipo, calcular)
+
+    # === IMAGENS ===
+
+    @staticmethod
+    def _reduzir_imagem(dados: bytes, max_lado: int) -> Tuple[bytes, Tuple[int, int], Tuple[int, int]]:
+        """
+        Reduz a imagem para caber em max_lado x max_lado e re-codifica em JPEG.
+
+        Roda fora do event loop (CPU). Para JPEG, draft() já decodifica
+        em escala reduzida.
+
+        Returns:
+            (bytes JPEG, tamanho original, tamanho final)
+        """
+        with Image.open(io.BytesIO(dados)) as imagem:
+            original = imagem.size
+            imagem.draft("RGB", (max_lado, max_lado))
+            imagem = ImageOps.exif_transpose(imagem).convert("RGB")
+            imagem.thumbnail((max_lado, max_lado), Image.LANCZOS)
+
+            saida = io.BytesIO()
+            imagem.save(saida, format="JPEG", quality=80, optimize=True)
+            return saida.getvalue(), original, imagem.size
+
+    async def _descrever(self, buffer: io.BytesIO, mime_type: Optional[str]) -> str:
+        inicio = time.perf_counter()
+        max_lado = 512 if self.detalhe_imagem == "low" else self.max_lado_imagem
+
+        jpeg, original, final = await asyncio.to_thread(
+            self._reduzir_imagem, buffer.getvalue(), max_lado
+        )
+
+        response = await self.openai.chat.completions.create(
+            model=self.modelo_visao,
+            max_tokens=400,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": self.PROMPT_IMAGEM},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode()}",
+                            "detail": self.detalhe_imagem
+                        }
+                    }
+                ]
+            }]
+        )
+
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        tokens = response.usage.total_tokens if response.usage else 0
+        self.stats["imagens_analisadas"] += 1
+        self.stats["tokens_imagens"] += tokens
+        self._latencias_imagem.append(latencia_ms)
+
+        logger.info(
+            f"Imagem analisada: {original[0]}x{original[1]} -> {final[0]}x{final[1]} "
+            f"({len(jpeg) // 1024} KB, detail={self.detalhe_imagem}), "
+            f"{tokens} tokens em {latencia_ms:.0f} ms"
+        )
+        return response.choices[0].message.content or ""
+
+    async def descrever_imagem(self, referencia: str) -> str:
+        """
+        Descreve uma imagem (ID de mídia ou URL) com o modelo de visão.
+
+        A imagem é reduzida antes do envio e a descrição fica em cache
+        pelo conteúdo.
+        """
+        return await self.processar(referencia, self.TIPO_DESCRICAO, self._descrever)
+
+    # === TRANSCRIÇÃO ===
+
+    async def _transcrever(self, buffer: io.BytesIO, mime_type: Optional[str]) -> str:
+        tipo = (mime_type or "audio/ogg").split(";")[0].strip()
+        nome = f"audio.{self.EXTENSOES.get(tipo, 'ogg')}"
+
+        transcription = await self.openai.audio.transcriptions.create(
+            model=self.modelo_transcricao,
+            file=(nome, buffer, tipo),
+            language=self.idioma
+        )
+        self.stats["transcricoes"] += 1
+        return transcription.text
+
+    async def transcrever(self, referencia: str) -> str:
+        """
+        Transcreve um áudio (ID de mídia ou URL).
+
+        Reaproveita a transcrição antecipada ou a de um áudio idêntico.
+        """
+        resultado = await self._resultado(referencia)
+        if resultado and resultado.get("transcricao") is not None:
+            return resultado["transcricao"]
+
+        return await self.processar(referencia, "transcricao", self._transcrever)
+
+    # === PRÉ-PROCESSAMENTO ===
+
+    async def _preparar(
+        self,
+        media_id: str,
+        media_type: str,
+        sha256: Optional[str] = None
+    ) -> Dict:
+        """
+        Resolve a URL e, para áudios, já transcreve.
+
+        Se só a transcrição falhar, a URL resolvida é mantida e o resultado
+        não vai para o Redis (a transcrição é tentada de novo depois).
+        """
+        info = await self._resolver(media_id)
+        info["sha256"] = self._normalizar_sha(sha256) or info.get("sha256")
+        resultado = {
+            "media_url": info["url"],
+            "mime_type": info["mime_type"],
+            "media_sha256": info["sha256"]
+        }
+
+        completo = True
+        if media_type == "audio":
+            try:
+                resultado["transcricao"] = await self._processar(info, "transcricao", self._transcrever)
+            except Exception as e:
+                completo = False
+                self.stats["erros"] += 1
+                logger.warning(f"Erro ao transcrever mídia {media_id}: {e}")
+
+        if self.redis is not None and completo:
+            try:
+                await self.redis.setex(
+                    f"{self.PREFIX}{media_id}",
+                    self.ttl,
+                    json.dumps(resultado)
+                )
+            except Exception as e:
+                logger.warning(f"Erro ao salvar mídia {media_id} preparada: {e}")
+        return resultado
+
+    def preparar(self, mensagem: Dict):
+        """Inicia o pré-processamento da mídia da mensagem (não bloqueia)."""
+        media_id = mensagem.get("media_id")
+        if not self.antecipar or not media_id or media_id in self._tarefas:
+            return
+
+        def _concluir(tarefa: asyncio.Task):
+            self._tarefas.pop(media_id, None)
+            if not tarefa.cancelled() and tarefa.exception():
+                logger.warning(f"Pré-processamento da mídia {media_id} falhou: {tarefa.exception()}")
+
+        tarefa = asyncio.create_task(self._preparar(
+            media_id,
+            mensagem.get("media_type"),
+            mensagem.get("media_sha256")
+        ))
+        self._tarefas[media_id] = tarefa
+        tarefa.add_done_callback(_concluir)
+        self.stats["preparadas"] += 1
+
+    async def _resultado(self, media_id: str) -> Optional[Dict]:
+        """Resultado do pré-processamento (local, em andamento ou no Redis)."""
+        tarefa = self._tarefas.get(media_id)
+        if tarefa is not None:
+            if tarefa.done():
+                self.stats["prontas"] += 1
+            else:
+                self.stats["aguardadas"] += 1
+            return await asyncio.shield(tarefa)
+
+        if self.redis is not None:
+            cached = await self.redis.get(f"{self.PREFIX}{media_id}")
+            if cached:
+                self.stats["prontas"] += 1
+                return json.loads(cached)
+        return None
+
+    async def enriquecer(self, mensagens: List[Dict]):
+        """
+        Completa as mensagens com URL resolvida e transcrição (áudios).
+
+        Chamado ao fechar a janela do buffer; falhas não impedem o turno.
+        Um pré-processamento antecipado que falhou é refeito uma vez.
+        """
+        async def _enriquecer(mensagem: Dict):
+            media_id = mensagem.get("media_id")
+            try:
+                try:
+                    resultado = await self._resultado(media_id)
+                except Exception as e:
+                    logger.warning(f"Pré-processamento da mídia {media_id} falhou, tentando de novo: {e}")
+                    resultado = None
+                if resultado is None:
+                    resultado = await self._preparar(
+                        media_id,
+                        mensagem.get("media_type"),
+                        mensagem.get("media_sha256")
+                    )
+                mensagem.update(resultado)
+            except Exception as e:
+                self.stats["erros"] += 1
+                logger.error(f"Erro ao processar mídia {media_id}: {e}")
+
+        await asyncio.gather(*(
+            _enriquecer(mensagem) for mensagem in mensagens if mensagem.get("media_id")
+        ))
+
+    def get_stats(self) -> Dict:
+        """Contadores do pipeline de mídias (e latência das imagens)."""
+        stats = {**self.stats, "em_andamento": len(self._tarefas)}
+
+        if self._latencias_imagem:
+            ordenadas = sorted(self._latencias_imagem)
+            stats["latencia_imagem"] = {
+                "media_ms": round(sum(ordenadas) / len(ordenadas), 2),
+                "p95_ms": round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))], 2)
+            }
+        if self.stats["imagens_analisadas"]:
+            stats["tokens_por_imagem"] = round(
+                self.stats["tokens_imagens"] / self.stats["imagens_analisadas"], 1
+            )
+        return stats
+
+
+__all__ = ['MediaPipeline']
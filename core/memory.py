@@ -4,12 +4,14 @@ CORE/MEMORY.PY
 Sistema de memória, buffer e RAG híbrido:
 - RedisMemoryManager: Histórico conversacional no Redis
 - MessageBuffer: Agrupamento de mensagens (30s)
-- HybridRetriever: RAG 60% semântico + 40% BM25
+- PassageChunker: Divisão de conteúdo em passagens com sobreposição
+- HybridRetriever: RAG 60% semântico + 40% BM25 (por passagem)
 - KnowledgeManager: Gerenciamento da base de conhecimento
 """
 
 import asyncio
 import json
+import re
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 from dataclasses import dataclass
@@ -44,6 +46,7 @@ class RedisMemoryManager:
     - Limite de 100 mensagens por conversa
     - Sumarização automática quando necessário
     - Contexto deslizante para o agente
+    - Versão do histórico (muda a cada mensagem do lead)
     """
 
     def __init__(self, redis_client: redis.Redis):
@@ -91,8 +94,27 @@ class RedisMemoryManager:
         # Definir TTL
         await self.redis.expire(key, self.ttl_hours * 3600)
 
+        # Nova fala do lead = nova versão da conversa
+        if role == "human":
+            await self._incrementar_versao(phone)
+
         logger.debug(f"Mensagem adicionada ao histórico de {phone}")
 
+    async def _incrementar_versao(self, phone: str):
+        key = f"chat_history_versao:{phone}"
+        await self.redis.incr(key)
+        await self.redis.expire(key, self.ttl_hours * 3600)
+
+    async def get_history_version(self, phone: str) -> int:
+        """
+        Versão do histórico, incrementada a cada mensagem do lead.
+
+        Mensagens do agente (respostas, follow-ups) não mudam a versão:
+        servem para reaproveitar análises que só dependem do que o lead disse.
+        """
+        versao = await self.redis.get(f"chat_history_versao:{phone}")
+        return int(versao) if versao else 0
+
     async def get_history(
         self,
         phone: str,
@@ -164,6 +186,9 @@ class RedisMemoryManager:
         # Deletar chave do Redis
         deleted = await self.redis.delete(key)
 
+        # Versão segue crescendo (não reaproveita análises do histórico antigo)
+        await self._incrementar_versao(phone)
+
         if deleted:
             logger.info(f"✅ Histórico limpo para {phone}")
             return True
@@ -207,7 +232,7 @@ class MessageBuffer:
     Evita múltiplas respostas fragmentadas quando lead envia várias mensagens.
     """
 
-    def __init__(self, redis_client: redis.Redis, process_callback):
+    def __init__(self, redis_client: redis.Redis, process_callback, media_pipeline=None):
         """
         Inicializa buffer de mensagens.
 
@@ -215,9 +240,11 @@ class MessageBuffer:
             redis_client: Cliente Redis
             process_callback: Função async para processar buffer
                               callback(phone, combined_content, messages)
+            media_pipeline: MediaPipeline (mídias processadas durante a janela)
         """
         self.redis = redis_client
         self.process_callback = process_callback
+        self.media_pipeline = media_pipeline
         self.window_seconds = 30
         self.tasks: Dict[str, asyncio.Task] = {}
 
@@ -230,8 +257,12 @@ class MessageBuffer:
         Args:
             phone: Número de telefone
             message: Dict com dados da mensagem
-                     {message_id, content, timestamp, media_url?, media_type?}
+                     {message_id, content, timestamp, media_id?, media_type?}
         """
+        # Mídia começa a ser processada enquanto a janela está aberta
+        if self.media_pipeline:
+            self.media_pipeline.preparar(message)
+
         # Cancelar timer existente
         if phone in self.tasks:
             self.tasks[phone].cancel()
@@ -272,6 +303,10 @@ class MessageBuffer:
             # Parse mensagens
             messages = [json.loads(msg) for msg in reversed(messages_raw)]
 
+            # URLs e transcrições (já em andamento desde a chegada)
+            if self.media_pipeline:
+                await self.media_pipeline.enriquecer(messages)
+
             # Combinar conteúdo
             combined_content = self._combine_messages(messages)
 
@@ -308,11 +343,12 @@ class MessageBuffer:
             if msg.get('content'):
                 text_parts.append(msg['content'])
 
-            # Mídias
-            if msg.get('media_url'):
+            # Mídias (sem URL resolvida, vai o ID para as ferramentas)
+            if msg.get('media_url') or msg.get('media_id'):
                 media_items.append({
-                    'url': msg['media_url'],
-                    'type': msg['media_type']
+                    'url': msg.get('media_url') or msg['media_id'],
+                    'type': msg.get('media_type') or 'midia',
+                    'transcricao': msg.get('transcricao')
                 })
 
         # Combinar textos
@@ -322,6 +358,8 @@ class MessageBuffer:
         if media_items:
             media_desc = "\n".join([
                 f"[{item['type'].upper()}]: {item['url']}"
+                + (f"\nTranscrição: {item['transcricao']}" if item['transcricao'] else "")
+                + ("\nTranscrição: indisponível" if item['type'] == 'audio' and item['transcricao'] is None else "")
                 for item in media_items
             ])
             combined += f"\n\nMídias anexadas:\n{media_desc}"
@@ -408,6 +446,93 @@ class SessionStateManager:
         await self.redis.delete(key)
 
 
+# ==============================================================================
+# PASSAGE CHUNKER
+# ==============================================================================
+
+class PassageChunker:
+    """
+    Divide conteúdo longo em passagens com sobreposição.
+
+    Corta em fronteiras de sentença sempre que possível; sentenças maiores
+    que o limite são quebradas por palavras. Tokens estimados por
+    aproximação simples (1 token ≈ 4 caracteres).
+    """
+
+    @staticmethod
+    def estimar_tokens(texto: str) -> int:
+        """Estima quantidade de tokens de um texto."""
+        return max(1, len(texto) // 4)
+
+    @staticmethod
+    def chunk(
+        texto: str,
+        max_tokens: int = 200,
+        overlap_tokens: int = 40
+    ) -> List[str]:
+        """
+        Gera passagens de até `max_tokens` com `overlap_tokens` de sobreposição.
+
+        Args:
+            texto: Conteúdo completo
+            max_tokens: Tamanho máximo de cada passagem
+            overlap_tokens: Tokens repetidos do fim da passagem anterior
+
+        Returns:
+            Lista de passagens (uma só se o texto couber no limite)
+        """
+        texto = texto.strip()
+        if not texto:
+            return []
+
+        estimar = PassageChunker.estimar_tokens
+
+        if estimar(texto) <= max_tokens:
+            return [texto]
+
+        # Sentenças (quebrando por palavras as que excedem o limite)
+        unidades = []
+        for sentenca in re.split(r'(?<=[.!?])\s+|\n+', texto):
+            sentenca = sentenca.strip()
+            if not sentenca:
+                continue
+            if estimar(sentenca) <= max_tokens:
+                unidades.append(sentenca)
+                continue
+
+            palavras = sentenca.split()
+            pedaco = []
+            for palavra in palavras:
+                if pedaco and estimar(" ".join(pedaco + [palavra])) > max_tokens:
+                    unidades.append(" ".join(pedaco))
+                    pedaco = []
+                pedaco.append(palavra)
+            if pedaco:
+                unidades.append(" ".join(pedaco))
+
+        passagens = []
+        atual: List[str] = []
+
+        for unidade in unidades:
+            if atual and estimar(" ".join(atual + [unidade])) > max_tokens:
+                passagens.append(" ".join(atual))
+
+                # Sobreposição: reaproveitar sentenças finais da passagem anterior
+                sobreposicao: List[str] = []
+                for anterior in reversed(atual):
+                    if estimar(" ".join([anterior] + sobreposicao)) > overlap_tokens:
+                        break
+                    sobreposicao.insert(0, anterior)
+                atual = sobreposicao
+
+            atual.append(unidade)
+
+        if atual:
+            passagens.append(" ".join(atual))
+
+        return passagens
+
+
 # ==============================================================================
 # HYBRID RETRIEVER (RAG)
 # ==============================================================================
@@ -418,12 +543,17 @@ class HybridRetriever:
 
     Combina similaridade vetorial (embeddings) com busca por palavras-chave
     para melhor precisão na recuperação de conhecimento.
+
+    A busca é feita por passagem (knowledge_passages): retorna o trecho mais
+    relevante de cada documento, e o contexto entregue ao LLM respeita um
+    orçamento de tokens.
     """
 
     def __init__(
         self,
         supabase_client: SupabaseClient,
-        embeddings: OpenAIEmbeddings
+        embeddings: OpenAIEmbeddings,
+        max_context_tokens: int = 800
     ):
         """
         Inicializa retriever híbrido.
@@ -431,9 +561,11 @@ class HybridRetriever:
         Args:
             supabase_client: Cliente Supabase
             embeddings: OpenAI embeddings
+            max_context_tokens: Orçamento de tokens do contexto formatado
         """
         self.supabase = supabase_client
         self.embeddings = embeddings
+        self.max_context_tokens = max_context_tokens
 
     async def retrieve(
         self,
@@ -450,21 +582,50 @@ class HybridRetriever:
             semantic_weight: Peso da busca semântica (default: 0.6 = 60%)
 
         Returns:
-            Lista de documentos relevantes (LangChain Document)
+            Lista de passagens relevantes (LangChain Document), uma por documento
         """
         # 1. Gerar embedding da query
         query_embedding = await self.embeddings.aembed_query(query)
-
-        # 2. Executar busca híbrida no Supabase
-        results = await self.supabase.hybrid_search(
-            query_embedding=query_embedding,
-            query_text=query,
-            match_count=k,
-            semantic_weight=semantic_weight
+        query_modelo = getattr(self.embeddings, 'model', None)
+
+        # 2. Busca híbrida por passagem + documentos ainda sem passagens
+        #    (base parcialmente indexada), em paralelo
+        results, results_sem_passagens = await asyncio.gather(
+            self.supabase.hybrid_search_passages(
+                query_embedding=query_embedding,
+                query_text=query,
+                match_count=k,
+                semantic_weight=semantic_weight,
+                query_modelo=query_modelo
+            ),
+            self.supabase.hybrid_search(
+                query_embedding=query_embedding,
+                query_text=query,
+                match_count=k,
+                semantic_weight=semantic_weight,
+                query_modelo=query_modelo,
+                apenas_sem_passagens=True
+            )
         )
 
         # 3. Converter para Documents do LangChain
         documents = [
+            Document(
+                page_content=r['conteudo'],
+                metadata={
+                    'id': r['knowledge_id'],
+                    'passage_id': r['id'],
+                    'posicao': r['posicao'],
+                    'assunto': r['assunto'],
+                    'score': r['similarity_score'],
+                    'source': 'knowledge_passages'
+                }
+            )
+            for r in results
+        ]
+
+        # Documentos sem passagens entram inteiros, disputando pelo score
+        documents += [
             Document(
                 page_content=r['conteudo'],
                 metadata={
@@ -474,8 +635,10 @@ class HybridRetriever:
                     'source': 'knowledge_base'
                 }
             )
-            for r in results
+            for r in results_sem_passagens
         ]
+        documents.sort(key=lambda d: d.metadata['score'] or 0, reverse=True)
+        documents = documents[:k]
 
         logger.info(f"RAG híbrido: {len(documents)} documentos recuperados")
         return documents
@@ -483,7 +646,8 @@ class HybridRetriever:
     async def retrieve_formatted(
         self,
         query: str,
-        k: int = 5
+        k: int = 5,
+        max_tokens: Optional[int] = None
     ) -> str:
         """
         Busca e retorna contexto formatado.
@@ -491,24 +655,54 @@ class HybridRetriever:
         Args:
             query: Pergunta
             k: Quantidade de docs
+            max_tokens: Orçamento de tokens (default: self.max_context_tokens)
 
         Returns:
             String formatada para inserir no prompt
         """
         documents = await self.retrieve(query, k)
+        return self.format_documents(documents, max_tokens)
+
+    def format_documents(
+        self,
+        documents: List[Document],
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Formata passagens respeitando o orçamento de tokens.
 
+        Passagens são adicionadas em ordem de relevância; a última que não
+        couber inteira é truncada.
+
+        Args:
+            documents: Passagens recuperadas
+            max_tokens: Orçamento de tokens (default: self.max_context_tokens)
+
+        Returns:
+            String formatada para inserir no prompt
+        """
         if not documents:
             return "Nenhum conhecimento relevante encontrado."
 
+        orcamento = max_tokens or self.max_context_tokens
+
         # Formatar contexto
         context_parts = []
         for i, doc in enumerate(documents, 1):
-            context_parts.append(
-                f"[Documento {i}]\n"
-                f"Assunto: {doc.metadata['assunto']}\n"
-                f"Conteúdo: {doc.page_content}\n"
-                f"Relevância: {doc.metadata['score']:.2f}\n"
-            )
+            cabecalho = f"[Documento {i}]\nAssunto: {doc.metadata['assunto']}\n"
+            rodape = f"Relevância: {doc.metadata['score']:.2f}\n"
+
+            disponivel = orcamento - PassageChunker.estimar_tokens(cabecalho + rodape)
+            if disponivel <= 0:
+                break
+
+            conteudo = doc.page_content
+            if PassageChunker.estimar_tokens(conteudo) > disponivel:
+                conteudo = conteudo[:disponivel * 4].rsplit(" ", 1)[0] + "..."
+
+            parte = f"{cabecalho}Conteúdo: {conteudo}\n{rodape}"
+            context_parts.append(parte)
+            orcamento -= PassageChunker.estimar_tokens(parte)
 
         return "\n".join(context_parts)
 
@@ -523,15 +717,21 @@ class KnowledgeManager:
 
     Funcionalidades:
     - Adicionar conhecimento com embeddings
+    - Indexação por passagens (chunks com sobreposição)
     - Importação em massa
     - Atualização de embeddings
     - Busca e recuperação
     """
 
+    # Tabelas com embeddings (ordem da re-indexação)
+    TABELAS_EMBEDDING = ('knowledge', 'knowledge_passages')
+
     def __init__(
         self,
         supabase_client: SupabaseClient,
-        embeddings: OpenAIEmbeddings
+        embeddings: OpenAIEmbeddings,
+        chunk_tokens: int = 200,
+        chunk_overlap_tokens: int = 40
     ):
         """
         Inicializa knowledge manager.
@@ -539,9 +739,16 @@ class KnowledgeManager:
         Args:
             supabase_client: Cliente Supabase
             embeddings: OpenAI embeddings
+            chunk_tokens: Tamanho máximo de cada passagem (tokens)
+            chunk_overlap_tokens: Sobreposição entre passagens (tokens)
         """
         self.supabase = supabase_client
         self.embeddings = embeddings
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+
+        # Progresso da re-indexação em execução neste processo
+        self._progresso: Optional[Dict] = None
 
     async def add_knowledge(
         self,
@@ -553,7 +760,7 @@ class KnowledgeManager:
         categoria: Optional[str] = None
     ) -> str:
         """
-        Adiciona novo conhecimento com embedding.
+        Adiciona novo conhecimento com embedding e passagens indexadas.
 
         Args:
             assunto: Título/assunto do conhecimento
@@ -580,9 +787,74 @@ class KnowledgeManager:
             categoria=categoria
         )
 
+        # Indexar passagens
+        await self.index_passages(result['id'], conteudo)
+
         logger.info(f"Conhecimento '{assunto}' adicionado à base")
         return result['id']
 
+    async def index_passages(self, knowledge_id: str, conteudo: str) -> int:
+        """
+        Divide o conteúdo em passagens e indexa cada uma com embedding próprio.
+
+        Substitui passagens anteriores do mesmo documento.
+
+        Args:
+            knowledge_id: ID do conhecimento (parent)
+            conteudo: Conteúdo completo
+
+        Returns:
+            Quantidade de passagens indexadas
+        """
+        passagens = PassageChunker.chunk(
+            conteudo,
+            max_tokens=self.chunk_tokens,
+            overlap_tokens=self.chunk_overlap_tokens
+        )
+
+        vetores = await self.embeddings.aembed_documents(passagens) if passagens else []
+
+        await self.supabase.replace_knowledge_passages(knowledge_id, [
+            {
+                'posicao': posicao,
+                'conteudo': passagem,
+                'tokens': PassageChunker.estimar_tokens(passagem),
+                'embedding': vetor
+            }
+            for posicao, (passagem, vetor) in enumerate(zip(passagens, vetores))
+        ])
+
+        return len(passagens)
+
+    async def rebuild_passages(self, batch_size: int = 10) -> int:
+        """
+        (Re)gera passagens de toda a base de conhecimento.
+
+        Usado para indexar documentos criados antes da indexação por passagens
+        ou após mudar chunk_tokens/chunk_overlap_tokens.
+
+        Args:
+            batch_size: Documentos por página (keyset por id)
+
+        Returns:
+            Total de passagens indexadas
+        """
+        total = 0
+        cursor = None
+
+        while True:
+            pagina = await self.supabase.list_knowledge_page(after_id=cursor, limit=batch_size)
+            if not pagina:
+                break
+
+            for doc in pagina:
+                total += await self.index_passages(doc['id'], doc['conteudo'])
+
+            cursor = pagina[-1]['id']
+
+        logger.info(f"Passagens reindexadas: {total}")
+        return total
+
     async def bulk_import_from_json(self, file_path: str):
         """
         Importa conhecimento em massa de arquivo JSON.
@@ -618,20 +890,202 @@ class KnowledgeManager:
 
         logger.info("Importação concluída")
 
-    async def update_embeddings_batch(self, batch_size: int = 10):
+    async def update_embeddings_batch(
+        self,
+        batch_size: int = 10,
+        max_concurrency: int = 4,
+        embeddings: Optional[OpenAIEmbeddings] = None
+    ) -> Dict:
         """
-        Atualiza embeddings de toda a base de conhecimento.
+        Re-indexa toda a base de conhecimento com um novo modelo (online).
+
+        Útil quando mudar o modelo de embeddings (OPENAI_MODEL_EMBEDDING).
+
+        Fluxo:
+        1. Pagina `knowledge` e depois `knowledge_passages` por keyset (id)
+           a partir do checkpoint
+        2. Gera embeddings em lotes, até `max_concurrency` lotes em paralelo
+        3. Grava na coluna sombra `embedding_shadow` e salva checkpoint
+        4. Reprocessa documentos criados durante o job
+        5. Troca o índice ativo atomicamente (swap_knowledge_embeddings)
+
+        O retriever continua servindo o índice antigo durante todo o job.
+        Se o processo cair, chamar novamente retoma do último checkpoint.
 
-        Útil quando mudar o modelo de embeddings.
+        O novo modelo precisa gerar vetores de 1536 dimensões
+        (ex: OpenAIEmbeddings(model="text-embedding-3-large", dimensions=1536)).
 
         Args:
             batch_size: Quantidade de documentos por lote
+            max_concurrency: Lotes processados em paralelo
+            embeddings: Embeddings do novo modelo (default: self.embeddings)
+
+        Returns:
+            Status final da re-indexação
         """
-        # TODO: Implementar lógica de atualização em lote
-        # 1. Buscar todos os conhecimentos
-        # 2. Gerar novos embeddings
-        # 3. Atualizar no Supabase
-        logger.warning("update_embeddings_batch não implementado")
+        embeddings = embeddings or self.embeddings
+        modelo = embeddings.model
+
+        estado = await self.supabase.get_knowledge_embedding_state()
+
+        if estado.get('modelo_ativo') == modelo:
+            logger.info(f"Base de conhecimento já indexada com {modelo}")
+            return await self.get_reembedding_status()
+
+        # Retomar job interrompido ou iniciar um novo
+        if estado.get('status') == 'em_andamento' and estado.get('modelo_shadow') == modelo:
+            checkpoint_tabela = estado.get('checkpoint_tabela') or self.TABELAS_EMBEDDING[0]
+            checkpoint = estado.get('checkpoint_id')
+            processados = estado.get('processados') or 0
+            logger.info(
+                f"Retomando re-indexação para {modelo} a partir de "
+                f"{checkpoint_tabela}:{checkpoint}"
+            )
+        else:
+            total = await self.supabase.reset_knowledge_shadow(modelo)
+            checkpoint_tabela = self.TABELAS_EMBEDDING[0]
+            checkpoint = None
+            processados = 0
+            logger.info(f"Iniciando re-indexação de {total} documentos para {modelo}")
+
+        self._progresso = {
+            'modelo': modelo,
+            'inicio': datetime.utcnow(),
+            'processados_inicio': processados,
+            'processados': processados
+        }
+
+        # 1-3. Passada principal por keyset (uma tabela por vez)
+        inicio = self.TABELAS_EMBEDDING.index(checkpoint_tabela)
+        for tabela in self.TABELAS_EMBEDDING[inicio:]:
+            if tabela != checkpoint_tabela:
+                checkpoint = None
+
+            while True:
+                paginas = []
+                cursor = checkpoint
+
+                for _ in range(max_concurrency):
+                    pagina = await self.supabase.list_knowledge_page(
+                        after_id=cursor,
+                        limit=batch_size,
+                        tabela=tabela
+                    )
+                    if not pagina:
+                        break
+                    paginas.append(pagina)
+                    cursor = pagina[-1]['id']
+                    if len(pagina) < batch_size:
+                        break
+
+                if not paginas:
+                    break
+
+                await asyncio.gather(*[
+                    self._reembed_pagina(pagina, embeddings, tabela)
+                    for pagina in paginas
+                ])
+
+                checkpoint = paginas[-1][-1]['id']
+                processados += sum(len(pagina) for pagina in paginas)
+                self._progresso['processados'] = processados
+
+                await self.supabase.update_knowledge_embedding_state({
+                    'checkpoint_tabela': tabela,
+                    'checkpoint_id': checkpoint,
+                    'processados': processados
+                })
+
+                logger.debug(
+                    f"Re-indexação: {processados} documentos "
+                    f"(checkpoint {tabela}:{checkpoint})"
+                )
+
+        # 4-5. Documentos criados durante o job + troca atômica
+        for tentativa in range(3):
+            for tabela in self.TABELAS_EMBEDDING:
+                while True:
+                    pendentes = await self.supabase.list_knowledge_page(
+                        limit=batch_size,
+                        apenas_pendentes=True,
+                        tabela=tabela
+                    )
+                    if not pendentes:
+                        break
+                    await self._reembed_pagina(pendentes, embeddings, tabela)
+
+            try:
+                trocados = await self.supabase.swap_knowledge_embeddings(modelo)
+                logger.info(f"✅ Re-indexação concluída: {trocados} documentos agora em {modelo}")
+                break
+            except Exception as e:
+                if tentativa == 2:
+                    raise
+                logger.warning(f"Troca de índice adiada (novos documentos pendentes): {e}")
+
+        status = await self.get_reembedding_status()
+        self._progresso = None
+        return status
+
+    async def _reembed_pagina(
+        self,
+        pagina: List[Dict],
+        embeddings: OpenAIEmbeddings,
+        tabela: str = 'knowledge'
+    ):
+        """Gera embeddings de uma página e grava na coluna sombra."""
+        vetores = await embeddings.aembed_documents([doc['conteudo'] for doc in pagina])
+
+        await self.supabase.set_knowledge_shadow_embeddings(
+            [
+                {'id': doc['id'], 'embedding': vetor}
+                for doc, vetor in zip(pagina, vetores)
+            ],
+            tabela=tabela
+        )
+
+    async def get_reembedding_status(self) -> Dict:
+        """
+        Retorna progresso da re-indexação.
+
+        Vazão e ETA são calculados pela execução local quando o job roda
+        neste processo; caso contrário, a partir de `iniciado_em` no banco.
+
+        Returns:
+            Dict com status, modelos, progresso, docs_por_segundo e eta_segundos
+        """
+        estado = await self.supabase.get_knowledge_embedding_state()
+
+        total = estado.get('total') or 0
+        processados = estado.get('processados') or 0
+        progresso = self._progresso
+
+        docs_por_segundo = 0.0
+        if progresso:
+            decorrido = (datetime.utcnow() - progresso['inicio']).total_seconds()
+            feitos = progresso['processados'] - progresso['processados_inicio']
+            processados = progresso['processados']
+            if decorrido > 0:
+                docs_por_segundo = feitos / decorrido
+        elif estado.get('status') == 'em_andamento' and estado.get('iniciado_em'):
+            iniciado_em = datetime.fromisoformat(estado['iniciado_em'].replace('Z', '+00:00'))
+            decorrido = (datetime.now(iniciado_em.tzinfo) - iniciado_em).total_seconds()
+            if decorrido > 0:
+                docs_por_segundo = processados / decorrido
+
+        restantes = max(total - processados, 0)
+        eta_segundos = restantes / docs_por_segundo if docs_por_segundo > 0 else None
+
+        return {
+            'status': estado.get('status'),
+            'modelo_ativo': estado.get('modelo_ativo'),
+            'modelo_shadow': estado.get('modelo_shadow'),
+            'total': total,
+            'processados': processados,
+            'restantes': restantes,
+            'docs_por_segundo': round(docs_por_segundo, 2),
+            'eta_segundos': round(eta_segundos) if eta_segundos is not None else None
+        }
 
 
 # ==============================================================================
@@ -709,6 +1163,7 @@ __all__ = [
     'RedisMemoryManager',
     'MessageBuffer',
     'SessionStateManager',
+    'PassageChunker',
     'HybridRetriever',
     'KnowledgeManager',
     'ConversationSummarizer',
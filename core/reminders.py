@@ -0,0 +1,514 @@
+"""
+CORE/REMINDERS.PY
+=================
+Lembretes de reunião (24h e 2h antes).
+
+Componentes:
+- ReminderTemplates: Templates extraídos do prompt-lembretes.md (cache)
+- ReminderScheduler: Fila no Redis (sorted set) por horário de disparo
+
+Os lembretes entram na fila quando a reunião é agendada/reagendada e
+saem quando é cancelada. Um loop retira em lote os itens vencidos
+(operação atômica, segura com várias réplicas), envia pelo WhatsApp e
+marca as flags lembrete_*_enviado em um UPDATE por tipo. Não há
+varredura periódica da tabela reunioes.
+
+Itens retirados não somem da fila de uma vez: vão para um ZSET "em
+andamento" com prazo (lease) e só saem dele depois do envio. Se a
+instância cair no meio do lote, os itens com lease vencido voltam para
+a fila (verificado a cada ciclo e ao assumir a liderança); se o
+scheduler for parado, os itens ainda não enviados voltam na hora.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Dict, Optional
+from zoneinfo import ZoneInfo
+
+import redis.asyncio as redis
+from loguru import logger
+
+from core.integrations import WhatsAppClient, SupabaseClient
+from core.leader import LeaderElection
+from core.memory import RedisMemoryManager
+
+
+# ==============================================================================
+# TEMPLATES
+# ==============================================================================
+
+class ReminderTemplates:
+    """
+    Templates de lembrete extraídos do prompt-lembretes.md.
+
+    Cada "### Opção N" das seções "TEMPLATES - LEMBRETE 24H/2H ANTES" vira
+    uma lista de mensagens (linhas "Msg N: ..."). O arquivo é lido uma vez;
+    a renderização só substitui os placeholders.
+    """
+
+    SECOES = {
+        "24h": "TEMPLATES - LEMBRETE 24H ANTES",
+        "2h": "TEMPLATES - LEMBRETE 2H ANTES",
+    }
+
+    PADRAO_MSG = re.compile(r'^Msg \d+:\s*"?(.*?)"?\s*$')
+    PADRAO_PLACEHOLDER = re.compile(r"\[[^\]]+\]")
+
+    # Usado se o prompt não tiver opções renderizáveis
+    PADRAO = {
+        "24h": ["Oi [Nome]! Lembrando da nossa reunião amanhã às [hora] 😊", "Está confirmado para você?"],
+        "2h": ["Oi [Nome]! Daqui 2 horas temos nossa reunião 😊", "Link do Meet: [LINK_DO_MEET]"],
+    }
+
+    def __init__(self, prompt_path: str = "config/prompt-lembretes.md"):
+        self.opcoes: Dict[str, List[List[str]]] = self._parse(Path(prompt_path).read_text())
+
+    def _parse(self, texto: str) -> Dict[str, List[List[str]]]:
+        opcoes: Dict[str, List[List[str]]] = {}
+
+        for tipo, titulo in self.SECOES.items():
+            inicio = texto.find(titulo)
+            if inicio < 0:
+                opcoes[tipo] = []
+                continue
+
+            fim = texto.find("\n## ", inicio)
+            secao = texto[inicio:fim if fim >= 0 else None]
+
+            opcoes[tipo] = []
+            for bloco in secao.split("### ")[1:]:
+                mensagens = []
+                for linha in bloco.splitlines():
+                    match = self.PADRAO_MSG.match(linha.strip())
+                    if match:
+                        mensagens.append(match.group(1))
+                if mensagens:
+                    opcoes[tipo].append(mensagens)
+
+        return opcoes
+
+    def render(self, tipo: str, dados: Dict[str, str], semente: str = "") -> List[str]:
+        """
+        Renderiza um lembrete.
+
+        A opção é escolhida de forma estável pela semente (id da reunião),
+        entre as que não ficam com placeholder sem valor.
+        """
+        valores = {f"[{chave}]": valor for chave, valor in dados.items() if valor}
+
+        def _substituir(mensagem: str) -> str:
+            return self.PADRAO_PLACEHOLDER.sub(lambda m: valores.get(m.group(0), m.group(0)), mensagem)
+
+        candidatas = []
+        for opcao in self.opcoes.get(tipo, []):
+            renderizada = [_substituir(m) for m in opcao]
+            if not any(self.PADRAO_PLACEHOLDER.search(m) for m in renderizada):
+                candidatas.append(renderizada)
+
+        if not candidatas:
+            return [
+                m for m in (_substituir(m) for m in self.PADRAO[tipo])
+                if not self.PADRAO_PLACEHOLDER.search(m)
+            ]
+
+        indice = int(hashlib.md5(semente.encode()).hexdigest(), 16) % len(candidatas)
+        return candidatas[indice]
+
+
+# ==============================================================================
+# REMINDER SCHEDULER
+# ==============================================================================
+
+class ReminderScheduler:
+    """
+    Agenda e dispara lembretes de reunião a partir de uma fila no Redis.
+
+    - ZSET lembretes:fila  membro "<reuniao_id>:<tipo>", score = epoch de disparo
+    - ZSET lembretes:em_andamento  membro retirado, score = fim do lease
+    - HASH lembretes:dados membro -> JSON com telefone, nome, início e link
+    """
+
+    FILA_KEY = "lembretes:fila"
+    EM_ANDAMENTO_KEY = "lembretes:em_andamento"
+    DADOS_KEY = "lembretes:dados"
+
+    # Antecedência de cada lembrete
+    ANTECEDENCIAS = {
+        "24h": timedelta(hours=24),
+        "2h": timedelta(hours=2),
+    }
+
+    # Move atomicamente até N itens vencidos da fila para "em andamento"
+    # (se ARGV[4] não for vazio, só enquanto o lease KEYS[3] tiver esse valor)
+    _RETIRAR_VENCIDOS = """
+    if ARGV[4] ~= '' and redis.call('get', KEYS[3]) ~= ARGV[4] then
+        return {}
+    end
+    local itens = redis.call('zrangebyscore', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+    for _, item in ipairs(itens) do
+        redis.call('zrem', KEYS[1], item)
+        redis.call('zadd', KEYS[2], ARGV[3], item)
+    end
+    return itens
+    """
+
+    # Devolve à fila (score ARGV[2]) itens em andamento com lease até ARGV[1]
+    _DEVOLVER = """
+    local itens = redis.call('zrangebyscore', KEYS[2], '-inf', ARGV[1])
+    for _, item in ipairs(itens) do
+        redis.call('zrem', KEYS[2], item)
+        redis.call('zadd', KEYS[1], 'NX', ARGV[2], item)
+    end
+    return #itens
+    """
+
+    # Conclui itens: sai de "em andamento"; os dados só são apagados se o
+    # lembrete não tiver sido reagendado na fila nesse meio tempo
+    _CONCLUIR = """
+    for _, item in ipairs(ARGV) do
+        redis.call('zrem', KEYS[2], item)
+        if not redis.call('zscore', KEYS[1], item) then
+            redis.call('hdel', KEYS[3], item)
+        end
+    end
+    return #ARGV
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        whatsapp_client: WhatsAppClient,
+        supabase_client: SupabaseClient,
+        memory: RedisMemoryManager,
+        prompt_path: str = "config/prompt-lembretes.md",
+        timezone: str = "America/Sao_Paulo",
+        batch_size: int = 50,
+        intervalo_max_segundos: int = 30,
+        max_tentativas: int = 3,
+        lease_segundos: int = 600
+    ):
+        """
+        Args:
+            redis_client: Cliente Redis async
+            whatsapp_client: Cliente WhatsApp
+            supabase_client: Cliente Supabase (flags de lembrete)
+            memory: Memória conversacional (registra o lembrete no histórico)
+            prompt_path: Prompt com os templates de lembrete
+            timezone: Fuso usado para exibir o horário
+            batch_size: Máximo de lembretes retirados por vez
+            intervalo_max_segundos: Espera máxima entre verificações da fila
+            max_tentativas: Tentativas de envio por lembrete
+            lease_segundos: Prazo para enviar um lote retirado antes que
+                seus itens voltem à fila (deve cobrir o envio do lote)
+        """
+        self.redis = redis_client
+        self.whatsapp = whatsapp_client
+        self.supabase = supabase_client
+        self.memory = memory
+        self.templates = ReminderTemplates(prompt_path)
+        self.tz = ZoneInfo(timezone)
+        self.batch_size = batch_size
+        self.intervalo_max_segundos = intervalo_max_segundos
+        self.max_tentativas = max_tentativas
+        self.lease_segundos = lease_segundos
+
+        # Eleição de líder (opcional): cerca a retirada da fila
+        self.lideranca: Optional[LeaderElection] = None
+
+        self._task: Optional[asyncio.Task] = None
+        self._lote_atual: List[str] = []
+        self.stats = {
+            "agendados": 0, "enviados": 0, "falhas": 0, "descartados": 0, "recuperados": 0
+        }
+
+    # === FILA ===
+
+    @staticmethod
+    def _membro(reuniao_id: str, tipo: str) -> str:
+        return f"{reuniao_id}:{tipo}"
+
+    async def agendar(
+        self,
+        reuniao_id: str,
+        telefone: str,
+        nome: str,
+        data_inicio: datetime,
+        meet_link: Optional[str] = None,
+        tipos: Optional[List[str]] = None
+    ) -> int:
+        """
+        Coloca os lembretes da reunião na fila (substitui os anteriores).
+
+        Lembretes cujo horário já passou (ou fora de `tipos`) não são agendados.
+
+        Returns:
+            Número de lembretes agendados
+        """
+        if data_inicio.tzinfo is None:
+            data_inicio = data_inicio.replace(tzinfo=self.tz)
+
+        agora = time.time()
+        pipe = self.redis.pipeline()
+        agendados = 0
+
+        for tipo, antecedencia in self.ANTECEDENCIAS.items():
+            membro = self._membro(reuniao_id, tipo)
+            disparo = (data_inicio - antecedencia).timestamp()
+
+            if disparo <= agora or (tipos is not None and tipo not in tipos):
+                pipe.zrem(self.FILA_KEY, membro)
+                pipe.hdel(self.DADOS_KEY, membro)
+                continue
+
+            pipe.zadd(self.FILA_KEY, {membro: disparo})
+            pipe.hset(self.DADOS_KEY, membro, json.dumps({
+                "reuniao_id": reuniao_id,
+                "tipo": tipo,
+                "telefone": telefone,
+                "nome": nome,
+                "data_inicio": data_inicio.isoformat(),
+                "meet_link": meet_link,
+                "tentativas": 0
+            }))
+            agendados += 1
+
+        await pipe.execute()
+        self.stats["agendados"] += agendados
+
+        logger.info(f"{agendados} lembretes agendados para reunião {reuniao_id}")
+        return agendados
+
+    async def cancelar(self, reuniao_id: str):
+        """Remove os lembretes pendentes da reunião."""
+        membros = [self._membro(reuniao_id, tipo) for tipo in self.ANTECEDENCIAS]
+
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.FILA_KEY, *membros)
+        pipe.zrem(self.EM_ANDAMENTO_KEY, *membros)
+        pipe.hdel(self.DADOS_KEY, *membros)
+        await pipe.execute()
+
+    async def reconstruir(self, horas: int = 48) -> int:
+        """
+        Recarrega a fila a partir do banco (uso pontual, ex.: Redis zerado).
+
+        Returns:
+            Número de lembretes agendados
+        """
+        total = 0
+        for reuniao in await self.supabase.get_reunioes_pendentes_lembrete(horas):
+            lead = reuniao.get('leads_wpp') or {}
+            if not lead.get('telefone'):
+                continue
+
+            inicio = datetime.fromisoformat(reuniao['data_inicio'].replace('Z', '+00:00'))
+            total += await self.agendar(
+                reuniao['id'],
+                lead['telefone'],
+                lead.get('nome', ''),
+                inicio,
+                reuniao.get('meet_link'),
+                # Não reenviar o que já foi enviado
+                tipos=[
+                    tipo for tipo in self.ANTECEDENCIAS
+                    if not reuniao.get(f'lembrete_{tipo}_enviado')
+                ]
+            )
+
+        logger.info(f"Fila de lembretes reconstruída: {total} lembretes")
+        return total
+
+    # === DISPARO ===
+
+    async def recuperar_expirados(self) -> int:
+        """
+        Devolve à fila lembretes retirados cujo lease venceu (instância caiu).
+
+        Returns:
+            Número de lembretes devolvidos
+        """
+        devolvidos = await self.redis.eval(
+            self._DEVOLVER, 2, self.FILA_KEY, self.EM_ANDAMENTO_KEY, time.time(), time.time()
+        )
+        if devolvidos:
+            self.stats["recuperados"] += devolvidos
+            logger.warning(f"{devolvidos} lembretes com lease vencido devolvidos à fila")
+        return devolvidos
+
+    async def _concluir(self, membros: List[str]):
+        if membros:
+            await self.redis.eval(
+                self._CONCLUIR, 3, self.FILA_KEY, self.EM_ANDAMENTO_KEY, self.DADOS_KEY, *membros
+            )
+
+    async def processar_vencidos(self) -> int:
+        """
+        Retira e envia um lote de lembretes vencidos.
+
+        Returns:
+            Número de lembretes enviados
+        """
+        agora = time.time()
+        lease, valor = self.lideranca.cerca() if self.lideranca else ["", ""]
+        membros = await self.redis.eval(
+            self._RETIRAR_VENCIDOS, 3, self.FILA_KEY, self.EM_ANDAMENTO_KEY, lease,
+            agora, self.batch_size, agora + self.lease_segundos, valor
+        )
+        if not membros:
+            return 0
+
+        membros = [m.decode() if isinstance(m, bytes) else m for m in membros]
+        self._lote_atual = list(membros)
+
+        dados_brutos = await self.redis.hmget(self.DADOS_KEY, membros)
+        enviados: Dict[str, List[str]] = {tipo: [] for tipo in self.ANTECEDENCIAS}
+
+        try:
+            for membro, bruto in zip(membros, dados_brutos):
+                concluidos: List[str] = []
+
+                if not bruto:
+                    concluidos.append(membro)
+                else:
+                    dados = json.loads(bruto)
+                    inicio = datetime.fromisoformat(dados['data_inicio'])
+
+                    # Reunião já começou (ex.: serviço ficou fora do ar): descartar
+                    if inicio.timestamp() <= time.time():
+                        self.stats["descartados"] += 1
+                        concluidos.append(membro)
+                    else:
+                        try:
+                            await self._enviar(membro, dados, inicio)
+                            enviados[dados['tipo']].append(dados['reuniao_id'])
+                            concluidos.append(membro)
+                            self.stats["enviados"] += 1
+                        except Exception as e:
+                            self.stats["falhas"] += 1
+                            logger.error(f"Erro ao enviar lembrete {membro}: {e}")
+                            await self._reagendar_falha(membro, dados, concluidos)
+
+                # Conclui logo após o envio: parar no meio do lote não reenvia
+                await self._concluir(concluidos)
+                self._lote_atual.remove(membro)
+        finally:
+            # Flags em lote: um UPDATE por tipo (também se parado no meio do lote)
+            for tipo, reuniao_ids in enviados.items():
+                if reuniao_ids:
+                    try:
+                        await self.supabase.marcar_lembretes_enviados(reuniao_ids, tipo)
+                    except Exception as e:
+                        logger.error(f"Erro ao marcar lembretes {tipo} enviados: {e}")
+
+        return sum(len(ids) for ids in enviados.values())
+
+    async def _enviar(self, membro: str, dados: Dict, inicio: datetime):
+        """
+        Renderiza e envia o lembrete, registrando no histórico.
+
+        As mensagens já enviadas ficam em dados['enviadas'] (gravado no
+        Redis a cada envio): uma nova tentativa continua de onde parou,
+        sem repetir a primeira mensagem ao lead. O render é determinístico
+        (semente = reunião), então as mensagens são as mesmas.
+        """
+        nome = (dados.get('nome') or '').split(' ')[0]
+        mensagens = self.templates.render(
+            dados['tipo'],
+            {
+                "Nome": nome,
+                "hora": inicio.astimezone(self.tz).strftime("%H:%M"),
+                "LINK_DO_MEET": dados.get('meet_link')
+            },
+            semente=dados['reuniao_id']
+        )
+
+        for i in range(dados.get('enviadas', 0), len(mensagens)):
+            if i > 0:
+                await asyncio.sleep(2)  # Delay entre fragmentos
+            await self.whatsapp.send_text(dados['telefone'], mensagens[i])
+
+            dados['enviadas'] = i + 1
+            if dados['enviadas'] < len(mensagens):
+                await self.redis.hset(self.DADOS_KEY, membro, json.dumps(dados))
+
+        await self.memory.add_message(
+            dados['telefone'],
+            "ai",
+            "\n".join(mensagens),
+            metadata={"type": "lembrete", "tipo": dados['tipo'], "reuniao_id": dados['reuniao_id']}
+        )
+
+    async def _reagendar_falha(self, membro: str, dados: Dict, concluidos: List[str]):
+        """Recoloca o lembrete na fila com backoff (ou desiste)."""
+        dados['tentativas'] = dados.get('tentativas', 0) + 1
+        if dados['tentativas'] >= self.max_tentativas:
+            concluidos.append(membro)
+            return
+
+        pipe = self.redis.pipeline()
+        pipe.hset(self.DADOS_KEY, membro, json.dumps(dados))
+        pipe.zadd(self.FILA_KEY, {membro: time.time() + 60 * dados['tentativas']})
+        pipe.zrem(self.EM_ANDAMENTO_KEY, membro)
+        await pipe.execute()
+
+    async def _segundos_ate_proximo(self) -> float:
+        """Espera até o próximo lembrete (limitada a intervalo_max_segundos)."""
+        proximo = await self.redis.zrange(self.FILA_KEY, 0, 0, withscores=True)
+        if not proximo:
+            return self.intervalo_max_segundos
+        return min(max(proximo[0][1] - time.time(), 0.5), self.intervalo_max_segundos)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.recuperar_expirados()
+                while await self.processar_vencidos() >= self.batch_size:
+                    pass
+                espera = await self._segundos_ate_proximo()
+            except Exception as e:
+                logger.error(f"Erro no processamento de lembretes: {e}")
+                espera = self.intervalo_max_segundos
+            await asyncio.sleep(espera)
+
+    def start(self):
+        """Inicia o disparo de lembretes em background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            logger.info("Scheduler de lembretes iniciado")
+
+    async def stop(self):
+        """Para o disparo de lembretes (itens do lote não enviados voltam à fila)."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        if self._lote_atual:
+            pendentes, self._lote_atual = self._lote_atual, []
+            agora = time.time()
+            pipe = self.redis.pipeline()
+            pipe.zrem(self.EM_ANDAMENTO_KEY, *pendentes)
+            pipe.zadd(self.FILA_KEY, {membro: agora for membro in pendentes}, nx=True)
+            try:
+                await pipe.execute()
+                logger.info(f"{len(pendentes)} lembretes não enviados devolvidos à fila")
+            except Exception as e:
+                logger.warning(f"Erro ao devolver lembretes à fila (lease fará isso): {e}")
+
+    async def get_stats(self) -> Dict:
+        """Contadores e tamanho da fila."""
+        return {
+            **self.stats,
+            "pendentes": await self.redis.zcard(self.FILA_KEY),
+            "em_andamento": await self.redis.zcard(self.EM_ANDAMENTO_KEY)
+        }
+
+
+__all__ = ['ReminderScheduler', 'ReminderTemplates']
@@ -0,0 +1,419 @@
+"""
+CORE/ROUTER.PY
+==============
+Roteamento leve de intenções antes do agente LangChain.
+
+Componentes:
+- TinyIntentModel: TF-IDF + regressão logística local (treinada com logs)
+- IntentRouter: Regras (palavras-chave/regex) + modelo local
+
+Turnos triviais (agradecimentos, emojis soltos, opt-out explícito e
+comandos como #clear) são respondidos por handlers com templates,
+sem chamar o LLM. Apenas turnos substantivos seguem para o AgenteSDR.
+"""
+
+import json
+import math
+import random
+import re
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+from loguru import logger
+
+from core.integrations import WhatsAppClient, SupabaseClient
+from core.memory import RedisMemoryManager
+
+
+# ==============================================================================
+# MODELO LOCAL (TF-IDF + REGRESSÃO LOGÍSTICA)
+# ==============================================================================
+
+class TinyIntentModel:
+    """
+    Classificador de intenções minúsculo, sem dependências externas.
+
+    Features TF-IDF de palavras (sem acento, minúsculas) e emojis,
+    regressão logística multinomial treinada por SGD. O modelo é salvo
+    em JSON e carregado no startup (INTENT_MODEL_PATH).
+
+    Treino a partir dos logs (JSONL com {"texto": "...", "rota": "..."}):
+
+        modelo = TinyIntentModel.train_from_jsonl("logs/intencoes.jsonl")
+        modelo.save("config/intent_model.json")
+    """
+
+    def __init__(self):
+        self.classes: List[str] = []
+        self.idf: Dict[str, float] = {}
+        self.pesos: Dict[str, Dict[str, float]] = {}
+        self.bias: Dict[str, float] = {}
+
+    @staticmethod
+    def tokenize(texto: str) -> List[str]:
+        """Tokeniza texto em palavras normalizadas + emojis."""
+        texto = unicodedata.normalize("NFKD", texto.lower())
+        sem_acento = "".join(c for c in texto if not unicodedata.combining(c))
+
+        palavras = re.findall(r"[a-z0-9#]+", sem_acento)
+        emojis = [c for c in texto if ord(c) > 0x2000 and not c.isspace()]
+
+        return palavras + emojis
+
+    def _features(self, texto: str) -> Dict[str, float]:
+        """Vetor TF-IDF esparso (normalizado L2)."""
+        contagem = Counter(t for t in self.tokenize(texto) if t in self.idf)
+        vetor = {t: n * self.idf[t] for t, n in contagem.items()}
+
+        norma = math.sqrt(sum(v * v for v in vetor.values())) or 1.0
+        return {t: v / norma for t, v in vetor.items()}
+
+    def fit(
+        self,
+        textos: List[str],
+        rotulos: List[str],
+        epochs: int = 30,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4
+    ) -> "TinyIntentModel":
+        """
+        Treina o modelo.
+
+        Args:
+            textos: Mensagens de exemplo
+            rotulos: Rota de cada mensagem
+            epochs: Passadas sobre os dados
+            learning_rate: Taxa de aprendizado do SGD
+            l2: Regularização L2
+
+        Returns:
+            O próprio modelo (treinado)
+        """
+        self.classes = sorted(set(rotulos))
+
+        # IDF suavizado
+        documentos = [set(self.tokenize(t)) for t in textos]
+        df = Counter(token for doc in documentos for token in doc)
+        n = len(textos)
+        self.idf = {t: math.log((1 + n) / (1 + f)) + 1 for t, f in df.items()}
+
+        self.pesos = {c: {} for c in self.classes}
+        self.bias = {c: 0.0 for c in self.classes}
+
+        exemplos = [(self._features(t), r) for t, r in zip(textos, rotulos)]
+        rng = random.Random(42)
+
+        for _ in range(epochs):
+            rng.shuffle(exemplos)
+            for features, rotulo in exemplos:
+                probs = self._softmax(features)
+                for classe in self.classes:
+                    erro = probs[classe] - (1.0 if classe == rotulo else 0.0)
+                    pesos = self.pesos[classe]
+                    for token, valor in features.items():
+                        atual = pesos.get(token, 0.0)
+                        pesos[token] = atual - learning_rate * (erro * valor + l2 * atual)
+                    self.bias[classe] -= learning_rate * erro
+
+        return self
+
+    def _softmax(self, features: Dict[str, float]) -> Dict[str, float]:
+        scores = {
+            classe: self.bias[classe] + sum(
+                self.pesos[classe].get(t, 0.0) * v for t, v in features.items()
+            )
+            for classe in self.classes
+        }
+        maximo = max(scores.values())
+        exps = {c: math.exp(s - maximo) for c, s in scores.items()}
+        total = sum(exps.values())
+        return {c: e / total for c, e in exps.items()}
+
+    def predict(self, texto: str) -> Tuple[Optional[str], float]:
+        """
+        Prediz a rota mais provável.
+
+        Returns:
+            (rota, probabilidade) ou (None, 0.0) se o modelo não tiver
+            nenhuma feature conhecida para o texto
+        """
+        if not self.classes:
+            return None, 0.0
+
+        features = self._features(texto)
+        if not features:
+            return None, 0.0
+
+        probs = self._softmax(features)
+        rota = max(probs, key=probs.get)
+        return rota, probs[rota]
+
+    def save(self, path: str):
+        """Salva modelo em JSON."""
+        Path(path).write_text(json.dumps({
+            "classes": self.classes,
+            "idf": self.idf,
+            "pesos": self.pesos,
+            "bias": self.bias
+        }, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, path: str) -> "TinyIntentModel":
+        """Carrega modelo salvo em JSON."""
+        data = json.loads(Path(path).read_text())
+        modelo = cls()
+        modelo.classes = data["classes"]
+        modelo.idf = data["idf"]
+        modelo.pesos = data["pesos"]
+        modelo.bias = data["bias"]
+        return modelo
+
+    @classmethod
+    def train_from_jsonl(cls, path: str, **kwargs) -> "TinyIntentModel":
+        """Treina a partir de logs JSONL ({"texto": ..., "rota": ...})."""
+        textos, rotulos = [], []
+        for linha in Path(path).read_text().splitlines():
+            if linha.strip():
+                item = json.loads(linha)
+                textos.append(item["texto"])
+                rotulos.append(item["rota"])
+
+        logger.info(f"Treinando modelo de intenções com {len(textos)} exemplos")
+        return cls().fit(textos, rotulos, **kwargs)
+
+
+# ==============================================================================
+# INTENT ROUTER
+# ==============================================================================
+
+class IntentRouter:
+    """
+    Pré-classifica o turno e responde os triviais sem chamar o LLM.
+
+    Rotas:
+    - comando: #clear / #limpar
+    - opt_out: pedido explícito para parar de receber mensagens
+    - confirmacao: "obrigado", "valeu", "👍"...
+    - agente: todo o resto (segue para o AgenteSDR)
+
+    Concordâncias ("ok", "combinado", "perfeito") sempre vão ao agente:
+    podem estar aceitando um horário. Agradecimentos e emojis só são
+    atendidos localmente quando a última mensagem do agente não tinha
+    pergunta (senão "👍" é resposta e vai ao agente). Opt-out é só por
+    regra; o modelo local nunca marca um lead como não interessado.
+    """
+
+    ROTA_AGENTE = "agente"
+    ROTA_COMANDO = "comando"
+    ROTA_OPT_OUT = "opt_out"
+    ROTA_CONFIRMACAO = "confirmacao"
+
+    COMANDOS = {"#clear", "#limpar"}
+
+    # Só a mensagem inteira conta como opt-out ("não quero receber ligação"
+    # ou "pare de mandar áudio" são preferências e vão para o agente)
+    PADRAO_OPT_OUT = re.compile(
+        r"^\s*(?:"
+        r"pare|parar|stop|descadastrar|"
+        r"(nao|não)\s+(quero|desejo)\s+(mais\s+)?receber"
+        r"(\s+(mais\s+)?(mensage(m|ns)|nada))?(\s+(de\s+voc[eê]s?|daqui))?|"
+        r"(pare|para)\s+de\s+(me\s+)?(mandar|enviar)(\s+mensage(m|ns))?"
+        r"(\s+(pra|para)\s+mim)?|"
+        r"me\s+(tira|tire|remova|remove)\s+(da|dessa|desta)\s+lista"
+        r")(\s*,?\s*por\s+favor)?\s*[.!]*\s*$",
+        re.IGNORECASE
+    )
+
+    PADRAO_AGRADECIMENTO = re.compile(
+        r"^\s*(muito\s+)?(obrigad[oa]|obg|brigad[oa]|valeu|vlw|grat[oa])"
+        r"(\s+(mesmo|viu|pela?\s+\w+))?\s*[!.]*\s*[\U0001F300-\U0001FAFF☀-➿]*\s*$",
+        re.IGNORECASE
+    )
+
+    PADRAO_SO_EMOJI = re.compile(r"^[\s\U0001F300-\U0001FAFF☀-➿‍️]+$")
+
+    RESPOSTA_AGRADECIMENTO = "Por nada! Qualquer dúvida, estou por aqui 😊"
+    RESPOSTA_OPT_OUT = (
+        "Tudo bem, entendi! Não vou mais te enviar mensagens. "
+        "Se mudar de ideia, é só me chamar por aqui 😊"
+    )
+
+    def __init__(
+        self,
+        whatsapp_client: WhatsAppClient,
+        memory: RedisMemoryManager,
+        supabase_client: SupabaseClient,
+        model_path: Optional[str] = None,
+        model_threshold: float = 0.85,
+        max_palavras: int = 6,
+        apenas_comandos: bool = False
+    ):
+        """
+        Inicializa router.
+
+        Args:
+            whatsapp_client: Cliente WhatsApp
+            memory: Memória conversacional
+            supabase_client: Cliente Supabase (tags)
+            model_path: Modelo TinyIntentModel em JSON (opcional)
+            model_threshold: Probabilidade mínima para aceitar a rota do modelo
+            max_palavras: Mensagens maiores sempre vão para o agente
+            apenas_comandos: Se True, só comandos (#clear) são atendidos localmente
+        """
+        self.whatsapp = whatsapp_client
+        self.memory = memory
+        self.supabase = supabase_client
+        self.model_threshold = model_threshold
+        self.max_palavras = max_palavras
+        self.apenas_comandos = apenas_comandos
+
+        self.model: Optional[TinyIntentModel] = None
+        if model_path and Path(model_path).exists():
+            try:
+                self.model = TinyIntentModel.load(model_path)
+                logger.info(f"Modelo de intenções carregado: {model_path}")
+            except Exception as e:
+                logger.warning(f"Erro ao carregar modelo de intenções: {e}")
+
+        # Contadores por rota (expostos em /metrics)
+        self.contadores: Counter = Counter()
+
+    def classify(self, texto: str) -> str:
+        """
+        Classifica o texto em uma rota (regras primeiro, depois modelo).
+
+        Args:
+            texto: Conteúdo combinado do buffer
+
+        Returns:
+            Nome da rota
+        """
+        limpo = texto.strip()
+
+        if limpo.lower() in self.COMANDOS:
+            return self.ROTA_COMANDO
+
+        if self.apenas_comandos or not limpo or len(limpo.split()) > self.max_palavras:
+            return self.ROTA_AGENTE
+
+        if self.PADRAO_OPT_OUT.match(limpo):
+            return self.ROTA_OPT_OUT
+
+        if self.PADRAO_AGRADECIMENTO.match(limpo) or self.PADRAO_SO_EMOJI.match(limpo):
+            return self.ROTA_CONFIRMACAO
+
+        # Opt-out marca o lead de vez: só pelas regras acima, nunca pelo modelo
+        if self.model:
+            rota, probabilidade = self.model.predict(limpo)
+            if rota == self.ROTA_CONFIRMACAO and probabilidade >= self.model_threshold:
+                return rota
+
+        return self.ROTA_AGENTE
+
+    async def handle(
+        self,
+        phone: str,
+        combined_content: str,
+        original_messages: List[Dict]
+    ) -> bool:
+        """
+        Roteia o turno e executa o handler local, se houver.
+
+        Args:
+            phone: Telefone do lead
+            combined_content: Conteúdo combinado do buffer
+            original_messages: Mensagens originais (mídias sempre vão ao agente)
+
+        Returns:
+            True se o turno foi atendido localmente (não chamar o agente)
+        """
+        tem_midia = any(msg.get('media_url') for msg in original_messages)
+        rota = self.ROTA_AGENTE if tem_midia else self.classify(combined_content)
+
+        if rota == self.ROTA_CONFIRMACAO and await self._ultima_resposta_tem_pergunta(phone):
+            rota = self.ROTA_AGENTE
+
+        self.contadores[rota] += 1
+
+        if rota == self.ROTA_AGENTE:
+            return False
+
+        logger.info(f"🔀 Turno de {phone} atendido pelo router: {rota}")
+
+        if rota == self.ROTA_COMANDO:
+            await self._handle_comando(phone)
+        elif rota == self.ROTA_OPT_OUT:
+            await self._handle_opt_out(phone, combined_content)
+        elif rota == self.ROTA_CONFIRMACAO:
+            await self._handle_confirmacao(phone, combined_content)
+
+        return True
+
+    async def _ultima_resposta_tem_pergunta(self, phone: str) -> bool:
+        """
+        Verifica se a última mensagem do agente tinha uma pergunta.
+
+        Procura "?" em qualquer ponto: a pergunta costuma vir seguida de
+        emoji ou de outra frase ("Terça às 10h funciona? Se sim, já te
+        mando o convite 😊").
+        """
+        for msg in await self.memory.get_history(phone, limit=5):
+            if msg.role == "ai":
+                return "?" in msg.content
+        return False
+
+    async def _handle_comando(self, phone: str):
+        """Comando #clear: limpa histórico."""
+        logger.info(f"🧹 Comando #Clear recebido de {phone}")
+
+        cleared = await self.memory.clear_history(phone)
+
+        if cleared:
+            await self.whatsapp.send_text(
+                phone,
+                "✅ Histórico de conversas limpo com sucesso! Podemos começar do zero."
+            )
+            logger.info(f"✅ Histórico limpo e confirmação enviada para {phone}")
+        else:
+            await self.whatsapp.send_text(
+                phone,
+                "ℹ️ Nenhum histórico encontrado para limpar."
+            )
+
+    async def _handle_opt_out(self, phone: str, texto: str):
+        """Opt-out explícito: marca lead e se despede."""
+        await self.memory.add_message(phone, "human", texto)
+
+        try:
+            await self.supabase.add_tag(phone, "nao_interessado")
+        except ValueError as e:
+            logger.warning(f"Opt-out de lead não cadastrado {phone}: {e}")
+
+        await self.whatsapp.send_text(phone, self.RESPOSTA_OPT_OUT)
+        await self.memory.add_message(phone, "ai", self.RESPOSTA_OPT_OUT)
+
+    async def _handle_confirmacao(self, phone: str, texto: str):
+        """Agradecimento/emoji: registra e responde só a agradecimentos."""
+        await self.memory.add_message(phone, "human", texto)
+
+        if self.PADRAO_AGRADECIMENTO.match(texto.strip()):
+            await self.whatsapp.send_text(phone, self.RESPOSTA_AGRADECIMENTO)
+            await self.memory.add_message(phone, "ai", self.RESPOSTA_AGRADECIMENTO)
+
+    def get_stats(self) -> Dict:
+        """Contadores por rota e fração de turnos que evitaram o LLM."""
+        total = sum(self.contadores.values())
+        locais = total - self.contadores[self.ROTA_AGENTE]
+
+        return {
+            "rotas": dict(self.contadores),
+            "total": total,
+            "sem_llm": locais,
+            "taxa_sem_llm": round(locais / total, 3) if total else 0.0,
+            "modelo_carregado": self.model is not None
+        }
+
+
+__all__ = ['IntentRouter', 'TinyIntentModel']
@@ -0,0 +1,396 @@
+"""
+CORE/VOICE.PY
+=============
+Respostas em áudio (ElevenLabs) reaproveitadas como mídia do WhatsApp.
+
+Componentes:
+- VoiceNoteSynthesizer: Síntese em streaming -> ffmpeg (OGG/Opus) -> /media
+- TTSCache: Cache de áudios sintetizados por texto + voz + modelo + ajustes
+
+O agente fala muitas frases repetidas (saudação, apresentação, pedidos de
+horário). Cada áudio sintetizado é enviado uma vez ao endpoint /media do
+WhatsApp e o ID retornado fica no Redis, chaveado pelo hash do texto
+normalizado e dos parâmetros da voz: a próxima vez que a mesma frase for
+falada não há nova síntese nem novo upload, só o envio por ID. Os IDs de
+mídia valem 30 dias no WhatsApp, então o TTL do cache fica abaixo disso.
+
+A síntese não espera o MP3 inteiro: os blocos da ElevenLabs entram no
+stdin de um ffmpeg enquanto ainda estão sendo gerados, e o OGG/Opus que
+sai (formato de nota de voz do WhatsApp, bem menor que o MP3) é enviado
+direto ao /media. Não há upload intermediário no Storage nem download
+do WhatsApp por URL pública. Sem ffmpeg, o MP3 é enviado como áudio comum.
+
+As frases de config/tts-frases.txt são pré-sintetizadas pelo líder
+(aquecimento), para que já a primeira conversa do dia saia do cache.
+"""
+
+import asyncio
+import hashlib
+import json
+import shutil
+import time
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import redis.asyncio as redis
+from loguru import logger
+
+from core.integrations import ElevenLabsClient, WhatsAppClient
+
+
+# ==============================================================================
+# VOICE NOTE SYNTHESIZER
+# ==============================================================================
+
+class VoiceNoteSynthesizer:
+    """
+    Texto -> nota de voz no WhatsApp (ID de mídia), em streaming.
+
+    Uso:
+        media_id = await sintetizador.sintetizar("Oi, aqui é a Iara!")
+        await whatsapp.send_audio(telefone, media_id=media_id)
+    """
+
+    def __init__(
+        self,
+        elevenlabs_client: ElevenLabsClient,
+        whatsapp_client: WhatsAppClient,
+        opus: bool = True,
+        bitrate: str = "32k",
+        ffmpeg: str = "ffmpeg"
+    ):
+        """
+        Args:
+            elevenlabs_client: Cliente de síntese de voz
+            whatsapp_client: Cliente WhatsApp (upload de mídia)
+            opus: Converte para OGG/Opus (nota de voz); False envia o MP3
+            bitrate: Bitrate do Opus (voz mono)
+            ffmpeg: Executável do ffmpeg
+        """
+        self.elevenlabs = elevenlabs_client
+        self.whatsapp = whatsapp_client
+        self.bitrate = bitrate
+        self.ffmpeg = shutil.which(ffmpeg) if opus else None
+
+        if opus and not self.ffmpeg:
+            logger.warning(f"⚠️ {ffmpeg} não encontrado: áudios serão enviados em MP3")
+
+        self._latencias: Deque[float] = deque(maxlen=200)
+        self._primeiro_bloco: Deque[float] = deque(maxlen=200)
+        self.stats = {
+            "sinteses": 0,
+            "opus": 0,
+            "mp3": 0,
+            "falhas_transcodificacao": 0,
+            "bytes_mp3": 0,
+            "bytes_enviados": 0
+        }
+
+    @property
+    def formato(self) -> str:
+        """Formato enviado ao WhatsApp (entra na chave do cache)."""
+        return "ogg/opus" if self.ffmpeg else "mp3"
+
+    # === TRANSCODIFICAÇÃO ===
+
+    def _comando(self) -> List[str]:
+        return [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-f", "mp3", "-i", "pipe:0",
+            "-vn", "-ac", "1", "-ar", "48000",
+            "-c:a", "libopus", "-b:a", self.bitrate, "-application", "voip",
+            "-f", "ogg", "pipe:1"
+        ]
+
+    async def _transcodificar(self, blocos: AsyncIterator[bytes]) -> bytes:
+        """Alimenta o ffmpeg com os blocos MP3 enquanto lê o OGG/Opus da saída."""
+        processo = await asyncio.create_subprocess_exec(
+            *self._comando(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        async def alimentar():
+            aberto = True
+            try:
+                async for bloco in blocos:
+                    self.stats["bytes_mp3"] += len(bloco)
+                    if not aberto:
+                        continue  # segue lendo o MP3 (usado se a conversão falhar)
+                    try:
+                        processo.stdin.write(bloco)
+                        await processo.stdin.drain()
+                    except (BrokenPipeError, ConnectionResetError):
+                        aberto = False  # ffmpeg encerrou; o erro vem do código de saída
+            finally:
+                processo.stdin.close()
+
+        try:
+            _, saida, erro = await asyncio.gather(
+                alimentar(), processo.stdout.read(), processo.stderr.read()
+            )
+            await processo.wait()
+        except BaseException:
+            if processo.returncode is None:
+                processo.kill()
+                await processo.wait()
+            raise
+
+        if processo.returncode != 0 or not saida:
+            raise RuntimeError(
+                f"ffmpeg saiu com código {processo.returncode}: "
+                f"{erro.decode(errors='replace').strip()[:200]}"
+            )
+        return saida
+
+    # === SÍNTESE ===
+
+    async def _blocos(self, texto: str, inicio: float, mp3: Dict) -> AsyncIterator[bytes]:
+        """Blocos da ElevenLabs, guardando uma cópia do MP3 em `mp3`."""
+        primeiro = True
+        async for bloco in self.elevenlabs.stream_speech(texto):
+            if primeiro:
+                self._primeiro_bloco.append((time.perf_counter() - inicio) * 1000)
+                primeiro = False
+            mp3["dados"].extend(bloco)
+            yield bloco
+        mp3["completo"] = True
+
+    async def sintetizar(self, texto: str) -> str:
+        """
+        Sintetiza, converte e envia o áudio ao WhatsApp. Retorna o ID de mídia.
+
+        Se o ffmpeg falhar, o MP3 já recebido do stream é enviado; a síntese
+        só é refeita se o próprio stream falhou.
+        """
+        inicio = time.perf_counter()
+        audio = None
+        mp3 = {"dados": bytearray(), "completo": False}
+
+        if self.ffmpeg:
+            try:
+                audio = await self._transcodificar(self._blocos(texto, inicio, mp3))
+                mime_type, nome = "audio/ogg", "resposta.ogg"
+                self.stats["opus"] += 1
+            except Exception as e:
+                self.stats["falhas_transcodificacao"] += 1
+                logger.warning(f"Erro ao converter áudio para Opus, enviando MP3: {e}")
+
+        if audio is None:
+            if mp3["completo"] and mp3["dados"]:
+                audio = bytes(mp3["dados"])
+            else:
+                audio = await self.elevenlabs.text_to_speech(texto)
+            mime_type, nome = "audio/mpeg", "resposta.mp3"
+            self.stats["mp3"] += 1
+
+        media_id = await self.whatsapp.upload_media(audio, mime_type, nome)
+
+        self.stats["sinteses"] += 1
+        self.stats["bytes_enviados"] += len(audio)
+        self._latencias.append((time.perf_counter() - inicio) * 1000)
+        return media_id
+
+    @staticmethod
+    def _resumo(valores: Deque[float]) -> Dict:
+        ordenados = sorted(valores)
+        return {
+            "media_ms": round(sum(ordenados) / len(ordenados), 2),
+            "p95_ms": round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))], 2)
+        }
+
+    def get_stats(self) -> Dict:
+        """Contadores e latências (primeiro bloco da ElevenLabs e texto -> ID de mídia)."""
+        stats = {**self.stats, "formato": self.formato}
+        if self._primeiro_bloco:
+            stats["primeiro_bloco"] = self._resumo(self._primeiro_bloco)
+        if self._latencias:
+            stats["latencia_total"] = self._resumo(self._latencias)
+        return stats
+
+
+# ==============================================================================
+# TTS CACHE
+# ==============================================================================
+
+class TTSCache:
+    """
+    Cache de áudios sintetizados (ID de mídia do WhatsApp por frase).
+
+    Uso:
+        media_id = await tts_cache.obter_media_id("Oi, aqui é a Iara!")
+        await whatsapp.send_audio(telefone, media_id=media_id)
+    """
+
+    PREFIX = "tts:"
+
+    # Remove a chave só se ainda guarda o ID rejeitado (outra réplica
+    # pode já ter gravado um novo)
+    _INVALIDAR = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        sintetizador: VoiceNoteSynthesizer,
+        ttl: int = 2160000,
+        intervalo_aquecimento: int = 21600
+    ):
+        """
+        Args:
+            redis_client: Cliente Redis async
+            sintetizador: Síntese + upload das notas de voz
+            ttl: Segundos de validade do ID (abaixo dos 30 dias do WhatsApp)
+            intervalo_aquecimento: Segundos entre aquecimentos das frases fixas
+        """
+        self.redis = redis_client
+        self.sintetizador = sintetizador
+        self.ttl = ttl
+        self.intervalo_aquecimento = intervalo_aquecimento
+
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sinteses": 0,
+            "erros": 0,
+            "aquecidas": 0,
+            "invalidadas": 0
+        }
+
+    # === CHAVES ===
+
+    @staticmethod
+    def normalizar(texto: str) -> str:
+        """Normaliza espaços (o texto falado não muda com eles)."""
+        return " ".join(texto.split())
+
+    def _chave(self, texto: str) -> str:
+        parametros = self.sintetizador.elevenlabs.parametros()
+        base = json.dumps(
+            {
+                "texto": self.normalizar(texto),
+                "formato": self.sintetizador.formato,
+                **parametros
+            },
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return f"{self.PREFIX}{hashlib.sha256(base.encode()).hexdigest()}"
+
+    # === CONSULTA ===
+
+    async def obter_media_id(self, texto: str) -> str:
+        """
+        ID de mídia do áudio da frase (do cache ou sintetizado agora).
+
+        Chamadas simultâneas para a mesma frase esperam uma única síntese.
+        """
+        chave = self._chave(texto)
+
+        media_id = await self.redis.get(chave)
+        if media_id:
+            self.stats["hits"] += 1
+            return media_id.decode() if isinstance(media_id, bytes) else media_id
+
+        lock = self._locks.setdefault(chave, asyncio.Lock())
+        try:
+            async with lock:
+                media_id = await self.redis.get(chave)
+                if media_id:
+                    self.stats["hits"] += 1
+                    return media_id.decode() if isinstance(media_id, bytes) else media_id
+
+                self.stats["misses"] += 1
+                media_id = await self.sintetizador.sintetizar(self.normalizar(texto))
+                self.stats["sinteses"] += 1
+                await self.redis.setex(chave, self.ttl, media_id)
+                return media_id
+        finally:
+            if not lock.locked():
+                self._locks.pop(chave, None)
+
+    async def invalidar(self, texto: str, media_id: str):
+        """
+        Descarta o ID da frase rejeitado pelo WhatsApp (mídia expirada ou
+        removida antes do TTL); a próxima consulta sintetiza de novo.
+        """
+        removidas = await self.redis.eval(self._INVALIDAR, 1, self._chave(texto), media_id)
+        if removidas:
+            self.stats["invalidadas"] += 1
+            logger.warning(f"ID de mídia TTS {media_id} rejeitado, removido do cache")
+
+    # === AQUECIMENTO ===
+
+    @staticmethod
+    def carregar_frases(caminho: str) -> List[str]:
+        """Lê as frases do arquivo (uma por linha, # para comentários)."""
+        arquivo = Path(caminho)
+        if not arquivo.exists():
+            return []
+
+        frases = []
+        for linha in arquivo.read_text(encoding="utf-8").splitlines():
+            linha = linha.strip()
+            if linha and not linha.startswith("#"):
+                frases.append(linha)
+        return frases
+
+    async def aquecer(self, frases: List[str]) -> int:
+        """Garante no cache o áudio de cada frase. Retorna quantas foram sintetizadas."""
+        sintetizadas = 0
+        for frase in frases:
+            antes = self.stats["sinteses"]
+            try:
+                await self.obter_media_id(frase)
+            except Exception as e:
+                self.stats["erros"] += 1
+                logger.warning(f"Erro ao aquecer áudio '{frase[:40]}': {e}")
+                continue
+            sintetizadas += self.stats["sinteses"] - antes
+
+        self.stats["aquecidas"] += sintetizadas
+        if sintetizadas:
+            logger.info(f"🔊 Aquecimento TTS: {sintetizadas}/{len(frases)} frases sintetizadas")
+        return sintetizadas
+
+    async def _loop_aquecimento(self, caminho: str):
+        # Reaquece periodicamente: IDs que expiraram voltam ao cache
+        while True:
+            await self.aquecer(self.carregar_frases(caminho))
+            await asyncio.sleep(self.intervalo_aquecimento)
+
+    def start(self, caminho_frases: str):
+        """Inicia o aquecimento periódico das frases fixas (apenas no líder)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop_aquecimento(caminho_frases))
+
+    async def stop(self):
+        """Para o aquecimento periódico."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def get_stats(self) -> Dict:
+        """Taxa de acerto do cache e métricas da síntese."""
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0,
+            "sintese": self.sintetizador.get_stats()
+        }
+
+
+__all__ = ['VoiceNoteSynthesizer', 'TTSCache']
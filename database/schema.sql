@@ -6,6 +6,8 @@
 -- Tabelas:
 -- 1. leads_wpp - Gerenciamento de leads
 -- 2. knowledge - Base de conhecimento (RAG híbrido)
+-- 2.1 knowledge_passages - Passagens indexadas (chunks com sobreposição)
+-- 2.2 knowledge_embedding_state - Re-indexação online de embeddings
 -- 3. reunioes - Eventos do Google Calendar
 --
 -- Autor: Claude Code
@@ -56,6 +58,11 @@ CREATE INDEX idx_leads_fup_proximo ON leads_wpp(fup_proximo_horario)
     WHERE fup_proximo_horario IS NOT NULL;
 CREATE INDEX idx_leads_status ON leads_wpp(status);
 
+-- Índice do predicado de elegibilidade de follow-up (keyset por horário + telefone)
+CREATE INDEX idx_leads_fup_elegiveis ON leads_wpp(fup_proximo_horario, telefone)
+    INCLUDE (fup_enviado)
+    WHERE fup_proximo_horario IS NOT NULL AND fup_enviado < 4;
+
 -- Trigger para atualizar atualizado_em
 CREATE OR REPLACE FUNCTION update_atualizado_em()
 RETURNS TRIGGER AS $$
@@ -71,6 +78,96 @@ FOR EACH ROW
 EXECUTE FUNCTION update_atualizado_em();
 
 
+-- ============================================================================
+-- FUNÇÃO: atualizar_tags_lead
+-- ============================================================================
+-- Adiciona/remove tags de um lead em um único UPDATE atômico (sem
+-- read-modify-write no cliente). Remove primeiro, depois adiciona; mantém
+-- a ordem original e não duplica. Retorna o lead (vazio se não existir).
+
+CREATE OR REPLACE FUNCTION atualizar_tags_lead(
+    p_telefone TEXT,
+    p_adicionar TEXT[] DEFAULT '{}',
+    p_remover TEXT[] DEFAULT '{}'
+)
+RETURNS SETOF leads_wpp AS $$
+    UPDATE leads_wpp
+    SET tags = ARRAY(
+        SELECT u.tag
+        FROM unnest(COALESCE(tags, '{}') || p_adicionar) WITH ORDINALITY AS u(tag, ordem)
+        WHERE u.tag <> ALL(p_remover) OR u.tag = ANY(p_adicionar)
+        GROUP BY u.tag
+        ORDER BY MIN(u.ordem)
+    )
+    WHERE telefone = p_telefone
+    RETURNING *;
+$$ LANGUAGE sql;
+
+
+-- ============================================================================
+-- FUNÇÃO: atualizar_leads_lote
+-- ============================================================================
+-- Aplica atualizações parciais de vários leads em um único UPDATE.
+-- p_itens: [{"telefone": "...", "dados": {"fup_enviado": 2, ...}}, ...]
+-- Colunas ausentes em "dados" mantêm o valor atual (jsonb_populate_record
+-- sobre a própria linha). Tags ficam de fora (atualizar_tags_lead).
+
+CREATE OR REPLACE FUNCTION atualizar_leads_lote(p_itens JSONB)
+RETURNS SETOF leads_wpp AS $$
+    UPDATE leads_wpp l
+    SET (
+        nome, email, ultima_interacao_lead, ultima_interacao_agente,
+        agendar_conversa, fup_enviado, fup_ultima_data, fup_proximo_horario,
+        status, origem
+    ) = (
+        SELECT
+            r.nome, r.email, r.ultima_interacao_lead, r.ultima_interacao_agente,
+            r.agendar_conversa, r.fup_enviado, r.fup_ultima_data, r.fup_proximo_horario,
+            r.status, r.origem
+        FROM jsonb_populate_record(l, i.item->'dados') r
+    )
+    FROM jsonb_array_elements(p_itens) AS i(item)
+    WHERE l.telefone = i.item->>'telefone'
+    RETURNING l.*;
+$$ LANGUAGE sql;
+
+
+-- ============================================================================
+-- FUNÇÃO: buscar_leads_followup
+-- ============================================================================
+-- Leads elegíveis para follow-up, paginados por keyset
+-- (fup_proximo_horario, telefone) sobre idx_leads_fup_elegiveis.
+--
+-- p_agora NULL: todos os pendentes (reconciliação da fila), não só vencidos.
+-- p_apos_*: última linha da página anterior (NULL na primeira página).
+
+CREATE OR REPLACE FUNCTION buscar_leads_followup(
+    p_tags_bloqueio TEXT[],
+    p_agora TIMESTAMPTZ DEFAULT NULL,
+    p_apos_horario TIMESTAMPTZ DEFAULT NULL,
+    p_apos_telefone TEXT DEFAULT NULL,
+    p_limite INT DEFAULT 500
+)
+RETURNS TABLE (
+    telefone VARCHAR(20),
+    fup_enviado INTEGER,
+    fup_proximo_horario TIMESTAMPTZ
+) AS $$
+    SELECT l.telefone, l.fup_enviado, l.fup_proximo_horario
+    FROM leads_wpp l
+    WHERE l.fup_proximo_horario IS NOT NULL
+      AND l.fup_enviado < 4
+      AND (p_agora IS NULL OR l.fup_proximo_horario <= p_agora)
+      AND (l.tags IS NULL OR NOT l.tags && p_tags_bloqueio)
+      AND (
+          p_apos_horario IS NULL
+          OR (l.fup_proximo_horario, l.telefone) > (p_apos_horario, p_apos_telefone)
+      )
+    ORDER BY l.fup_proximo_horario, l.telefone
+    LIMIT p_limite;
+$$ LANGUAGE sql STABLE;
+
+
 -- ============================================================================
 -- TABELA: knowledge
 -- ============================================================================
@@ -90,6 +187,7 @@ CREATE TABLE IF NOT EXISTS knowledge (
 
     -- RAG: Embedding para busca semântica
     embedding vector(1536),  -- OpenAI text-embedding-3-small
+    embedding_shadow vector(1536),  -- Re-indexação online (novo modelo)
 
     -- Metadados
     tags TEXT[],
@@ -107,6 +205,11 @@ CREATE INDEX idx_knowledge_embedding ON knowledge
 USING ivfflat (embedding vector_cosine_ops)
 WITH (lists = 100);
 
+-- Índice da coluna sombra (usada durante re-indexação)
+CREATE INDEX idx_knowledge_embedding_shadow ON knowledge
+USING ivfflat (embedding_shadow vector_cosine_ops)
+WITH (lists = 100);
+
 -- Índice full-text search para BM25 (busca por palavras-chave)
 CREATE INDEX idx_knowledge_conteudo_fts ON knowledge
 USING gin(to_tsvector('portuguese', conteudo));
@@ -123,16 +226,205 @@ FOR EACH ROW
 EXECUTE FUNCTION update_atualizado_em();
 
 
+-- ============================================================================
+-- TABELA: knowledge_passages
+-- ============================================================================
+-- Passagens de cada conhecimento (chunks com sobreposição).
+-- Cada passagem tem embedding e índice full-text próprios; a busca
+-- retorna só os trechos relevantes em vez do documento inteiro.
+
+CREATE TABLE IF NOT EXISTS knowledge_passages (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    knowledge_id UUID NOT NULL REFERENCES knowledge(id) ON DELETE CASCADE,
+
+    -- Posição da passagem dentro do documento (0, 1, 2...)
+    posicao INTEGER NOT NULL,
+    conteudo TEXT NOT NULL,
+    tokens INTEGER,  -- Estimativa (1 token ≈ 4 caracteres)
+
+    -- RAG
+    embedding vector(1536),
+    embedding_shadow vector(1536),  -- Re-indexação online (novo modelo)
+
+    criado_em TIMESTAMPTZ DEFAULT NOW(),
+
+    UNIQUE (knowledge_id, posicao)
+);
+
+CREATE INDEX idx_passages_knowledge ON knowledge_passages(knowledge_id);
+
+CREATE INDEX idx_passages_embedding ON knowledge_passages
+USING ivfflat (embedding vector_cosine_ops)
+WITH (lists = 100);
+
+CREATE INDEX idx_passages_embedding_shadow ON knowledge_passages
+USING ivfflat (embedding_shadow vector_cosine_ops)
+WITH (lists = 100);
+
+-- Postings BM25 (full-text) por passagem
+CREATE INDEX idx_passages_conteudo_fts ON knowledge_passages
+USING gin(to_tsvector('portuguese', conteudo));
+
+
+-- ============================================================================
+-- TABELA: knowledge_embedding_state
+-- ============================================================================
+-- Estado da re-indexação online (troca de modelo de embeddings)
+--
+-- Fluxo:
+-- 1. reset_knowledge_shadow(novo_modelo) limpa a coluna sombra
+-- 2. Job preenche embedding_shadow em lotes (keyset por id + checkpoint),
+--    primeiro em knowledge e depois em knowledge_passages
+-- 3. swap_knowledge_embeddings(novo_modelo) troca as colunas atomicamente
+--
+-- Durante todo o processo o retriever continua servindo o índice ativo.
+
+CREATE TABLE IF NOT EXISTS knowledge_embedding_state (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),  -- Linha única
+    modelo_ativo VARCHAR(100) NOT NULL DEFAULT 'text-embedding-3-small',
+    modelo_shadow VARCHAR(100),
+    status VARCHAR(20) DEFAULT 'ocioso',  -- ocioso, em_andamento, concluido
+    checkpoint_tabela VARCHAR(50),  -- Tabela do checkpoint
+    checkpoint_id UUID,  -- Último id processado (keyset)
+    total INTEGER DEFAULT 0,
+    processados INTEGER DEFAULT 0,
+    iniciado_em TIMESTAMPTZ,
+    atualizado_em TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO knowledge_embedding_state (id) VALUES (1)
+ON CONFLICT (id) DO NOTHING;
+
+
+-- ============================================================================
+-- FUNÇÕES: re-indexação de embeddings
+-- ============================================================================
+
+-- Inicia re-indexação para um novo modelo (limpa coluna sombra)
+CREATE OR REPLACE FUNCTION reset_knowledge_shadow(p_modelo TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    total_docs INTEGER;
+BEGIN
+    UPDATE knowledge SET embedding_shadow = NULL
+    WHERE embedding_shadow IS NOT NULL;
+
+    UPDATE knowledge_passages SET embedding_shadow = NULL
+    WHERE embedding_shadow IS NOT NULL;
+
+    SELECT
+        (SELECT COUNT(*) FROM knowledge) +
+        (SELECT COUNT(*) FROM knowledge_passages)
+    INTO total_docs;
+
+    UPDATE knowledge_embedding_state SET
+        modelo_shadow = p_modelo,
+        status = 'em_andamento',
+        checkpoint_tabela = NULL,
+        checkpoint_id = NULL,
+        total = total_docs,
+        processados = 0,
+        iniciado_em = NOW(),
+        atualizado_em = NOW()
+    WHERE id = 1;
+
+    RETURN total_docs;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Grava um lote de embeddings na coluna sombra (1 round trip por lote)
+-- p_itens: [{"id": "...", "embedding": [...]}, ...]
+-- p_tabela: 'knowledge' ou 'knowledge_passages'
+DROP FUNCTION IF EXISTS set_knowledge_shadow_embeddings(JSONB);
+
+CREATE OR REPLACE FUNCTION set_knowledge_shadow_embeddings(
+    p_itens JSONB,
+    p_tabela TEXT DEFAULT 'knowledge'
+)
+RETURNS INTEGER AS $$
+DECLARE
+    atualizados INTEGER;
+BEGIN
+    IF p_tabela = 'knowledge_passages' THEN
+        UPDATE knowledge_passages p
+        SET embedding_shadow = (item->>'embedding')::vector
+        FROM jsonb_array_elements(p_itens) AS item
+        WHERE p.id = (item->>'id')::uuid;
+    ELSE
+        UPDATE knowledge k
+        SET embedding_shadow = (item->>'embedding')::vector
+        FROM jsonb_array_elements(p_itens) AS item
+        WHERE k.id = (item->>'id')::uuid;
+    END IF;
+
+    GET DIAGNOSTICS atualizados = ROW_COUNT;
+    RETURN atualizados;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Troca atômica: coluna sombra vira índice ativo (e vice-versa)
+-- Mantém o índice antigo na sombra para réplicas ainda no modelo anterior.
+CREATE OR REPLACE FUNCTION swap_knowledge_embeddings(p_modelo TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    trocados INTEGER;
+    trocadas_passagens INTEGER;
+BEGIN
+    -- Serializa trocas concorrentes
+    PERFORM 1 FROM knowledge_embedding_state WHERE id = 1 FOR UPDATE;
+
+    IF EXISTS (SELECT 1 FROM knowledge WHERE embedding_shadow IS NULL)
+       OR EXISTS (SELECT 1 FROM knowledge_passages WHERE embedding_shadow IS NULL) THEN
+        RAISE EXCEPTION 'Existem documentos sem embedding no modelo %', p_modelo;
+    END IF;
+
+    UPDATE knowledge
+    SET embedding = embedding_shadow,
+        embedding_shadow = embedding;
+
+    GET DIAGNOSTICS trocados = ROW_COUNT;
+
+    UPDATE knowledge_passages
+    SET embedding = embedding_shadow,
+        embedding_shadow = embedding;
+
+    GET DIAGNOSTICS trocadas_passagens = ROW_COUNT;
+    trocados := trocados + trocadas_passagens;
+
+    UPDATE knowledge_embedding_state SET
+        modelo_shadow = modelo_ativo,
+        modelo_ativo = p_modelo,
+        status = 'concluido',
+        atualizado_em = NOW()
+    WHERE id = 1;
+
+    RETURN trocados;
+END;
+$$ LANGUAGE plpgsql;
+
+
 -- ============================================================================
 -- FUNÇÃO: hybrid_search
 -- ============================================================================
 -- Busca híbrida: 60% semântica + 40% BM25
+--
+-- query_modelo: modelo que gerou query_embedding. Se for o modelo da coluna
+-- sombra (re-indexação em andamento ou réplica ainda no modelo anterior),
+-- a busca semântica usa embedding_shadow.
+--
+-- apenas_sem_passagens: só documentos ainda sem passagens indexadas
+-- (complementa hybrid_search_passages enquanto a base é re-indexada).
+
+DROP FUNCTION IF EXISTS hybrid_search(vector, TEXT, INT, FLOAT);
+DROP FUNCTION IF EXISTS hybrid_search(vector, TEXT, INT, FLOAT, TEXT);
 
 CREATE OR REPLACE FUNCTION hybrid_search(
     query_embedding vector(1536),
     query_text TEXT,
     match_count INT DEFAULT 5,
-    semantic_weight FLOAT DEFAULT 0.6
+    semantic_weight FLOAT DEFAULT 0.6,
+    query_modelo TEXT DEFAULT NULL,
+    apenas_sem_passagens BOOLEAN DEFAULT FALSE
 )
 RETURNS TABLE (
     id UUID,
@@ -140,18 +432,54 @@ RETURNS TABLE (
     conteudo TEXT,
     similarity_score FLOAT
 ) AS $$
+DECLARE
+    usar_shadow BOOLEAN := FALSE;
 BEGIN
+    IF query_modelo IS NOT NULL THEN
+        SELECT query_modelo = s.modelo_shadow AND query_modelo <> s.modelo_ativo
+        INTO usar_shadow
+        FROM knowledge_embedding_state s
+        WHERE s.id = 1;
+    END IF;
+
+    usar_shadow := COALESCE(usar_shadow, FALSE);
+
     RETURN QUERY
     WITH semantic_search AS (
-        SELECT
-            k.id,
-            k.assunto,
-            k.conteudo,
-            1 - (k.embedding <=> query_embedding) as score
-        FROM knowledge k
-        WHERE k.ativo = TRUE
-        ORDER BY k.embedding <=> query_embedding
-        LIMIT match_count * 2
+        (
+            SELECT
+                k.id,
+                k.assunto,
+                k.conteudo,
+                1 - (k.embedding <=> query_embedding) as score
+            FROM knowledge k
+            WHERE
+                k.ativo = TRUE
+                AND NOT usar_shadow
+                AND (NOT apenas_sem_passagens OR NOT EXISTS (
+                    SELECT 1 FROM knowledge_passages p WHERE p.knowledge_id = k.id
+                ))
+            ORDER BY k.embedding <=> query_embedding
+            LIMIT match_count * 2
+        )
+        UNION ALL
+        (
+            SELECT
+                k.id,
+                k.assunto,
+                k.conteudo,
+                1 - (k.embedding_shadow <=> query_embedding) as score
+            FROM knowledge k
+            WHERE
+                k.ativo = TRUE
+                AND usar_shadow
+                AND k.embedding_shadow IS NOT NULL
+                AND (NOT apenas_sem_passagens OR NOT EXISTS (
+                    SELECT 1 FROM knowledge_passages p WHERE p.knowledge_id = k.id
+                ))
+            ORDER BY k.embedding_shadow <=> query_embedding
+            LIMIT match_count * 2
+        )
     ),
     keyword_search AS (
         SELECT
@@ -167,6 +495,9 @@ BEGIN
             k.ativo = TRUE
             AND to_tsvector('portuguese', k.conteudo) @@
                 plainto_tsquery('portuguese', query_text)
+            AND (NOT apenas_sem_passagens OR NOT EXISTS (
+                SELECT 1 FROM knowledge_passages p WHERE p.knowledge_id = k.id
+            ))
         ORDER BY score DESC
         LIMIT match_count * 2
     )
@@ -186,6 +517,136 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+-- ============================================================================
+-- FUNÇÃO: substituir_passagens
+-- ============================================================================
+-- Troca as passagens de um conhecimento em uma única transação (DELETE +
+-- INSERT): se o INSERT falhar, as passagens anteriores continuam lá.
+-- p_passagens: [{"posicao", "conteudo", "tokens", "embedding"}, ...]
+
+CREATE OR REPLACE FUNCTION substituir_passagens(
+    p_knowledge_id UUID,
+    p_passagens JSONB
+)
+RETURNS SETOF knowledge_passages AS $$
+BEGIN
+    DELETE FROM knowledge_passages WHERE knowledge_id = p_knowledge_id;
+
+    RETURN QUERY
+    INSERT INTO knowledge_passages (knowledge_id, posicao, conteudo, tokens, embedding)
+    SELECT p_knowledge_id, r.posicao, r.conteudo, r.tokens, r.embedding
+    FROM jsonb_populate_recordset(NULL::knowledge_passages, p_passagens) r
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- ============================================================================
+-- FUNÇÃO: hybrid_search_passages
+-- ============================================================================
+-- Busca híbrida por passagem (60% semântica + 40% BM25).
+-- Retorna apenas a melhor passagem de cada documento (dedupe por parent).
+
+CREATE OR REPLACE FUNCTION hybrid_search_passages(
+    query_embedding vector(1536),
+    query_text TEXT,
+    match_count INT DEFAULT 5,
+    semantic_weight FLOAT DEFAULT 0.6,
+    query_modelo TEXT DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    knowledge_id UUID,
+    assunto VARCHAR,
+    conteudo TEXT,
+    posicao INTEGER,
+    similarity_score FLOAT
+) AS $$
+DECLARE
+    usar_shadow BOOLEAN := FALSE;
+BEGIN
+    IF query_modelo IS NOT NULL THEN
+        SELECT query_modelo = s.modelo_shadow AND query_modelo <> s.modelo_ativo
+        INTO usar_shadow
+        FROM knowledge_embedding_state s
+        WHERE s.id = 1;
+    END IF;
+
+    usar_shadow := COALESCE(usar_shadow, FALSE);
+
+    RETURN QUERY
+    WITH semantic_search AS (
+        (
+            SELECT
+                p.id,
+                1 - (p.embedding <=> query_embedding) as score
+            FROM knowledge_passages p
+            WHERE NOT usar_shadow
+            ORDER BY p.embedding <=> query_embedding
+            LIMIT match_count * 4
+        )
+        UNION ALL
+        (
+            SELECT
+                p.id,
+                1 - (p.embedding_shadow <=> query_embedding) as score
+            FROM knowledge_passages p
+            WHERE usar_shadow AND p.embedding_shadow IS NOT NULL
+            ORDER BY p.embedding_shadow <=> query_embedding
+            LIMIT match_count * 4
+        )
+    ),
+    keyword_search AS (
+        SELECT
+            p.id,
+            ts_rank(
+                to_tsvector('portuguese', p.conteudo),
+                plainto_tsquery('portuguese', query_text)
+            ) as score
+        FROM knowledge_passages p
+        WHERE to_tsvector('portuguese', p.conteudo) @@
+            plainto_tsquery('portuguese', query_text)
+        ORDER BY score DESC
+        LIMIT match_count * 4
+    ),
+    combinados AS (
+        SELECT
+            COALESCE(s.id, kw.id) as passage_id,
+            (
+                COALESCE(s.score, 0) * semantic_weight +
+                COALESCE(kw.score, 0) * (1 - semantic_weight)
+            ) as score
+        FROM semantic_search s
+        FULL OUTER JOIN keyword_search kw ON s.id = kw.id
+    ),
+    melhor_por_documento AS (
+        SELECT DISTINCT ON (p.knowledge_id)
+            p.id,
+            p.knowledge_id,
+            k.assunto,
+            p.conteudo,
+            p.posicao,
+            c.score
+        FROM combinados c
+        JOIN knowledge_passages p ON p.id = c.passage_id
+        JOIN knowledge k ON k.id = p.knowledge_id
+        WHERE k.ativo = TRUE
+        ORDER BY p.knowledge_id, c.score DESC
+    )
+    SELECT
+        m.id,
+        m.knowledge_id,
+        m.assunto,
+        m.conteudo,
+        m.posicao,
+        m.score::FLOAT as similarity_score
+    FROM melhor_por_documento m
+    ORDER BY m.score DESC
+    LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql;
+
+
 -- ============================================================================
 -- TABELA: reunioes
 -- ============================================================================
@@ -209,6 +670,7 @@ CREATE TABLE IF NOT EXISTS reunioes (
 
     -- Participantes (JSONB para flexibilidade)
     participantes JSONB,  -- [{"email": "...", "nome": "...", "confirmado": true}]
+    meet_link TEXT,  -- Link do Google Meet (usado nos lembretes)
 
     -- Status
     status VARCHAR(50) DEFAULT 'agendada',  -- agendada, confirmada, cancelada, concluida
@@ -274,6 +736,13 @@ ON knowledge FOR SELECT
 TO authenticated
 USING (ativo = TRUE);
 
+ALTER TABLE knowledge_passages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Permitir leitura autenticada de passagens"
+ON knowledge_passages FOR SELECT
+TO authenticated
+USING (true);
+
 
 -- Reuniões
 ALTER TABLE reunioes ENABLE ROW LEVEL SECURITY;
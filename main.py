@@ -33,7 +33,10 @@ from config.settings import settings
 from core.integrations import (
     WhatsAppClient,
     GoogleCalendarClient,
+    GoogleTokenManager,
     SupabaseClient,
+    LeadCache,
+    LeadWriteBuffer,
     ElevenLabsClient,
     RabbitMQClient
 )
@@ -41,10 +44,17 @@ from core.memory import (
     RedisMemoryManager,
     MessageBuffer,
     SessionStateManager,
-    HybridRetriever
+    HybridRetriever,
+    KnowledgeManager
 )
 from core.agent import AgenteSDR
+from core.router import IntentRouter
+from core.cache import ToolResultCache, ToolCachePolicy
+from core.media import MediaPipeline
+from core.voice import TTSCache, VoiceNoteSynthesizer
+from core.reminders import ReminderScheduler
 from core.followup import FollowUpManager, FollowUpScheduler
+from core.leader import LeaderElection
 
 
 # ==============================================================================
@@ -58,21 +68,52 @@ supabase_client = None
 elevenlabs_client = None
 rabbitmq_client = None
 redis_client = None
+google_token_manager = None
 memory_manager = None
 message_buffer = None
 session_state = None
 hybrid_retriever = None
+knowledge_manager = None
 agente_sdr = None
+intent_router = None
+tool_cache = None
+reminder_scheduler = None
 followup_manager = None
 followup_scheduler = None
+leader_election = None
+media_pipeline = None
+tts_cache = None
+
+
+async def iniciar_jobs_agendados(token: int = 0):
+    """Inicia os jobs agendados (apenas na instância líder)."""
+    if reminder_scheduler:
+        reminder_scheduler.start()
+    if followup_scheduler:
+        followup_scheduler.start()
+    if tts_cache:
+        tts_cache.start(settings.TTS_WARMUP_FILE)
+
+
+async def parar_jobs_agendados():
+    """Para os jobs agendados (liderança perdida ou shutdown)."""
+    if followup_scheduler:
+        followup_scheduler.stop()
+    if reminder_scheduler:
+        await reminder_scheduler.stop()
+    if tts_cache:
+        await tts_cache.stop()
 
 
 async def init_clients():
     """Inicializa todos os clientes e serviços."""
     global whatsapp_client, google_calendar_client, supabase_client
-    global elevenlabs_client, rabbitmq_client, redis_client
+    global elevenlabs_client, rabbitmq_client, redis_client, google_token_manager
     global memory_manager, message_buffer, session_state, hybrid_retriever
-    global agente_sdr, followup_manager, followup_scheduler
+    global knowledge_manager, agente_sdr, intent_router, tool_cache
+    global reminder_scheduler
+    global followup_manager, followup_scheduler, leader_election
+    global media_pipeline, tts_cache
 
     logger.info("Inicializando clientes...")
 
@@ -87,8 +128,15 @@ async def init_clients():
     try:
         google_calendar_client = GoogleCalendarClient(
             credentials_path=str(settings.GOOGLE_CREDENTIALS_PATH),
-            token_path=str(settings.GOOGLE_TOKEN_PATH)
+            token_path=str(settings.GOOGLE_TOKEN_PATH),
+            timezone=settings.CALENDAR_TIMEZONE,
+            hora_inicio=settings.CALENDAR_BUSINESS_HOUR_START,
+            hora_fim=settings.CALENDAR_BUSINESS_HOUR_END,
+            buffer_minutos=settings.CALENDAR_BUFFER_MINUTES,
+            freebusy_ttl=settings.CALENDAR_FREEBUSY_TTL,
+            mirror_intervalo_segundos=settings.CALENDAR_MIRROR_SYNC_INTERVAL
         )
+        google_calendar_client.mirror.start()
         logger.info("✅ Google Calendar inicializado")
     except Exception as e:
         logger.warning(f"⚠️ Google Calendar não disponível: {e}")
@@ -103,7 +151,8 @@ async def init_clients():
     # ElevenLabs
     elevenlabs_client = ElevenLabsClient(
         api_key=settings.ELEVENLABS_API_KEY,
-        voice_id=settings.ELEVENLABS_VOICE_ID
+        voice_id=settings.ELEVENLABS_VOICE_ID,
+        model_id=settings.ELEVENLABS_MODEL
     )
 
     # RabbitMQ (async)
@@ -125,6 +174,35 @@ async def init_clients():
         decode_responses=False
     )
 
+    # Token OAuth do Google compartilhado via Redis (renovação antecipada)
+    google_token_manager = GoogleTokenManager(
+        redis_client=redis_client,
+        token_path=str(settings.GOOGLE_TOKEN_PATH),
+        margem_segundos=settings.GOOGLE_TOKEN_REFRESH_MARGIN
+    )
+    if google_calendar_client:
+        try:
+            await google_token_manager.start(google_calendar_client)
+        except Exception as e:
+            logger.warning(f"⚠️ Token do Google não carregado do Redis: {e}")
+
+    # Cache de leads (LRU local + Redis, invalidação via Pub/Sub)
+    if settings.LEAD_CACHE_ENABLED:
+        supabase_client.lead_cache = LeadCache(
+            redis_client,
+            ttl=settings.LEAD_CACHE_TTL,
+            ttl_local=settings.LEAD_CACHE_LOCAL_TTL,
+            max_itens=settings.LEAD_CACHE_MAX_ITEMS
+        )
+        supabase_client.lead_cache.start()
+
+    # Write-behind de atualizações de leads (mescla escritas do mesmo lead)
+    if settings.LEAD_WRITE_BUFFER_ENABLED:
+        supabase_client.write_buffer = LeadWriteBuffer(
+            supabase_client,
+            janela_segundos=settings.LEAD_WRITE_BUFFER_WINDOW
+        )
+
     # Memory Manager
     memory_manager = RedisMemoryManager(redis_client)
 
@@ -143,12 +221,76 @@ async def init_clients():
         embeddings=embeddings
     )
 
+    # Knowledge Manager (status da re-indexação)
+    knowledge_manager = KnowledgeManager(
+        supabase_client=supabase_client,
+        embeddings=embeddings
+    )
+
+    # Pipeline de mídias (URL + transcrição durante a janela do buffer)
+    media_pipeline = MediaPipeline(
+        whatsapp_client=whatsapp_client,
+        openai_api_key=settings.OPENAI_API_KEY,
+        redis_client=redis_client,
+        modelo_transcricao=settings.OPENAI_MODEL_TRANSCRIBE,
+        antecipar=settings.MEDIA_EAGER_PROCESSING,
+        ttl_conteudo=settings.MEDIA_CACHE_TTL,
+        modelo_visao=settings.OPENAI_MODEL_CHAT,
+        detalhe_imagem=settings.IMAGE_ANALYSIS_DETAIL,
+        max_lado_imagem=settings.IMAGE_ANALYSIS_MAX_SIDE
+    )
+
+    # Notas de voz: ElevenLabs em streaming -> ffmpeg (OGG/Opus) -> /media
+    voice_synthesizer = VoiceNoteSynthesizer(
+        elevenlabs_client=elevenlabs_client,
+        whatsapp_client=whatsapp_client,
+        opus=settings.TTS_OPUS_ENABLED,
+        bitrate=settings.TTS_OPUS_BITRATE
+    )
+
+    # Cache de áudios sintetizados (ID de mídia do WhatsApp por frase)
+    tts_cache = None
+    if settings.TTS_CACHE_ENABLED:
+        tts_cache = TTSCache(
+            redis_client=redis_client,
+            sintetizador=voice_synthesizer,
+            ttl=settings.TTS_CACHE_TTL
+        )
+
     # Message Buffer (callback será definido depois)
     message_buffer = MessageBuffer(
         redis_client=redis_client,
-        process_callback=process_buffered_messages
+        process_callback=process_buffered_messages,
+        media_pipeline=media_pipeline
     )
 
+    # Cache de resultados das tools (TTL por tool + invalidação)
+    tool_cache = None
+    if settings.TOOL_CACHE_ENABLED:
+        invalida_agenda = ("consulta_horarios",)
+        tool_cache = ToolResultCache(redis_client, {
+            "consulta_horarios": ToolCachePolicy(ttl=settings.TOOL_CACHE_TTL_HORARIOS),
+            "buscar_conhecimento": ToolCachePolicy(ttl=settings.TOOL_CACHE_TTL_CONHECIMENTO),
+            "agenda_reuniao": ToolCachePolicy(invalida=invalida_agenda),
+            "cancela_reuniao": ToolCachePolicy(invalida=invalida_agenda),
+            "reagenda_reuniao": ToolCachePolicy(invalida=invalida_agenda),
+        })
+
+    # Lembretes de reunião (fila no Redis por horário de disparo)
+    if settings.REMINDERS_ENABLED:
+        reminder_scheduler = ReminderScheduler(
+            redis_client=redis_client,
+            whatsapp_client=whatsapp_client,
+            supabase_client=supabase_client,
+            memory=memory_manager,
+            timezone=settings.CALENDAR_TIMEZONE
+        )
+        if not await redis_client.exists(ReminderScheduler.FILA_KEY):
+            try:
+                await reminder_scheduler.reconstruir()
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível reconstruir fila de lembretes: {e}")
+
     # Agente SDR
     agente_sdr = AgenteSDR(
         whatsapp_client=whatsapp_client,
@@ -158,7 +300,23 @@ async def init_clients():
         redis_memory=memory_manager,
         hybrid_retriever=hybrid_retriever,
         session_state=session_state,
-        openai_api_key=settings.OPENAI_API_KEY
+        openai_api_key=settings.OPENAI_API_KEY,
+        tool_cache=tool_cache,
+        reminders=reminder_scheduler,
+        media_pipeline=media_pipeline,
+        tts_cache=tts_cache,
+        voice_synthesizer=voice_synthesizer
+    )
+
+    # Roteador de intenções (antes do agente)
+    # Desabilitado: continua atendendo apenas comandos (#clear)
+    intent_router = IntentRouter(
+        whatsapp_client=whatsapp_client,
+        memory=memory_manager,
+        supabase_client=supabase_client,
+        model_path=str(settings.INTENT_MODEL_PATH) if settings.INTENT_MODEL_PATH else None,
+        model_threshold=settings.INTENT_MODEL_THRESHOLD,
+        apenas_comandos=not settings.INTENT_ROUTER_ENABLED
     )
 
     # LLM para follow-up
@@ -173,12 +331,39 @@ async def init_clients():
         whatsapp_client=whatsapp_client,
         supabase_client=supabase_client,
         memory=memory_manager,
-        llm=llm_followup
+        llm=llm_followup,
+        redis_client=redis_client,
+        max_concorrencia=settings.FOLLOWUP_MAX_CONCURRENCY,
+        tokens_por_minuto=settings.FOLLOWUP_LLM_TOKENS_PER_MINUTE
     )
 
+    # Eleição de líder: só uma réplica/worker roda os jobs agendados
+    if settings.LEADER_ELECTION_ENABLED:
+        leader_election = LeaderElection(
+            redis_client,
+            nome="scheduler",
+            ttl=settings.LEADER_LEASE_TTL,
+            intervalo_heartbeat=settings.LEADER_HEARTBEAT_INTERVAL,
+            on_eleito=iniciar_jobs_agendados,
+            on_destituido=parar_jobs_agendados
+        )
+
+        # Retiradas das filas dos jobs conferem o fencing token no Redis
+        followup_manager.lideranca = leader_election
+        if reminder_scheduler:
+            reminder_scheduler.lideranca = leader_election
+
     # Follow-up Scheduler
-    followup_scheduler = FollowUpScheduler(followup_manager)
-    followup_scheduler.start()
+    followup_scheduler = FollowUpScheduler(
+        followup_manager,
+        intervalo_reconciliacao_minutos=settings.FOLLOWUP_CHECK_INTERVAL,
+        lideranca=leader_election
+    )
+
+    if leader_election:
+        leader_election.start()
+    else:
+        await iniciar_jobs_agendados()
 
     logger.info("✅ Todos os clientes inicializados com sucesso!")
 
@@ -187,8 +372,23 @@ async def cleanup():
     """Cleanup ao finalizar aplicação."""
     logger.info("Finalizando aplicação...")
 
-    if followup_scheduler:
-        followup_scheduler.stop()
+    # Libera o lease (outra instância assume na hora) e para os jobs
+    if leader_election:
+        await leader_election.stop()
+    await parar_jobs_agendados()
+
+    # Grava atualizações de leads ainda pendentes
+    if supabase_client and supabase_client.write_buffer:
+        await supabase_client.write_buffer.stop()
+
+    if google_calendar_client:
+        await google_calendar_client.mirror.stop()
+
+    if google_token_manager:
+        await google_token_manager.stop()
+
+    if supabase_client and supabase_client.lead_cache:
+        await supabase_client.lead_cache.stop()
 
     if whatsapp_client:
         await whatsapp_client.close()
@@ -412,13 +612,28 @@ async def google_oauth_callback(code: str = None, error: str = None):
 
         logger.info(f"✅ Token do Google Calendar salvo em: {token_path}")
 
+        # Publicar token para todas as réplicas
+        if google_token_manager:
+            await google_token_manager.salvar(credentials)
+
         # Reinicializar GoogleCalendarClient
         try:
             from core.integrations import GoogleCalendarClient
+            if google_calendar_client:
+                await google_calendar_client.mirror.stop()
             google_calendar_client = GoogleCalendarClient(
                 credentials_path=str(settings.GOOGLE_CREDENTIALS_PATH),
-                token_path=str(settings.GOOGLE_TOKEN_PATH)
+                token_path=str(settings.GOOGLE_TOKEN_PATH),
+                timezone=settings.CALENDAR_TIMEZONE,
+                hora_inicio=settings.CALENDAR_BUSINESS_HOUR_START,
+                hora_fim=settings.CALENDAR_BUSINESS_HOUR_END,
+                buffer_minutos=settings.CALENDAR_BUFFER_MINUTES,
+                freebusy_ttl=settings.CALENDAR_FREEBUSY_TTL,
+                mirror_intervalo_segundos=settings.CALENDAR_MIRROR_SYNC_INTERVAL
             )
+            google_calendar_client.mirror.start()
+            if google_token_manager:
+                await google_token_manager.start(google_calendar_client)
             logger.info("✅ Google Calendar Client reinicializado com sucesso")
         except Exception as e:
             logger.error(f"Erro ao reinicializar Google Calendar Client: {e}")
@@ -459,33 +674,22 @@ async def process_buffered_messages(
     try:
         logger.info(f"Processando mensagens buffered de {phone}")
 
-        # COMANDO ESPECIAL: #Clear - Limpar histórico
-        if combined_content.strip().lower() in ["#clear", "#limpar"]:
-            logger.info(f"🧹 Comando #Clear recebido de {phone}")
-
-            # Limpar histórico no Redis
-            cleared = await memory_manager.clear_history(phone)
-
-            if cleared:
-                # Enviar confirmação
-                await whatsapp_client.send_text(
-                    phone,
-                    "✅ Histórico de conversas limpo com sucesso! Podemos começar do zero."
-                )
-                logger.info(f"✅ Histórico limpo e confirmação enviada para {phone}")
-            else:
-                await whatsapp_client.send_text(
-                    phone,
-                    "ℹ️ Nenhum histórico encontrado para limpar."
-                )
-
+        # Roteador: confirmações, opt-out e comandos (#clear) sem LLM
+        if intent_router and await intent_router.handle(
+            phone, combined_content, original_messages
+        ):
             return  # Não processar com o agente
 
+        # Preparar turno: histórico, lead, sessão e RAG em paralelo
+        metadata = {"buffered_messages": original_messages}
+        turno = await agente_sdr.prepare_turn(phone, combined_content, metadata)
+
         # Processar com agente normalmente
         response = await agente_sdr.process_message(
             phone=phone,
             message=combined_content,
-            metadata={"buffered_messages": original_messages}
+            metadata=metadata,
+            turno=turno
         )
 
         # CAMADA DE SEGURANÇA: Se agente não usou a tool, enviar manualmente
@@ -556,7 +760,8 @@ async def process_buffered_messages(
             logger.info(f"✅ Resposta enviada via tool para {phone}")
 
         # Agendar primeiro follow-up (se ainda não tiver)
-        lead = await supabase_client.get_lead(phone)
+        # Lead já carregado na preparação do turno (sem novo round trip)
+        lead = turno.lead
         if lead and lead.get('fup_enviado', 0) == 0:
             await followup_manager.agendar_primeiro_followup(phone)
 
@@ -588,13 +793,16 @@ async def message_consumer_callback(data: dict):
         # Processar baseado no tipo
         if message_type == "text":
             content = message_data.get("text", {}).get("body", "")
+            media_id = None
+            media_sha256 = None
             media_url = None
             media_type = None
 
         elif message_type in ["image", "video", "audio", "document"]:
+            # URL resolvida pelo pipeline de mídias (durante a janela do buffer)
             media_id = message_data.get(message_type, {}).get("id")
-            # TODO: Buscar URL da mídia
-            media_url = f"media://{media_id}"
+            media_sha256 = message_data.get(message_type, {}).get("sha256")
+            media_url = None
             content = message_data.get(message_type, {}).get("caption", "")
             media_type = message_type
 
@@ -608,6 +816,8 @@ async def message_consumer_callback(data: dict):
                 "message_id": message_id,
                 "content": content,
                 "timestamp": message_data.get("timestamp"),
+                "media_id": media_id,
+                "media_sha256": media_sha256,
                 "media_url": media_url,
                 "media_type": media_type
             })
@@ -617,6 +827,62 @@ async def message_consumer_callback(data: dict):
         raise  # Re-raise para aio-pika fazer nack
 
 
+# ==============================================================================
+# BASE DE CONHECIMENTO
+# ==============================================================================
+
+@app.get("/knowledge/reindex/status")
+async def knowledge_reindex_status():
+    """
+    Progresso da re-indexação de embeddings.
+
+    Retorna modelos ativo/sombra, documentos processados,
+    vazão (docs/s) e ETA estimado.
+    """
+    try:
+        return await knowledge_manager.get_reembedding_status()
+    except Exception as e:
+        logger.error(f"Erro ao consultar re-indexação: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ==============================================================================
+# MÉTRICAS
+# ==============================================================================
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Métricas internas (contadores, taxas de acerto, latências).
+    """
+    return {
+        "intent_router": intent_router.get_stats() if intent_router else None,
+        "tool_cache": tool_cache.get_stats() if tool_cache else None,
+        "freebusy_cache": (
+            google_calendar_client.get_availability_stats()
+            if google_calendar_client else None
+        ),
+        "calendar_mirror": (
+            google_calendar_client.mirror.get_stats()
+            if google_calendar_client else None
+        ),
+        "google_token": google_token_manager.get_stats() if google_token_manager else None,
+        "reminders": await reminder_scheduler.get_stats() if reminder_scheduler else None,
+        "followup": followup_manager.get_stats() if followup_manager else None,
+        "media": media_pipeline.get_stats() if media_pipeline else None,
+        "tts": tts_cache.get_stats() if tts_cache else None,
+        "leader": leader_election.get_stats() if leader_election else None,
+        "lead_cache": (
+            supabase_client.lead_cache.get_stats()
+            if supabase_client and supabase_client.lead_cache else None
+        ),
+        "lead_writes": (
+            supabase_client.write_buffer.get_stats()
+            if supabase_client and supabase_client.write_buffer else None
+        )
+    }
+
+
 # ==============================================================================
 # HEALTH CHECK
 # ==============================================================================
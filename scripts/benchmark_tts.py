@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark da Síntese de Voz
+===========================
+
+Compara os caminhos de VoiceNoteSynthesizer contra stubs locais
+(httpx.MockTransport) da ElevenLabs e do /media do WhatsApp:
+
+- mp3:      síntese completa -> upload do MP3 (caminho antigo)
+- opus:     blocos da ElevenLabs -> ffmpeg (OGG/Opus) -> upload
+- fallback: ffmpeg que falha -> upload do MP3 já recebido do stream
+
+O MP3 servido pelo stub é gerado com o próprio ffmpeg (mono, 44.1 kHz,
+128 kbps, como o padrão da ElevenLabs). Nenhuma chamada externa é feita.
+
+Uso:
+    python scripts/benchmark_tts.py
+    python scripts/benchmark_tts.py --ffmpeg /caminho/do/ffmpeg --execucoes 20
+
+Sem ffmpeg no PATH, `pip install imageio-ffmpeg` traz um binário estático
+(imageio_ffmpeg.get_ffmpeg_exe()), usado automaticamente se instalado.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.integrations import ElevenLabsClient, WhatsAppClient  # noqa: E402
+from core.voice import VoiceNoteSynthesizer  # noqa: E402
+
+
+def localizar_ffmpeg(caminho: str) -> str:
+    """ffmpeg do argumento/PATH ou, na falta, o do imageio-ffmpeg."""
+    encontrado = shutil.which(caminho)
+    if encontrado:
+        return encontrado
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        sys.exit(f"❌ ffmpeg não encontrado ({caminho}); instale-o ou use pip install imageio-ffmpeg")
+
+
+def ffmpeg_quebrado(diretorio: str) -> str:
+    """Executável que lê um pouco do stdin e sai com erro (ffmpeg falhando no meio)."""
+    caminho = os.path.join(diretorio, "ffmpeg-quebrado")
+    with open(caminho, "w") as arquivo:
+        arquivo.write("#!/bin/sh\nhead -c 8192 > /dev/null\necho 'Invalid data found' >&2\nexit 1\n")
+    os.chmod(caminho, 0o755)
+    return caminho
+
+
+def gerar_mp3(ffmpeg: str, segundos: float) -> bytes:
+    """Áudio de teste (tom modulado + ruído), no formato da ElevenLabs."""
+    filtro = (
+        f"sine=frequency=180:duration={segundos}[a];"
+        f"anoisesrc=color=pink:amplitude=0.05:duration={segundos}[b];"
+        "[a][b]amix=inputs=2,tremolo=f=4:d=0.7"
+    )
+    return subprocess.run(
+        [
+            ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", filtro,
+            "-ac", "1", "-ar", "44100", "-c:a", "libmp3lame", "-b:a", "128k",
+            "-f", "mp3", "pipe:1"
+        ],
+        check=True,
+        capture_output=True
+    ).stdout
+
+
+def criar_clientes(args, mp3: bytes, contadores: dict):
+    """Clientes reais com transporte local simulando latência e banda."""
+    tamanho_bloco = 4096
+    blocos = [mp3[i:i + tamanho_bloco] for i in range(0, len(mp3), tamanho_bloco)]
+    intervalo = max(args.sintese_ms - args.primeiro_bloco_ms, 0) / 1000 / max(len(blocos) - 1, 1)
+
+    async def gerar():
+        await asyncio.sleep(args.primeiro_bloco_ms / 1000)
+        for i, bloco in enumerate(blocos):
+            if i:
+                await asyncio.sleep(intervalo)
+            yield bloco
+
+    async def elevenlabs(request: httpx.Request) -> httpx.Response:
+        contadores["elevenlabs"] += 1
+        return httpx.Response(200, headers={"Content-Type": "audio/mpeg"}, content=gerar())
+
+    async def whatsapp(request: httpx.Request) -> httpx.Response:
+        corpo = await request.aread()
+        contadores["uploads"] += 1
+        contadores["bytes_upload"] += len(corpo)
+        # RTT + tempo de envio pela banda de upload
+        await asyncio.sleep(args.rtt_ms / 1000 + len(corpo) / (args.banda_kbps * 125))
+        return httpx.Response(200, json={"id": f"media-{contadores['uploads']}"})
+
+    voz = ElevenLabsClient(api_key="stub", voice_id="stub")
+    voz.client = httpx.AsyncClient(transport=httpx.MockTransport(elevenlabs))
+
+    wpp = WhatsAppClient(access_token="stub", phone_number_id="stub", verify_token="stub")
+    wpp.client = httpx.AsyncClient(transport=httpx.MockTransport(whatsapp))
+    return voz, wpp
+
+
+async def medir(nome: str, args, mp3: bytes, opus: bool, ffmpeg: str) -> dict:
+    contadores = {"elevenlabs": 0, "uploads": 0, "bytes_upload": 0}
+    voz, wpp = criar_clientes(args, mp3, contadores)
+    sintetizador = VoiceNoteSynthesizer(voz, wpp, opus=opus, ffmpeg=ffmpeg)
+
+    tempos = []
+    try:
+        for _ in range(args.execucoes):
+            inicio = time.perf_counter()
+            await sintetizador.sintetizar("Oi, aqui é a Iara! Tudo bem com você?")
+            tempos.append((time.perf_counter() - inicio) * 1000)
+    finally:
+        await voz.close()
+        await wpp.client.aclose()
+
+    ordenados = sorted(tempos)
+    return {
+        "caminho": nome,
+        "media_ms": statistics.mean(tempos),
+        "p95_ms": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))],
+        "kb_upload": contadores["bytes_upload"] / max(contadores["uploads"], 1) / 1024,
+        "sinteses_por_audio": contadores["elevenlabs"] / args.execucoes,
+        "stats": sintetizador.stats
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark da síntese de voz (stubs locais)")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Executável do ffmpeg")
+    parser.add_argument("--execucoes", type=int, default=10, help="Áudios por caminho")
+    parser.add_argument("--segundos", type=float, default=8.0, help="Duração do áudio de teste")
+    parser.add_argument("--primeiro-bloco-ms", type=float, default=250, help="Latência até o 1º bloco")
+    parser.add_argument("--sintese-ms", type=float, default=1200, help="Duração total do stream")
+    parser.add_argument("--rtt-ms", type=float, default=80, help="RTT do upload ao /media")
+    parser.add_argument("--banda-kbps", type=float, default=2000, help="Banda de upload (kbit/s)")
+    args = parser.parse_args()
+
+    ffmpeg = localizar_ffmpeg(args.ffmpeg)
+    mp3 = gerar_mp3(ffmpeg, args.segundos)
+
+    print("=" * 70)
+    print("🔊 BENCHMARK - SÍNTESE DE VOZ")
+    print("=" * 70)
+    print(f"ffmpeg: {ffmpeg}")
+    print(f"Áudio: {args.segundos:.0f} s, MP3 de {len(mp3) / 1024:.0f} KB")
+    print(
+        f"Stubs: 1º bloco {args.primeiro_bloco_ms:.0f} ms, stream {args.sintese_ms:.0f} ms, "
+        f"upload {args.rtt_ms:.0f} ms + {args.banda_kbps:.0f} kbit/s"
+    )
+    print("-" * 70)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        resultados = [
+            await medir("mp3", args, mp3, opus=False, ffmpeg=ffmpeg),
+            await medir("opus", args, mp3, opus=True, ffmpeg=ffmpeg),
+            await medir("fallback", args, mp3, opus=True, ffmpeg=ffmpeg_quebrado(diretorio)),
+        ]
+
+    for r in resultados:
+        print(
+            f"{r['caminho']:<9} média {r['media_ms']:7.1f} ms | p95 {r['p95_ms']:7.1f} ms | "
+            f"upload {r['kb_upload']:6.1f} KB | sínteses/áudio {r['sinteses_por_audio']:.1f}"
+        )
+
+    fallback = resultados[2]
+    assert fallback["stats"]["falhas_transcodificacao"] == args.execucoes, fallback["stats"]
+    assert fallback["sinteses_por_audio"] == 1.0, "fallback sintetizou o texto de novo"
+    assert fallback["kb_upload"] * 1024 >= len(mp3), "fallback não enviou o MP3 completo"
+    print("-" * 70)
+    print("✅ Fallback reaproveitou o MP3 do stream (1 síntese por áudio)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
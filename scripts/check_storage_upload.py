@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Verificação do Upload no Storage
+================================
+
+Confere que SupabaseClient.upload_file não bloqueia o event loop: o
+cliente supabase-py real é usado, com o transporte HTTP do Storage
+trocado por um stub local (httpx.MockTransport) que demora a responder
+como um upload lento. Nenhuma chamada externa é feita.
+
+Durante os uploads, uma tarefa mede o atraso do event loop; com o envio
+síncrono direto no loop, o atraso seria o tempo inteiro do upload.
+
+Uso:
+    python scripts/check_storage_upload.py
+    python scripts/check_storage_upload.py --uploads 8 --upload-ms 500
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.integrations import SupabaseClient  # noqa: E402
+
+URL = "http://localhost:54321"
+# JWT sintático (o cliente só valida o formato)
+KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.c3R1Yg"
+
+
+def criar_cliente(upload_ms: float, recebidos: list) -> SupabaseClient:
+    """SupabaseClient real com o Storage respondendo por um stub lento."""
+    lock = threading.Lock()
+
+    def storage(request: httpx.Request) -> httpx.Response:
+        time.sleep(upload_ms / 1000)  # upload lento (o cliente do Storage é síncrono)
+        with lock:
+            recebidos.append((request.method, request.url.path, len(request.content)))
+        return httpx.Response(200, json={"Key": request.url.path})
+
+    supabase = SupabaseClient(url=URL, key=KEY)
+    supabase.client.storage.session._transport = httpx.MockTransport(storage)
+    return supabase
+
+
+async def medir_atraso(parar: asyncio.Event, atrasos: list, intervalo: float = 0.01):
+    """Atraso do event loop: quanto um sleep curto demora além do pedido."""
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        atrasos.append((time.perf_counter() - inicio - intervalo) * 1000)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Verifica o upload não bloqueante no Storage")
+    parser.add_argument("--uploads", type=int, default=4, help="Uploads simultâneos")
+    parser.add_argument("--upload-ms", type=float, default=300, help="Duração de cada upload no stub")
+    parser.add_argument("--kb", type=int, default=256, help="Tamanho de cada arquivo")
+    args = parser.parse_args()
+
+    recebidos = []
+    supabase = criar_cliente(args.upload_ms, recebidos)
+    dados = b"\0" * (args.kb * 1024)
+
+    parar = asyncio.Event()
+    atrasos = []
+    monitor = asyncio.create_task(medir_atraso(parar, atrasos))
+
+    inicio = time.perf_counter()
+    urls = await asyncio.gather(*(
+        supabase.upload_file("midias", f"teste/arquivo-{i}.bin", dados, "application/octet-stream")
+        for i in range(args.uploads)
+    ))
+    total_ms = (time.perf_counter() - inicio) * 1000
+
+    parar.set()
+    await monitor
+
+    print("=" * 70)
+    print("🗄️  VERIFICAÇÃO - UPLOAD NO STORAGE")
+    print("=" * 70)
+    print(f"{args.uploads} uploads de {args.kb} KB, {args.upload_ms:.0f} ms cada no stub")
+    print(f"Tempo total: {total_ms:.0f} ms (sequencial seria {args.uploads * args.upload_ms:.0f} ms)")
+    print(f"Maior atraso do event loop: {max(atrasos):.1f} ms")
+    print(f"URL: {urls[0]}")
+
+    assert len(recebidos) == args.uploads, recebidos
+    assert all(tamanho >= len(dados) for _, _, tamanho in recebidos), "upload incompleto"
+    assert urls[0].startswith(f"{URL}/storage/v1/object/public/midias/teste/arquivo-0.bin"), urls[0]
+    assert max(atrasos) < args.upload_ms / 2, "upload bloqueou o event loop"
+    print("-" * 70)
+    print("✅ Uploads não bloquearam o event loop")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())